@@ -1,24 +1,40 @@
 import asyncio
 import functools
+import hashlib
 import logging
-import sys
+import math
+from collections import OrderedDict
 from io import BytesIO
-from typing import Optional, Union, cast
+from typing import Dict, List, Optional, Tuple, Union, cast
 
 import aiohttp
 import discord
-from PIL import Image, ImageDraw, ImageFont, ImageSequence
+from PIL import Image, ImageDraw, ImageSequence
 from redbot.core import Config, commands
-from redbot.core.data_manager import bundled_data_path
+from redbot.core.data_manager import bundled_data_path, cog_data_path
 from redbot.core.i18n import Translator, cog_i18n
 
 from .badge_entry import Badge
-from .barcode import ImageWriter, generate
+from .barcode import ImageWriter, generate, load_font
 from .templates import blank_template
 
 _ = Translator("Badges", __file__)
 log = logging.getLogger("red.Trusty-cogs.badges")
 
+GIF_SIZE_LIMIT = 8 * 1024 * 1024
+# Animated badges are kept under discords default upload limit
+# unless the guild they're made in allows larger files
+
+MAX_GIF_FRAMES = 50
+# Most frames kept from a gif avatar, longer avatars have frames
+# dropped evenly with the remaining frames lasting longer
+
+GIF_BADGE_SIZE = (500, 339)
+# Animated badges are shrunk to fit within this size
+
+BARCODE_CACHE_SIZE = 128
+# How many users barcodes are kept ready to paste
+
 
 @cog_i18n(_)
 class Badges(commands.Cog):
@@ -36,6 +52,8 @@ class Badges(commands.Cog):
         default_global = {"badges": blank_template}
         self.config.register_global(**default_global)
         self.config.register_guild(**default_guild)
+        self.templates: Dict[str, Image.Image] = {}
+        self.barcodes: "OrderedDict[Tuple[int, bool], Image.Image]" = OrderedDict()
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
@@ -80,15 +98,90 @@ class Badges(commands.Cog):
         img.putdata(newData)
         return img
 
-    async def dl_image(self, url: str) -> BytesIO:
+    async def dl_image(self, url: str) -> Optional[BytesIO]:
         """Download bytes like object of user avatar"""
         async with aiohttp.ClientSession() as session:
             async with session.get(str(url)) as resp:
+                if resp.status != 200:
+                    log.error("Error downloading %s: HTTP %s", url, resp.status)
+                    return None
                 test = await resp.read()
                 return BytesIO(test)
 
+    @staticmethod
+    def is_image(data: bytes) -> bool:
+        try:
+            with Image.open(BytesIO(data)) as img:
+                img.verify()
+        except Exception:
+            return False
+        return True
+
+    async def get_template(self, badge: Badge) -> Optional[Image.Image]:
+        """
+        Returns a copy of the badges template image
+
+        Templates are saved to the cogs data folder the first time they're
+        downloaded and kept decoded in memory after that.
+        Returns `None` if the template can't be downloaded.
+        """
+        if badge.file_name not in self.templates:
+            name = hashlib.sha1(badge.file_name.encode()).hexdigest()
+            path = cog_data_path(self) / "templates" / name
+            data = None
+            if path.exists():
+                data = path.read_bytes()
+                if not self.is_image(data):
+                    log.info(
+                        "Saved template for %s is unreadable, downloading it again",
+                        badge.badge_name,
+                    )
+                    path.unlink()
+                    data = None
+            if data is None:
+                download = await self.dl_image(badge.file_name)
+                if download is None or not self.is_image(download.getvalue()):
+                    log.error("Could not download the template for %s", badge.badge_name)
+                    return None
+                data = download.getvalue()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # written beside the template first so a partial write is never read back
+                temp = path.with_suffix(".tmp")
+                temp.write_bytes(data)
+                temp.replace(path)
+            with Image.open(BytesIO(data)) as template:
+                self.templates[badge.file_name] = template.convert("RGBA")
+        return self.templates[badge.file_name].copy()
+
+    def make_barcode(self, user_id: int, is_inverted: bool) -> Image:
+        """Build the barcode strip pasted on every badge for a user"""
+        barcode = BytesIO()
+        generate("code39", str(user_id), writer=ImageWriter(self), output=barcode)
+        barcode = Image.open(barcode)
+        barcode = self.remove_white_barcode(barcode)
+        if is_inverted:
+            barcode = self.invert_barcode(barcode)
+        barcode = barcode.convert("RGBA")
+        return barcode.resize((555, 125), Image.ANTIALIAS)
+
+    async def get_barcode(self, user_id: int, is_inverted: bool) -> Image:
+        key = (user_id, is_inverted)
+        if key in self.barcodes:
+            self.barcodes.move_to_end(key)
+            return self.barcodes[key]
+        task = functools.partial(self.make_barcode, user_id, is_inverted)
+        barcode = await self.bot.loop.run_in_executor(None, task)
+        self.barcodes[key] = barcode
+        while len(self.barcodes) > BARCODE_CACHE_SIZE:
+            self.barcodes.popitem(last=False)
+        return barcode
+
     def make_template(
-        self, user: Union[discord.User, discord.Member], badge: Badge, template: Image
+        self,
+        user: Union[discord.User, discord.Member],
+        badge: Badge,
+        template: Image,
+        barcode: Image,
     ) -> Image:
         """Build the base template before determining animated or not"""
         if hasattr(user, "roles"):
@@ -111,25 +204,15 @@ class Badges(commands.Cog):
             status = _("AWAITING INSTRUCTIONS")
         if str(status) == "dnd":
             status = _("MIA")
-        barcode = BytesIO()
-        log.debug(type(barcode))
-        generate("code39", str(user.id), writer=ImageWriter(self), output=barcode)
-        barcode = Image.open(barcode)
-        barcode = self.remove_white_barcode(barcode)
         fill = (0, 0, 0)  # text colour fill
         if badge.is_inverted:
             fill = (255, 255, 255)
-            barcode = self.invert_barcode(barcode)
-        template = Image.open(template)
-        template = template.convert("RGBA")
-        barcode = barcode.convert("RGBA")
-        barcode = barcode.resize((555, 125), Image.ANTIALIAS)
         template.paste(barcode, (400, 520), barcode)
         # font for user information
         font_loc = str(bundled_data_path(self) / "arial.ttf")
         try:
-            font1 = ImageFont.truetype(font_loc, 30)
-            font2 = ImageFont.truetype(font_loc, 24)
+            font1 = load_font(font_loc, 30)
+            font2 = load_font(font_loc, 24)
         except Exception as e:
             print(e)
             font1 = None
@@ -154,36 +237,76 @@ class Badges(commands.Cog):
             draw.text((60, 585), str(user.joined_at), fill=fill, font=font2)
         else:
             draw.text((60, 585), str(user.created_at), fill=fill, font=font2)
-        barcode.close()
         return template
 
-    def make_animated_gif(self, template: Image, avatar: BytesIO) -> BytesIO:
+    def make_animated_gif(
+        self, template: Image, avatar: Image, size_limit: int = GIF_SIZE_LIMIT
+    ) -> BytesIO:
         """Create animated badge from gif avatar"""
-        gif_list = [frame.copy() for frame in ImageSequence.Iterator(avatar)]
-        img_list = []
-        num = 0
-        for frame in gif_list:
-            temp2 = template.copy()
-            watermark = frame.copy()
-            watermark = watermark.convert("RGBA")
-            watermark = watermark.resize((100, 100))
+        # The template is shrunk once and the avatar frames are pasted
+        # at the same positions scaled down to match
+        base = template.convert("RGBA")
+        base.thumbnail(GIF_BADGE_SIZE, Image.ANTIALIAS)
+        scale = base.width / template.width
+
+        def scaled(*values: int) -> tuple:
+            return tuple(max(1, int(v * scale)) for v in values)
+
+        def render(frame: Image) -> Image:
+            frame = frame.convert("RGBA")
+            badge = base.copy()
+            watermark = frame.resize(scaled(100, 100))
             watermark.putalpha(128)
-            id_image = frame.resize((165, 165))
-            temp2.paste(watermark, (845, 45, 945, 145), watermark)
-            temp2.paste(id_image, (60, 95, 225, 260))
-            temp2.thumbnail((500, 339), Image.ANTIALIAS)
-            img_list.append(temp2)
-            num += 1
-            temp = BytesIO()
+            badge.paste(watermark, scaled(845, 45), watermark)
+            badge.paste(frame.resize(scaled(165, 165)), scaled(60, 95))
+            return badge
 
-            temp2.save(
-                temp, format="GIF", save_all=True, append_images=img_list, duration=0, loop=0
+        # Every frame is about the size of the first frame on its own
+        # and usually smaller since only the changes are stored after the first
+        sample = BytesIO()
+        render(avatar).save(sample, format="GIF")
+        budget = max(1, min(MAX_GIF_FRAMES, size_limit // sample.tell()))
+        while True:
+            frames = self.pick_frames(avatar, budget)
+            rendered = [render(frame) for frame in frames]
+            temp = BytesIO()
+            rendered[0].save(
+                temp,
+                format="GIF",
+                save_all=True,
+                append_images=rendered[1:],
+                duration=[frame.info["duration"] for frame in frames],
+                loop=0,
             )
             temp.name = "temp.gif"
-            if sys.getsizeof(temp) > 7000000 and sys.getsizeof(temp) < 8000000:
+            size = temp.tell()
+            if size <= size_limit or budget == 1:
                 break
+            # The estimate was off, try again with fewer frames to fit the limit
+            budget = max(1, min(budget - 1, int(budget * size_limit / size * 0.9)))
+        temp.seek(0)
         return temp
 
+    @staticmethod
+    def pick_frames(avatar: Image, budget: int) -> List[Image]:
+        """
+        Picks evenly spaced frames of `avatar` with at most `budget` frames
+
+        Each picked frame lasts as long as the frames dropped after it
+        so the animation plays at the same speed.
+        """
+        n_frames = getattr(avatar, "n_frames", 1)
+        step = max(1, math.ceil(n_frames / budget))
+        frames = []
+        for index, frame in enumerate(ImageSequence.Iterator(avatar)):
+            duration = frame.info.get("duration", 0) or 0
+            if index % step == 0:
+                frames.append(frame.copy())
+                frames[-1].info["duration"] = duration
+            else:
+                frames[-1].info["duration"] += duration
+        return frames
+
     def make_badge(self, template: Image, avatar: Image):
         """Create basic badge from regular avatar"""
         watermark = avatar.convert("RGBA")
@@ -197,10 +320,15 @@ class Badges(commands.Cog):
         temp.name = "temp.gif"
         return temp
 
-    async def create_badge(self, user, badge, is_gif: bool):
+    async def create_badge(self, user, badge, is_gif: bool, size_limit: int = GIF_SIZE_LIMIT):
         """Async create badges handler"""
-        template_img = await self.dl_image(badge.file_name)
-        task = functools.partial(self.make_template, user=user, badge=badge, template=template_img)
+        template_img = await self.get_template(badge)
+        if template_img is None:
+            return
+        barcode = await self.get_barcode(user.id, badge.is_inverted)
+        task = functools.partial(
+            self.make_template, user=user, badge=badge, template=template_img, barcode=barcode
+        )
         task = self.bot.loop.run_in_executor(None, task)
         try:
             template = await asyncio.wait_for(task, timeout=60)
@@ -208,8 +336,13 @@ class Badges(commands.Cog):
             return
         if user.is_avatar_animated() and is_gif:
             url = user.avatar_url_as(format="gif")
-            avatar = Image.open(await self.dl_image(url))
-            task = functools.partial(self.make_animated_gif, template=template, avatar=avatar)
+            data = await self.dl_image(url)
+            if data is None:
+                return
+            avatar = Image.open(data)
+            task = functools.partial(
+                self.make_animated_gif, template=template, avatar=avatar, size_limit=size_limit
+            )
             task = self.bot.loop.run_in_executor(None, task)
             try:
                 temp = await asyncio.wait_for(task, timeout=60)
@@ -218,7 +351,10 @@ class Badges(commands.Cog):
 
         else:
             url = user.avatar_url_as(format="png")
-            avatar = Image.open(await self.dl_image(url))
+            data = await self.dl_image(url)
+            if data is None:
+                return
+            avatar = Image.open(data)
             task = functools.partial(self.make_badge, template=template, avatar=avatar)
             task = self.bot.loop.run_in_executor(None, task)
             try:
@@ -288,7 +424,8 @@ class Badges(commands.Cog):
             await ctx.send(_("`{}` is not an available badge.").format(badge))
             return
         async with ctx.channel.typing():
-            badge_img = await self.create_badge(user, badge_obj, True)
+            size_limit = ctx.guild.filesize_limit if ctx.guild else GIF_SIZE_LIMIT
+            badge_img = await self.create_badge(user, badge_obj, True, size_limit)
             if badge_img is None:
                 await ctx.send(_("Something went wrong sorry!"))
                 return
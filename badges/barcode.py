@@ -10,6 +10,7 @@ import os
 import string
 import xml.dom
 import logging
+from functools import lru_cache
 
 from redbot.core.data_manager import bundled_data_path
 
@@ -34,6 +35,12 @@ except NameError:
 log = logging.getLogger("red.Trusty-cogs.badges")
 
 
+@lru_cache(maxsize=16)
+def load_font(path, size):
+    """Fonts are shared by every badge and barcode instead of read from disk each time"""
+    return ImageFont.truetype(path, size)
+
+
 def mm2px(mm, dpi=300):
     return (mm * dpi) / 25.4
 
@@ -409,7 +416,7 @@ else:
             self._draw.rectangle(size, outline=color, fill=color)
 
         def _paint_text(self, xpos, ypos):
-            font = ImageFont.truetype(self.FONT, self.font_size * 2)
+            font = load_font(self.FONT, self.font_size * 2)
             width, height = font.getsize(self.text)
             pos = (mm2px(xpos, self.dpi) - width // 2, mm2px(ypos, self.dpi) - height // 4)
             self._draw.text(pos, self.text, font=font, fill=self.foreground)
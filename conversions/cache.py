@@ -0,0 +1,120 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class TTLCache:
+    """
+    Values kept for `ttl` seconds
+
+    While a value is being fetched everyone else asking for the same key
+    waits on that fetch instead of starting their own.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.fetches = 0
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def get(self, key: Hashable) -> Any:
+        if key not in self._data:
+            return None
+        stored, value = self._data[key]
+        if time.monotonic() - stored > self.ttl:
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+        if key not in self._inflight:
+            self.fetches += 1
+            self._inflight[key] = asyncio.ensure_future(self._run_fetch(key, fetch))
+        # shielded so one caller being cancelled doesn't cancel the fetch everyone is waiting on
+        return await asyncio.shield(self._inflight[key])
+
+    async def _run_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+
+class BatchedTTLCache(TTLCache):
+    """
+    TTLCache where every key missed within `delay` seconds is fetched together
+
+    `fetch_many` is given a list of keys and returns a dict of the values found.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        fetch_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        delay: float = 0.05,
+    ):
+        super().__init__(ttl)
+        self.fetch_many = fetch_many
+        self.delay = delay
+        self._pending: Set[Hashable] = set()
+        self._batch: Optional[asyncio.Task] = None
+
+    async def get_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Returns the values found for `keys`, keys without a value are left out
+        """
+        loop = asyncio.get_running_loop()
+        found = {}
+        waiting = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+                continue
+            if key not in self._inflight:
+                self._inflight[key] = loop.create_future()
+                self._pending.add(key)
+            waiting[key] = self._inflight[key]
+        if self._pending and self._batch is None:
+            self._batch = loop.create_task(self._run_batch())
+        for key, future in waiting.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def _run_batch(self) -> None:
+        await asyncio.sleep(self.delay)
+        keys = list(self._pending)
+        self._pending.clear()
+        self._batch = None
+        self.fetches += 1
+        try:
+            values = await self.fetch_many(keys)
+        except asyncio.CancelledError:
+            for key in keys:
+                self._inflight.pop(key).cancel()
+            raise
+        except Exception as e:
+            for key in keys:
+                future = self._inflight.pop(key)
+                future.set_exception(e)
+                future.exception()
+            return
+        for key in keys:
+            value = values.get(key)
+            if value is not None:
+                self.set(key, value)
+            self._inflight.pop(key).set_result(value)
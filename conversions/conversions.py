@@ -1,4 +1,5 @@
 import datetime
+import functools
 import logging
 from typing import Dict, Optional, Union, List
 
@@ -7,11 +8,19 @@ import discord
 from redbot.core import commands
 from redbot.core.bot import Red
 
+from .cache import BatchedTTLCache, TTLCache
 from .coin import Coin, CoinBase
 from .errors import CoinMarketCapError
 
 log = logging.getLogger("red.Trusty-cogs.Conversions")
 
+QUOTE_TTL = 60
+# CoinMarketCap only updates quotes once a minute so every
+# command within that time is answered with the same quote
+
+QUOTE_BATCH_DELAY = 0.05
+# Coins asked for within this many seconds of each other are requested together
+
 
 class Conversions(commands.Cog):
     """
@@ -20,12 +29,16 @@ class Conversions(commands.Cog):
     """
 
     __author__ = ["TrustyJAID"]
-    __version__ = "1.3.1"
+    __version__ = "1.4.0"
 
     def __init__(self, bot: Red) -> None:
         self.bot = bot
         self.session = aiohttp.ClientSession()
         self.coin_index: Dict[int, CoinBase] = {}
+        self.symbol_index: Dict[str, List[int]] = {}
+        self.name_index: Dict[str, List[int]] = {}
+        self.quote_cache = BatchedTTLCache(QUOTE_TTL, self.fetch_quotes, QUOTE_BATCH_DELAY)
+        self.rate_cache = TTLCache(QUOTE_TTL)
 
     def cog_unload(self) -> None:
         self.bot.loop.create_task(self.session.close())
@@ -161,21 +174,26 @@ class Conversions(commands.Cog):
     async def get_coins(self, coins: List[str]) -> List[Coin]:
         if not self.coin_index:
             await self.checkcoins()
-        to_ret = []
-        coin_ids = []
+        coin_ids = set()
         for search_coin in coins:
-            for _id, coin in self.coin_index.items():
-                if search_coin.upper() == coin.symbol or search_coin.lower() == coin.name.lower():
-                    coin_ids.append(str(_id))
+            coin_ids.update(self.symbol_index.get(search_coin.upper(), []))
+            coin_ids.update(self.name_index.get(search_coin.lower(), []))
+        quotes = await self.quote_cache.get_many(sorted(coin_ids))
+        return [quotes[coin_id] for coin_id in sorted(quotes)]
 
-        params = {"id": ",".join(coin_ids)}
+    async def fetch_quotes(self, coin_ids: List[int]) -> Dict[int, Coin]:
+        """
+        Requests the latest quotes for every coin in one call
+        """
+        params = {"id": ",".join(str(coin_id) for coin_id in coin_ids)}
         url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
         async with self.session.get(url, headers=await self.get_header(), params=params) as resp:
             data = await resp.json()
-            coins_data = data.get("data",  {})
-            for coin_id, coin_data in coins_data.items():
-                to_ret.append(Coin.from_json(coin_data))
-        return to_ret
+        coins_data = data.get("data", {})
+        log.debug("Fetched quotes for %s coins", len(coins_data))
+        return {
+            int(coin_id): Coin.from_json(coin_data) for coin_id, coin_data in coins_data.items()
+        }
 
     async def get_latest_coins(self) -> List[Coin]:
         """
@@ -207,6 +225,12 @@ class Conversions(commands.Cog):
                 data = await resp.json()
             if resp.status == 200:
                 self.coin_index = {c["id"]: CoinBase(**c) for c in data.get("data", [])}
+                # Symbols and names aren't unique so each maps to every matching coin
+                self.symbol_index = {}
+                self.name_index = {}
+                for coin in self.coin_index.values():
+                    self.symbol_index.setdefault(coin.symbol, []).append(coin.id)
+                    self.name_index.setdefault(coin.name.lower(), []).append(coin.id)
             elif resp.status == 401:
                 raise CoinMarketCapError(
                     "The bot owner has not set an API key. "
@@ -488,6 +512,10 @@ class Conversions(commands.Cog):
 
     async def conversionrate(self, currency1: str, currency2: str) -> Optional[float]:
         """Function to convert different currencies"""
+        fetch = functools.partial(self.fetch_conversionrate, currency1, currency2)
+        return await self.rate_cache.get_or_fetch((currency1, currency2), fetch)
+
+    async def fetch_conversionrate(self, currency1: str, currency2: str) -> Optional[float]:
         conversion = None
         try:
             url = f"https://query1.finance.yahoo.com/v8/finance/chart/{currency1}{currency2}=x"
@@ -2,11 +2,16 @@ import asyncio
 import functools
 import logging
 import os
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, List, NamedTuple, Tuple
 
 import aiohttp
 import discord
 import youtube_dl
+from moviepy.config import get_setting
 from moviepy.editor import CompositeVideoClip, TextClip, VideoFileClip
+from PIL import Image, ImageDraw, ImageFont
 from redbot.core import checks, commands
 from redbot.core.data_manager import cog_data_path
 
@@ -20,6 +25,27 @@ MIKU_LINK = "https://youtu.be/qeJjQGF6gz4"
 FONT_FILE = "https://github.com/matomo-org/travis-scripts/raw/master/fonts/Verdana.ttf"
 log = logging.getLogger("red.trusty-cogs.crabrave")
 
+FFMPEG = get_setting("FFMPEG_BINARY")
+# The same ffmpeg moviepy was set up with
+
+VIDEO_CACHE_BYTES = 64 * 1024 * 1024
+# Total size of finished videos kept to answer repeated text
+
+
+class Rave(NamedTuple):
+    name: str
+    title: str
+    link: str
+    template: str
+    duration: float
+    volume: float
+    colour: str
+    stroke_width: int
+
+
+CRAB = Rave("crabrave", "Crabrave", CRAB_LINK, "crab_template.mp4", 15.4, 0.1, "white", 2)
+MIKU = Rave("mikurave", "Mikurave", MIKU_LINK, "miku_template.mp4", 40.0, 0.7, "DarkSlateGrey", 0)
+
 
 class CrabRave(commands.Cog):
     """
@@ -27,10 +53,12 @@ class CrabRave(commands.Cog):
     """
 
     __author__ = ["DankMemer Team", "TrustyJAID", "thisisjvgrace"]
-    __version__ = "1.1.2"
+    __version__ = "1.2.0"
 
     def __init__(self, bot):
         self.bot = bot
+        self.videos: "OrderedDict[Tuple[str, Tuple[str, ...]], bytes]" = OrderedDict()
+        self.videos_size = 0
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
@@ -86,46 +114,191 @@ class CrabRave(commands.Cog):
                 return False
         return True
 
-    @commands.command(aliases=["crabrave"])
-    @commands.cooldown(1, 20, commands.BucketType.guild)
-    @commands.max_concurrency(2, commands.BucketType.default)
-    @checks.bot_has_permissions(attach_files=True)
-    async def crab(self, ctx: commands.Context, *, text: str) -> None:
-        """Make crab rave videos
+    async def run_ffmpeg(self, *args: str, timeout: float = 300) -> bool:
+        proc = await asyncio.create_subprocess_exec(
+            FFMPEG,
+            "-y",
+            "-loglevel",
+            "error",
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            log.error("Error running ffmpeg: %s", stderr.decode(errors="replace"))
+            return False
+        return True
 
-        There must be exactly 1 `,` to split the message
+    async def check_base_clip(self, rave: Rave) -> bool:
+        """
+        Cuts the template to length with its audio already at the right volume
+
+        This is done once so every video after can copy the audio as is.
+        """
+        base = cog_data_path(self) / f"{rave.name}_base.mp4"
+        if base.is_file():
+            return True
+        temp = cog_data_path(self) / f"{rave.name}_base.tmp.mp4"
+        # written to a temporary name first so an interrupted cut isn't used
+        done = await self.run_ffmpeg(
+            "-i",
+            str(cog_data_path(self) / rave.template),
+            "-t",
+            str(rave.duration),
+            "-af",
+            f"volume={rave.volume}",
+            "-c:v",
+            "copy",
+            "-c:a",
+            "aac",
+            "-f",
+            "mp4",
+            str(temp),
+        )
+        if not done:
+            return False
+        os.replace(temp, base)
+        return True
+
+    def render_text(self, rave: Rave, t: List[str]) -> Image.Image:
+        """Draws the text layers on a transparent image placed at the top of the video"""
+        font = ImageFont.truetype(str(cog_data_path(self) / "Verdana.ttf"), 48)
+        lines = [
+            (t[0], 200, rave.stroke_width),
+            ("____________________", 210, 0),
+            (t[1], 270, rave.stroke_width),
+        ]
+        sizes = [font.getsize(text, stroke_width=stroke) for text, y, stroke in lines]
+        width = max(w for w, h in sizes)
+        height = max(y + h for (text, y, stroke), (w, h) in zip(lines, sizes))
+        image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for (text, y, stroke), (w, h) in zip(lines, sizes):
+            draw.text(
+                ((width - w) // 2, y),
+                text,
+                font=font,
+                fill=rave.colour,
+                stroke_width=stroke,
+                stroke_fill="black",
+            )
+        return image
+
+    async def make_rave(self, rave: Rave, t: List[str], u_id: int) -> bool:
+        """
+        Overlays the text onto the base clip in a single ffmpeg pass
+
+        Only the video is encoded, on every core, the audio is copied from the base clip.
         """
+        text_fp = cog_data_path(self) / f"{u_id}{rave.name}.png"
+        task = functools.partial(self.render_text, rave=rave, t=t)
+        image = await self.bot.loop.run_in_executor(None, task)
+        image.save(text_fp, format="PNG")
+        try:
+            return await self.run_ffmpeg(
+                "-i",
+                str(cog_data_path(self) / f"{rave.name}_base.mp4"),
+                "-loop",
+                "1",
+                "-i",
+                str(text_fp),
+                "-filter_complex",
+                # the text fades in over the first second like the moviepy crossfadein
+                "[1:v]format=rgba,fade=t=in:st=0:d=1:alpha=1[text];"
+                "[0:v][text]overlay=(W-w)/2:0:shortest=1,format=yuv420p[video]",
+                "-map",
+                "[video]",
+                "-map",
+                "0:a",
+                "-t",
+                str(rave.duration),
+                "-c:v",
+                "libx264",
+                "-preset",
+                "superfast",
+                "-threads",
+                "0",
+                "-c:a",
+                "copy",
+                "-movflags",
+                "+faststart",
+                str(cog_data_path(self) / f"{u_id}{rave.name}.mp4"),
+            )
+        finally:
+            text_fp.unlink()
+
+    def cache_video(self, key: Tuple[str, Tuple[str, ...]], data: bytes) -> None:
+        if len(data) > VIDEO_CACHE_BYTES:
+            return
+        if key in self.videos:
+            self.videos_size -= len(self.videos.pop(key))
+        self.videos[key] = data
+        self.videos_size += len(data)
+        while self.videos_size > VIDEO_CACHE_BYTES:
+            _key, old = self.videos.popitem(last=False)
+            self.videos_size -= len(old)
+
+    async def send_rave(
+        self, ctx: commands.Context, rave: Rave, fallback: Callable[[List[str], int], bool]
+    ) -> None:
         async with ctx.typing():
             t = ctx.message.clean_content[len(f"{ctx.prefix}{ctx.invoked_with}") :]
             t = t.upper().replace(", ", ",").split(",")
-            if not await self.check_video_file(CRAB_LINK, "crab_template.mp4"):
-                return await ctx.send("I couldn't download the template file.")
-            if not await self.check_font_file():
-                return await ctx.send("I couldn't download the font file.")
             if len(t) != 2:
                 return await ctx.send("You must submit exactly two strings split by comma")
             if (not t[0] and not t[0].strip()) or (not t[1] and not t[1].strip()):
                 return await ctx.send("Cannot render empty text")
-            fake_task = functools.partial(self.make_crab, t=t, u_id=ctx.message.id)
-            task = self.bot.loop.run_in_executor(None, fake_task)
-
+            key = (rave.name, tuple(t))
+            if key in self.videos:
+                self.videos.move_to_end(key)
+                file = discord.File(BytesIO(self.videos[key]), filename=f"{rave.name}.mp4")
+                return await ctx.send(files=[file])
+            if not await self.check_video_file(rave.link, rave.template):
+                return await ctx.send("I couldn't download the template file.")
+            if not await self.check_font_file():
+                return await ctx.send("I couldn't download the font file.")
             try:
-                await asyncio.wait_for(task, timeout=300)
+                done = await self.check_base_clip(rave) and await self.make_rave(
+                    rave, t, ctx.message.id
+                )
+                if not done:
+                    # ffmpeg couldn't do it alone so fall back to compositing in moviepy
+                    task = functools.partial(fallback, t=t, u_id=ctx.message.id)
+                    task = self.bot.loop.run_in_executor(None, task)
+                    await asyncio.wait_for(task, timeout=300)
             except asyncio.TimeoutError:
                 # log.error("Error generating crabrave video", exc_info=True)
-                await ctx.send("Crabrave Video took too long to generate.")
+                await ctx.send(f"{rave.title} Video took too long to generate.")
                 return
-            fp = cog_data_path(self) / f"{ctx.message.id}crabrave.mp4"
-            file = discord.File(str(fp), filename="crabrave.mp4")
+            fp = cog_data_path(self) / f"{ctx.message.id}{rave.name}.mp4"
+            self.cache_video(key, fp.read_bytes())
+            file = discord.File(str(fp), filename=f"{rave.name}.mp4")
             try:
                 await ctx.send(files=[file])
             except Exception:
-                log.error("Error sending crabrave video", exc_info=True)
+                log.error(f"Error sending {rave.name} video", exc_info=True)
                 pass
             try:
                 os.remove(fp)
             except Exception:
-                log.error("Error deleting crabrave video", exc_info=True)
+                log.error(f"Error deleting {rave.name} video", exc_info=True)
+
+    @commands.command(aliases=["crabrave"])
+    @commands.cooldown(1, 20, commands.BucketType.guild)
+    @commands.max_concurrency(2, commands.BucketType.default)
+    @checks.bot_has_permissions(attach_files=True)
+    async def crab(self, ctx: commands.Context, *, text: str) -> None:
+        """Make crab rave videos
+
+        There must be exactly 1 `,` to split the message
+        """
+        await self.send_rave(ctx, CRAB, self.make_crab)
 
     def make_crab(self, t: str, u_id: int) -> bool:
         """Non blocking crab rave video generation from DankMemer bot
@@ -163,11 +336,11 @@ class CrabRave(commands.Cog):
         video = video.volumex(0.1)
         video.write_videofile(
             str(cog_data_path(self)) + f"/{u_id}crabrave.mp4",
-            threads=1,
+            threads=os.cpu_count(),
             preset="superfast",
             verbose=False,
             logger=None,
-            temp_audiofile=str(cog_data_path(self) / f"{u_id}crabraveaudio.mp3")
+            temp_audiofile=str(cog_data_path(self) / f"{u_id}crabraveaudio.mp3"),
             # ffmpeg_params=["-filter:a", "volume=0.5"]
         )
         clip.close()
@@ -183,37 +356,7 @@ class CrabRave(commands.Cog):
 
         There must be exactly 1 `,` to split the message
         """
-        async with ctx.typing():
-            t = ctx.message.clean_content[len(f"{ctx.prefix}{ctx.invoked_with}") :]
-            t = t.upper().replace(", ", ",").split(",")
-            if not await self.check_video_file(MIKU_LINK, "miku_template.mp4"):
-                return await ctx.send("I couldn't download the template file.")
-            if not await self.check_font_file():
-                return await ctx.send("I couldn't download the font file.")
-            if len(t) != 2:
-                return await ctx.send("You must submit exactly two strings split by comma")
-            if (not t[0] and not t[0].strip()) or (not t[1] and not t[1].strip()):
-                return await ctx.send("Cannot render empty text")
-            fake_task = functools.partial(self.make_miku, t=t, u_id=ctx.message.id)
-            task = self.bot.loop.run_in_executor(None, fake_task)
-
-            try:
-                await asyncio.wait_for(task, timeout=300)
-            except asyncio.TimeoutError:
-                # log.error("Error generating mikurave video", exc_info=True)
-                await ctx.send("Mikurave Video took too long to generate.")
-                return
-            fp = cog_data_path(self) / f"{ctx.message.id}mikurave.mp4"
-            file = discord.File(str(fp), filename="mikurave.mp4")
-            try:
-                await ctx.send(files=[file])
-            except Exception:
-                log.error("Error sending mikurave video", exc_info=True)
-                pass
-            try:
-                os.remove(fp)
-            except Exception:
-                log.error("Error deleting mikurave video", exc_info=True)
+        await self.send_rave(ctx, MIKU, self.make_miku)
 
     def make_miku(self, t: str, u_id: int) -> bool:
         """Non blocking miku rave video generation from DankMemer bot
@@ -252,11 +395,11 @@ class CrabRave(commands.Cog):
         video = video.volumex(0.7)
         video.write_videofile(
             str(cog_data_path(self)) + f"/{u_id}mikurave.mp4",
-            threads=1,
+            threads=os.cpu_count(),
             preset="superfast",
             verbose=False,
             logger=None,
-            temp_audiofile=str(cog_data_path(self) / f"{u_id}mikuraveaudio.mp3")
+            temp_audiofile=str(cog_data_path(self) / f"{u_id}mikuraveaudio.mp3"),
             # ffmpeg_params=["-filter:a", "volume=0.5"]
         )
         clip.close()
@@ -8,6 +8,7 @@ import discord
 from redbot.core import Config, commands
 from redbot.core.bot import Red
 
+from .api import HockeyAPI
 from .game import Game
 from .helper import (
     HockeyStandings,
@@ -34,6 +35,7 @@ class MixinMeta(ABC):
         self.TEST_LOOP: bool
         self.all_pickems: dict
         self.session: aiohttp.ClientSession
+        self.api: HockeyAPI
         self.pickems_config: Config
         self._ready: asyncio.Event
 
@@ -177,7 +179,9 @@ class MixinMeta(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    async def create_gdc(self, guild: discord.Guild, game_data: Optional[Game] = None) -> None:
+    async def create_gdc(
+        self, guild: discord.Guild, game_data: Optional[Game] = None, team: Optional[str] = None
+    ) -> None:
         raise NotImplementedError()
 
     @abstractmethod
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+import aiohttp
+
+from .constants import BASE_URL
+
+log = logging.getLogger("red.trusty-cogs.Hockey")
+
+ENDPOINT_TTL = {
+    f"{BASE_URL}/api/v1/standings": 300,
+    f"{BASE_URL}/api/v1/schedule": 60,
+    f"{BASE_URL}/api/v1/game/": 30,
+    f"{BASE_URL}/api/v1/people/": 3600,
+    "https://records.nhl.com/site/api/player/": 86400,
+}
+# How long a response is considered fresh, matched by the start of the url.
+# Anything not listed here uses the default TTL.
+
+DEFAULT_TTL = 60
+STALE_FACTOR = 5
+# Responses are served stale while refreshing in the background
+# for up to STALE_FACTOR times their TTL after they were fetched
+
+
+class HockeyAPI:
+    """
+    Shared NHL API client for the Hockey cog
+
+    Responses are cached per url with a TTL based on the endpoint.
+    Once an entry is past its TTL it is still served while a single
+    background refresh replaces it, and concurrent requests for the
+    same url share one upstream request.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, maxsize: int = 512):
+        self.session = session
+        self.maxsize = maxsize
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "stale": 0, "misses": 0, "requests": 0}
+
+    @staticmethod
+    def ttl_for(url: str) -> int:
+        for endpoint, ttl in ENDPOINT_TTL.items():
+            if url.startswith(endpoint):
+                return ttl
+        return DEFAULT_TTL
+
+    async def get_json(self, url: str) -> Any:
+        """
+        Returns the json response for `url` using the cache where possible
+
+        The returned data is shared between callers and must not be modified.
+        """
+        ttl = self.ttl_for(url)
+        if url in self._cache:
+            fetched, data = self._cache[url]
+            age = time.monotonic() - fetched
+            if age < ttl:
+                self.stats["hits"] += 1
+                return data
+            if age < ttl * STALE_FACTOR:
+                self.stats["stale"] += 1
+                self._refresh(url)
+                return data
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._refresh(url))
+
+    def _refresh(self, url: str) -> asyncio.Task:
+        if url not in self._in_flight:
+            task = asyncio.create_task(self._fetch(url))
+            task.add_done_callback(self._log_failure)
+            self._in_flight[url] = task
+        return self._in_flight[url]
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log.debug("Error refreshing NHL API data", exc_info=task.exception())
+
+    async def _fetch(self, url: str) -> Any:
+        try:
+            self.stats["requests"] += 1
+            async with self.session.get(url) as resp:
+                data = await resp.json()
+            self._cache.pop(url, None)
+            self._cache[url] = (time.monotonic(), data)
+            if len(self._cache) > self.maxsize:
+                # dicts keep insertion order so this drops the oldest response
+                del self._cache[next(iter(self._cache))]
+            return data
+        finally:
+            del self._in_flight[url]
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+async def get_json(
+    url: str, session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None
+) -> Any:
+    """
+    Gets json data from `url` through the cogs API client when available
+    """
+    if isinstance(session, HockeyAPI):
+        return await session.get_json(url)
+    if session is None:
+        async with aiohttp.ClientSession() as new_session:
+            async with new_session.get(url) as resp:
+                return await resp.json()
+    async with session.get(url) as resp:
+        return await resp.json()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .game import Game
+
+
+class TTLCache:
+    """
+    A small dict based cache where every entry expires after a set time
+    """
+
+    def __init__(self, ttl: float, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.ttl
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + ttl, value)
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            self.expire()
+            while len(self._data) > self.maxsize:
+                # dicts keep insertion order so this drops the oldest entry
+                del self._data[next(iter(self._data))]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self._data.pop(key)[1]
+        except KeyError:
+            return default
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires, _v) in self._data.items() if expires < now]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class GameCache(TTLCache):
+    """
+    Game objects keyed by game ID
+
+    Final games won't change anymore so they are kept for hours and shared
+    between every guild resolving pickems, anything else is only kept long
+    enough to avoid fetching the same game repeatedly in one pass.
+    """
+
+    FINAL_TTL = 6 * 60 * 60
+    PENDING_TTL = 5 * 60
+
+    def __init__(self, maxsize: Optional[int] = 256):
+        super().__init__(self.PENDING_TTL, maxsize)
+
+    def add(self, game: Game) -> None:
+        ttl = self.FINAL_TTL if game.game_state == "Final" else self.PENDING_TTL
+        self.set(str(game.game_id), game, ttl=ttl)
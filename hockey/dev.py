@@ -284,6 +284,9 @@ class HockeyDev(MixinMeta):
                     for name, count in value.items():
                         msg += f"__{str(name).title()} Standings Updates:__ **{count}**\n"
                     msg += "\n"
+            msg += "**API Cache**\n"
+            for name, count in self.api.stats.items():
+                msg += f"__{name.title()}:__ **{count}**\n"
             embed_list = []
             for pages in pagify(msg, page_length=6000):
                 embed = discord.Embed(title=_("Hockey Statistics"))
@@ -1,10 +1,11 @@
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 import discord
 from redbot.core import commands
 from redbot.core.i18n import Translator
+from redbot.core.utils import bounded_gather
 from redbot.core.utils.chat_formatting import humanize_list
 from redbot.core.utils.menus import start_adding_reactions
 
@@ -17,6 +18,9 @@ log = logging.getLogger("red.trusty-cogs.Hockey")
 
 _ = Translator("Hockey", __file__)
 
+GDC_CONCURRENCY = 5
+# The number of guilds to create or delete game day channels in at once
+
 
 class GameDayChannels(MixinMeta):
     """
@@ -255,49 +259,95 @@ class GameDayChannels(MixinMeta):
         return chn_name.lower()
 
     async def check_new_gdc(self) -> None:
+        """
+        Updates the game day channels in every guild
+
+        Guilds are grouped by their game day channel team so each team's
+        next game is only looked up once, then the channels for each guild
+        are created or deleted concurrently.
+        """
+        api_calls = 1
         game_list = await Game.get_games(
             session=self.session
         )  # Do this once so we don't spam the api
-        for guilds in await self.config.all_guilds():
-            guild = self.bot.get_guild(guilds)
+        api_calls += len(game_list)
+        guild_teams: Dict[Optional[str], List[discord.Guild]] = {}
+        for guild_id, data in (await self.config.all_guilds()).items():
+            guild = self.bot.get_guild(guild_id)
             if guild is None:
                 continue
-            if not await self.config.guild(guild).create_channels():
+            if not data["create_channels"]:
                 continue
-            team = await self.config.guild(guild).gdc_team()
-            if team != "all":
-                next_games = await Game.get_games_list(team, datetime.now(), session=self.session)
-                next_game = None
-                if next_games != []:
-                    next_game = await Game.from_url(next_games[0]["link"], session=self.session)
-                if next_game is None:
-                    continue
-                chn_name = await self.get_chn_name(next_game)
-                try:
-                    cur_channels = await self.config.guild(guild).gdc()
-                    if cur_channels:
-                        cur_channel = self.bot.get_channel(cur_channels[0])
-                    else:
-                        cur_channel = None
-                        # this is dumb but eh
-                except Exception:
-                    log.error("Error checking new GDC", exc_info=True)
-                    cur_channel = None
-                if cur_channel is None:
-                    await self.create_gdc(guild)
-                elif cur_channel.name != chn_name.lower():
-                    await self.delete_gdc(guild)
-                    await self.create_gdc(guild)
+            team = data["gdc_team"]
+            if team not in guild_teams:
+                guild_teams[team] = []
+            guild_teams[team].append(guild)
+
+        tasks = []
+        for team, guilds in guild_teams.items():
+            if team == "all":
+                tasks += [self.update_all_gdc(guild, game_list) for guild in guilds]
+                continue
+            next_games = await Game.get_games_list(team, datetime.now(), session=self.session)
+            api_calls += 1
+            if not next_games:
+                continue
+            next_game = await Game.from_url(next_games[0]["link"], session=self.session)
+            api_calls += 1
+            if next_game is None:
+                continue
+            tasks += [self.update_team_gdc(guild, team, next_game) for guild in guilds]
+        await bounded_gather(*tasks, limit=GDC_CONCURRENCY)
+        log.info(
+            "Checked game day channels in %s guilds for %s teams using %s NHL API requests",
+            len(tasks),
+            len(guild_teams),
+            api_calls,
+        )
 
+    async def update_team_gdc(self, guild: discord.Guild, team: str, next_game: Game) -> None:
+        """
+        Replaces the guilds game day channel if it's not for the teams next game
+        """
+        chn_name = await self.get_chn_name(next_game)
+        try:
+            cur_channels = await self.config.guild(guild).gdc()
+            if cur_channels:
+                cur_channel = self.bot.get_channel(cur_channels[0])
             else:
+                cur_channel = None
+                # this is dumb but eh
+        except Exception:
+            log.error("Error checking new GDC", exc_info=True)
+            cur_channel = None
+        try:
+            if cur_channel is None:
+                await self.create_gdc(guild, next_game, team)
+            elif cur_channel.name != chn_name.lower():
                 await self.delete_gdc(guild)
-                for game in game_list:
-                    await self.create_gdc(guild, game)
+                await self.create_gdc(guild, next_game, team)
+        except Exception:
+            log.exception("Error updating game day channels in %s", repr(guild))
 
-    async def create_gdc(self, guild: discord.Guild, game_data: Optional[Game] = None) -> None:
+    async def update_all_gdc(self, guild: discord.Guild, game_list: List[Game]) -> None:
+        """
+        Replaces the guilds game day channels with one for every game today
+        """
+        try:
+            await self.delete_gdc(guild)
+            for game in game_list:
+                await self.create_gdc(guild, game)
+        except Exception:
+            log.exception("Error updating game day channels in %s", repr(guild))
+
+    async def create_gdc(
+        self, guild: discord.Guild, game_data: Optional[Game] = None, team: Optional[str] = None
+    ) -> None:
         """
         Creates a game day channel for the given game object
         if no game object is passed it looks for the set team for the guild
+        `team` is saved as the channels team when provided,
+        otherwise the home team of the game is used
         returns None if not setup
         """
         category_id = await self.config.guild(guild).category()
@@ -329,7 +379,7 @@ class GameDayChannels(MixinMeta):
                 # Return if no more games are playing for this team
                 return
         else:
-            team = game_data.home_team
+            team = team or game_data.home_team
             next_game = game_data
 
         chn_name = await self.get_chn_name(next_game)
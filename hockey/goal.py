@@ -12,7 +12,7 @@ from redbot.core.i18n import Translator
 from redbot.core.utils import AsyncIter, bounded_gather
 
 from .constants import HEADSHOT_URL, TEAMS
-from .helper import check_to_post, get_channel_obj, get_team
+from .helper import check_to_post, get_channel_obj, get_team, team_roles
 
 if TYPE_CHECKING:
     from .game import Game
@@ -217,16 +217,8 @@ class Goal:
             goal_notifications = guild_notifications or channel_notifications
             publish_goals = "Goal" in await config.channel(channel).publish_states()
             allowed_mentions = {}
-            montreal = ["Montréal Canadiens", "Montreal Canadiens"]
-
-            role = discord.utils.get(guild.roles, name=f"{self.team_name} GOAL")
-            try:
-                if self.team_name in montreal:
-                    if not role:
-                        montreal.remove(self.team_name)
-                        role = discord.utils.get(guild.roles, name=f"{montreal[0]} GOAL")
-            except Exception:
-                log.error("Error trying to find montreal goal role")
+            role = team_roles.get(guild, f"{self.team_name} GOAL")
+            # role names are accent folded so this finds Montreal roles either way
             if version_info >= VersionInfo.from_str("3.4.0"):
                 if goal_notifications:
                     log.debug(goal_notifications)
@@ -372,7 +364,7 @@ class Goal:
                 return
             guild = channel.guild
             game_day_channels = await bot.get_cog("Hockey").config.guild(guild).gdc()
-            role = discord.utils.get(guild.roles, name=self.team_name + " GOAL")
+            role = team_roles.get(guild, f"{self.team_name} GOAL")
             if game_day_channels is not None:
                 # We don't want to ping people in the game day channels twice
                 if channel.id in game_day_channels:
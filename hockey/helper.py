@@ -1,8 +1,10 @@
 import asyncio
+import functools
 import logging
 import re
+import unicodedata
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Pattern, Tuple, Union
+from typing import Dict, List, Optional, Pattern, Set, Tuple, Union
 
 import discord
 import pytz
@@ -252,28 +254,54 @@ async def check_to_post(
     return should_post
 
 
+def fold_accents(text: str) -> str:
+    """
+    Removes accents so names like `Montréal` and `Montreal` compare equal
+    """
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_team_name(text: str) -> str:
+    return fold_accents(text).lower().strip()
+
+
+class GuildRoleCache:
+    """
+    Per guild lookup of roles by their accent folded name
+
+    This is built the first time a guild is looked up and
+    invalidated whenever a role in the guild is changed.
+    """
+
+    def __init__(self):
+        self._roles: Dict[int, Dict[str, discord.Role]] = {}
+
+    def get(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        if guild.id not in self._roles:
+            roles: Dict[str, discord.Role] = {}
+            for role in guild.roles:
+                roles.setdefault(fold_accents(role.name), role)
+            self._roles[guild.id] = roles
+        return self._roles[guild.id].get(fold_accents(name))
+
+    def invalidate(self, guild: discord.Guild) -> None:
+        self._roles.pop(guild.id, None)
+
+
+team_roles = GuildRoleCache()
+
+
 async def get_team_role(guild: discord.Guild, home_team: str, away_team: str) -> Tuple[str, str]:
     """
     This returns the role mentions if they exist
     Otherwise it returns the name of the team as a str
     """
-    home_role = None
-    away_role = None
-
-    for role in guild.roles:
-        if "Montréal Canadiens" in home_team and "Montreal Canadiens" in role.name:
-            home_role = role.mention
-        elif role.name == home_team:
-            home_role = role.mention
-        if "Montréal Canadiens" in away_team and "Montreal Canadiens" in role.name:
-            away_role = role.mention
-        elif role.name == away_team:
-            away_role = role.mention
-    if home_role is None:
-        home_role = home_team
-    if away_role is None:
-        away_role = away_team
-    return home_role, away_role
+    home_role = team_roles.get(guild, home_team)
+    away_role = team_roles.get(guild, away_team)
+    return (
+        home_role.mention if home_role is not None else home_team,
+        away_role.mention if away_role is not None else away_team,
+    )
 
 
 async def get_team(bot: Red, team: str) -> TeamEntry:
@@ -299,7 +327,6 @@ async def check_valid_team(team_name: str, standings: bool = False) -> List[str]
     Checks if this is a valid team name or all teams
     useful for game day channel creation should impliment elsewhere
     """
-    is_team = []
     conference: List[str] = []  # ["eastern", "western", "conference"]
     division = [
         "central",
@@ -318,28 +345,37 @@ async def check_valid_team(team_name: str, standings: bool = False) -> List[str]
         return [team_name]
     if team_name.lower() in division and standings:
         return [team_name]
-    for team in TEAMS:
-        if team_name.lower() in team.lower():
-            is_team.append(team)
-    if team_name.lower() in ["montreal canadiens", "habs", "montreal"]:
-        is_team.append("Montréal Canadiens")
-    if team_name.lower() == "avs":
-        is_team.append("Colorado Avalanche")
-    if team_name.lower() == "preds":
-        is_team.append("Nashville Predators")
-    if team_name.lower() == "bolts":
-        is_team.append("Tampa Bay Lightning")
-    if team_name.lower() in ["jackets", "bjs"]:
-        is_team.append("Columbus Blue Jackets")
-    if team_name.lower() == "isles":
-        is_team.append("New York Islanders")
-    if team_name.lower() == "sens":
-        is_team.append("Ottawa Senators")
-    if team_name.lower() == "pens":
-        is_team.append("Pittsburgh Penguins")
-    if team_name.lower() == "caps":
-        is_team.append("Washington Capitals")
-    return list(set(is_team))
+    return list(find_teams(normalize_team_name(team_name)))
+
+
+def build_team_aliases() -> Dict[str, Set[str]]:
+    """
+    Builds the normalized alias index for every team in `TEAMS`
+    """
+    aliases: Dict[str, Set[str]] = {}
+    for team, data in TEAMS.items():
+        names = [team, *data.get("nickname", [])]
+        if data.get("tri_code"):
+            names.append(data["tri_code"])
+        for name in names:
+            aliases.setdefault(normalize_team_name(name), set()).add(team)
+    return aliases
+
+
+TEAM_ALIASES = build_team_aliases()
+TEAM_NAMES = [(normalize_team_name(team), team) for team in TEAMS]
+
+
+@functools.lru_cache(maxsize=256)
+def find_teams(team_name: str) -> Tuple[str, ...]:
+    """
+    Returns every team matching the normalized name or alias
+    """
+    is_team = set(TEAM_ALIASES.get(team_name, set()))
+    for name, team in TEAM_NAMES:
+        if team_name in name:
+            is_team.add(team)
+    return tuple(is_team)
 
 
 async def get_channel_obj(bot: Red, channel_id: int, data: dict) -> Optional[discord.TextChannel]:
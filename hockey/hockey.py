@@ -13,11 +13,13 @@ from redbot.core import Config, commands
 from redbot.core.i18n import Translator, cog_i18n
 from redbot.core.utils import AsyncIter
 
+from .api import HockeyAPI
 from .constants import BASE_URL, CONFIG_ID, CONTENT_URL, HEADSHOT_URL, TEAMS
 from .dev import HockeyDev
 from .errors import InvalidFileError
 from .game import Game
 from .gamedaychannels import GameDayChannels
+from .helper import team_roles
 from .hockey_commands import HockeyCommands
 from .hockeypickems import HockeyPickems
 from .hockeyset import HockeySetCommands
@@ -122,6 +124,8 @@ class Hockey(
         self.current_games = {}
         self.games_playing = False
         self.session = aiohttp.ClientSession()
+        self.api = HockeyAPI(self.session)
+        # self.api caches NHL API responses for commands and menus
         self._ready: asyncio.Event = asyncio.Event()
         # self._ready is used to prevent pickems from opening
         # data from the wrong file location
@@ -144,6 +148,19 @@ class Hockey(
         self.pickems_loop.cancel()
         self.bot.loop.create_task(self.session.close())
 
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        team_roles.invalidate(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        team_roles.invalidate(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if before.name != after.name or before.position != after.position:
+            team_roles.invalidate(after.guild)
+
     async def red_delete_data_for_user(
         self,
         *,
@@ -171,7 +171,7 @@ class HockeyCommands(MixinMeta):
         }
         if search is None:
             search = "division"
-        standings, page = await Standings.get_team_standings(search.lower(), session=self.session)
+        standings, page = await Standings.get_team_standings(search.lower(), session=self.api)
         for team in TEAMS:
             if "Team" in team:
                 source[team.replace("Team ", "").lower()] = DivisionStandingsPages
@@ -202,7 +202,7 @@ class HockeyCommands(MixinMeta):
         """
         log.debug(teams_and_date)
         await GamesMenu(
-            source=Schedule(**teams_and_date, session=self.session),
+            source=Schedule(**teams_and_date, session=self.api),
             delete_message_after=False,
             clear_reactions_after=True,
             timeout=60,
@@ -224,7 +224,7 @@ class HockeyCommands(MixinMeta):
         only that teams games may appear in that date range if they exist.
         """
         await GamesMenu(
-            source=ScheduleList(**teams_and_date, session=self.session),
+            source=ScheduleList(**teams_and_date, session=self.api),
             delete_message_after=False,
             clear_reactions_after=True,
             timeout=60,
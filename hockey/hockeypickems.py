@@ -6,6 +6,7 @@ import discord
 from discord.ext import tasks
 from redbot import VersionInfo, version_info
 from redbot.core import bank, commands
+from redbot.core.data_manager import cog_data_path
 from redbot.core.i18n import Translator
 from redbot.core.utils import AsyncIter, bounded_gather
 from redbot.core.utils.antispam import AntiSpam
@@ -13,11 +14,13 @@ from redbot.core.utils.chat_formatting import humanize_list, pagify
 from redbot.core.utils.menus import start_adding_reactions
 
 from .abc import MixinMeta
+from .cache import GameCache
 from .constants import TEAMS
 from .errors import NotAValidTeamError, UserHasVotedError, VotingHasEndedError
 from .game import Game
 from .helper import TimezoneFinder, utc_to_local
 from .pickems import Pickems
+from .votejournal import VoteJournal
 
 _ = Translator("Hockey", __file__)
 log = logging.getLogger("red.trusty-cogs.Hockey")
@@ -34,6 +37,30 @@ PICKEMS_MESSAGE = _(
     "{guild_message}"
 )
 
+DEFAULT_LEADERBOARD = {
+    "season": 0,
+    "weekly": 0,
+    "total": 0,
+    "playoffs": 0,
+    "playoffs_weekly": 0,
+    "playoffs_total": 0,
+    "pre-season": 0,
+    "pre-season_weekly": 0,
+    "pre-season_total": 0,
+}
+
+LEADERBOARD_KEYS = {
+    "P": ("playoffs", "playoffs_weekly", "playoffs_total"),
+    "PR": ("pre-season", "pre-season_weekly", "pre-season_total"),
+    "R": ("season", "weekly", "total"),
+}
+# The leaderboard keys updated for each game type in the order of
+# points, weekly points, and total votes.
+# Correct votes count towards all three, incorrect only to total.
+
+DEPOSIT_CONCURRENCY = 10
+# The number of bank deposits allowed to run at once while tallying
+
 
 class HockeyPickems(MixinMeta):
     """
@@ -61,12 +88,17 @@ class HockeyPickems(MixinMeta):
     # to prevent users having access to rate limit the bot.
 
     def __init__(self, *args):
-        self.pickems_games: Dict[str, Game] = {}
-        # This is a temporary class attr used for
-        # storing only 1 copy of the game object so
-        # we're not spamming the API with the same game over and over
-        # this gets cleared and is only used with leaderboard tallying
+        self.pickems_games = GameCache()
+        # Game objects shared by every guild when resolving pickems winners
+        # so we're not spamming the API with the same game over and over
+        self.pickems_by_game: Dict[str, Dict[int, Pickems]] = {}
+        # Maps the game ID each pickems is saved under to every
+        # guilds pickems for that game
         self.antispam = {}
+        self.pickems_messages: Dict[str, Pickems] = {}
+        # Maps `channel_id-message_id` to the pickems object
+        # so reactions can find the game being voted on directly
+        self.vote_journal = VoteJournal(cog_data_path(self) / "pickems_votes.jsonl")
 
     @commands.Cog.listener()
     async def on_hockey_preview_message(
@@ -90,43 +122,67 @@ class HockeyPickems(MixinMeta):
             return
         if str(guild.id) not in self.all_pickems:
             return
+        pickem = self.pickems_messages.get(f"{channel.id}-{payload.message_id}")
+        if pickem is None:
+            return
         user = guild.get_member(payload.user_id)
         # log.debug(payload.user_id)
         if not user or user.bot:
             return
-        for name, pickem in self.all_pickems[str(guild.id)].items():
-            if f"{channel.id}-{payload.message_id}" in pickem.messages:
-                reply_message = None
-                remove_emoji = None
-                try:
-                    # log.debug(payload.emoji)
-                    log.debug("Adding vote")
-                    pickem.add_vote(user.id, payload.emoji)
-                except UserHasVotedError as team:
-                    log.debug("User has voted already")
-                    remove_emoji = (
-                        pickem.home_emoji
-                        if str(payload.emoji.id) in pickem.away_emoji
-                        else pickem.away_emoji
-                    )
-                    reply_message = _("You have already voted! Changing vote to: {team}").format(
-                        team=team
-                    )
-                except VotingHasEndedError as error_msg:
-                    log.debug("Voting has ended")
-                    remove_emoji = payload.emoji
-                    reply_message = _("Voting has ended! {voted_for}").format(
-                        voted_for=str(error_msg)
-                    )
-                except NotAValidTeamError:
-                    log.debug("Invalid emoji")
-                    remove_emoji = payload.emoji
-                    reply_message = _("Don't clutter the voting message with emojis!")
-                except Exception:
-                    log.exception(f"Error adding vote to {repr(pickem)}")
-                await self.handle_pickems_response(
-                    user, channel, remove_emoji, payload.message_id, reply_message
-                )
+        reply_message = None
+        remove_emoji = None
+        old_vote = pickem.votes.get(str(user.id))
+        try:
+            # log.debug(payload.emoji)
+            log.debug("Adding vote")
+            pickem.add_vote(user.id, payload.emoji)
+        except UserHasVotedError as team:
+            log.debug("User has voted already")
+            remove_emoji = (
+                pickem.home_emoji
+                if str(payload.emoji.id) in pickem.away_emoji
+                else pickem.away_emoji
+            )
+            reply_message = _("You have already voted! Changing vote to: {team}").format(team=team)
+        except VotingHasEndedError as error_msg:
+            log.debug("Voting has ended")
+            remove_emoji = payload.emoji
+            reply_message = _("Voting has ended! {voted_for}").format(voted_for=str(error_msg))
+        except NotAValidTeamError:
+            log.debug("Invalid emoji")
+            remove_emoji = payload.emoji
+            reply_message = _("Don't clutter the voting message with emojis!")
+        except Exception:
+            log.exception(f"Error adding vote to {repr(pickem)}")
+        new_vote = pickem.votes.get(str(user.id))
+        if new_vote is not None and new_vote != old_vote:
+            self.vote_journal.record(pickem.guild, pickem.game_id, user.id, new_vote)
+        await self.handle_pickems_response(
+            user, channel, remove_emoji, payload.message_id, reply_message
+        )
+
+    def index_pickem(self, pickem: Pickems) -> None:
+        """
+        Adds the pickems messages to the message lookup used for voting
+        """
+        for message in pickem.messages:
+            self.pickems_messages[message] = pickem
+        if str(pickem.game_id) not in self.pickems_by_game:
+            self.pickems_by_game[str(pickem.game_id)] = {}
+        self.pickems_by_game[str(pickem.game_id)][pickem.guild] = pickem
+
+    def unindex_pickem(self, pickem: Pickems) -> None:
+        """
+        Removes the pickems messages from the message lookup used for voting
+        """
+        for message in pickem.messages:
+            if self.pickems_messages.get(message) is pickem:
+                del self.pickems_messages[message]
+        guild_pickems = self.pickems_by_game.get(str(pickem.game_id), {})
+        if guild_pickems.get(pickem.guild) is pickem:
+            del guild_pickems[pickem.guild]
+            if not guild_pickems:
+                del self.pickems_by_game[str(pickem.game_id)]
 
     async def handle_pickems_response(
         self,
@@ -172,26 +228,49 @@ class HockeyPickems(MixinMeta):
         # log.debug("Saved pickems data.")
 
     async def save_pickems_data(self) -> None:
-        try:
+        """
+        Saves any changed pickems to Config and compacts the vote journal
 
-            # log.debug("Saving pickems data")
-            all_pickems = self.all_pickems.copy()
-            async for guild_id, pickems in AsyncIter(all_pickems.items(), steps=10):
-                data = {}
-                async with self.pickems_config.guild_from_id(guild_id).pickems() as data:
-                    for name, pickem in pickems.items():
-                        if pickem._should_save:
-                            log.debug("Saving pickem %s", repr(pickem))
-                            data[name] = pickem.to_json()
-                        self.all_pickems[guild_id][name]._should_save = False
+        The journal is rotated before the changes are gathered so that any
+        votes coming in while we wait on Config are kept in the new journal.
+        """
+        try:
+            self.vote_journal.rotate()
+            to_save: Dict[str, Dict[str, dict]] = {}
+            for guild_id, pickems in self.all_pickems.items():
+                for name, pickem in pickems.items():
+                    if not pickem._should_save:
+                        continue
+                    log.debug("Saving pickem %s", repr(pickem))
+                    if guild_id not in to_save:
+                        to_save[guild_id] = {}
+                    to_save[guild_id][name] = pickem.to_json()
+                    pickem._should_save = False
         except Exception:
             log.exception("Error saving pickems Data")
-            # catch all errors cause we don't want this loop to fail for something dumb
+            return
+        saved_all = True
+        async for guild_id, pickems in AsyncIter(to_save.items(), steps=10):
+            try:
+                async with self.pickems_config.guild_from_id(int(guild_id)).pickems() as data:
+                    data.update(pickems)
+            except Exception:
+                # catch all errors cause we don't want this loop to fail for something dumb
+                log.exception("Error saving pickems Data")
+                saved_all = False
+                for name in pickems:
+                    if name in self.all_pickems.get(guild_id, {}):
+                        self.all_pickems[guild_id][name]._should_save = True
+        if saved_all:
+            # if anything failed the rotated journal is kept
+            # and merged on the next save so no votes are lost
+            self.vote_journal.compact()
 
     @pickems_loop.after_loop
     async def after_pickems_loop(self) -> None:
         if self.pickems_loop.is_being_cancelled():
             await self.save_pickems_data()
+            self.vote_journal.close()
 
     @pickems_loop.before_loop
     async def before_pickems_loop(self) -> None:
@@ -212,6 +291,25 @@ class HockeyPickems(MixinMeta):
             # pickems = [Pickems.from_json(p) for p in pickems_list]
             pickems = {name: Pickems.from_json(p) for name, p in pickems_list.items()}
             self.all_pickems[str(guild_id)] = pickems
+            for pickem in pickems.values():
+                self.index_pickem(pickem)
+        await self.replay_vote_journal()
+
+    async def replay_vote_journal(self) -> None:
+        """
+        Applies any votes that were journaled but never saved to Config
+        """
+        replayed = 0
+        for entry in self.vote_journal.replay():
+            pickem = self.all_pickems.get(entry.get("guild"), {}).get(entry.get("game_id"))
+            if pickem is None:
+                continue
+            pickem.votes[entry["user"]] = entry["team"]
+            pickem._should_save = True
+            replayed += 1
+        if replayed:
+            log.info("Recovered %s pickems votes from the vote journal", replayed)
+        await self.save_pickems_data()
 
     def pickems_name(self, game: Game) -> str:
         return f"{game.away_abr}@{game.home_abr}-{game.game_start.month}-{game.game_start.day}"
@@ -221,36 +319,27 @@ class HockeyPickems(MixinMeta):
         Returns a list of all pickems on the bot for that game
         """
         return_pickems = []
-        new_name = f"{game.away_abr}@{game.home_abr}-{game.game_start.month}-{game.game_start.day}"
-        for guild_id, pickems in self.all_pickems.items():
+        for guild_id, pickem in self.pickems_by_game.get(str(game.game_id), {}).items():
             guild = self.bot.get_guild(int(guild_id))
             if guild is None:
                 continue
-            if pickems is None:
-                pickems = []
-            if new_name in pickems:
-                return_pickems.append(pickems[new_name])
+            return_pickems.append(pickem)
 
         return return_pickems
 
     async def set_guild_pickem_winner(self, game: Game) -> None:
-        all_pickems = self.all_pickems.copy()
-        for guild_id, pickems in all_pickems.items():
-            guild = self.bot.get_guild(int(guild_id))
-            if guild is None:
-                continue
-            pickems_channels = await self.pickems_config.guild(guild).pickems_channels()
-            if str(game.game_id) not in pickems:
-                continue
-            pickem = self.all_pickems[str(guild_id)][str(game.game_id)]
+        self.pickems_games.add(game)
+        for pickem in await self.find_pickems_object(game):
+            guild = self.bot.get_guild(int(pickem.guild))
             if pickem.winner is not None:
                 log.debug("Pickems winner is not None %s", repr(pickem))
                 continue
-            await self.all_pickems[str(guild_id)][str(game.game_id)].check_winner(game)
+            await pickem.check_winner(game)
             if game.game_state == pickem.game_state:
                 continue
-            self.all_pickems[str(guild_id)][str(game.game_id)].game_state = game.game_state
-            self.all_pickems[str(guild_id)][str(game.game_id)]._should_save = True
+            pickem.game_state = game.game_state
+            pickem._should_save = True
+            pickems_channels = await self.pickems_config.guild(guild).pickems_channels()
             for message in pickem.messages:
                 try:
                     channel_id, message_id = message.split("-")
@@ -317,12 +406,14 @@ class HockeyPickems(MixinMeta):
             )
 
             self.all_pickems[str(guild.id)][str(game.game_id)] = pickem
+            self.index_pickem(pickem)
             log.debug("creating new pickems %s", pickems[str(game.game_id)])
             return True
         else:
             self.all_pickems[str(guild.id)][str(game.game_id)].messages.append(
                 f"{channel.id}-{message.id}"
             )
+            self.index_pickem(old_pickem)
             if old_pickem.name != new_name:
                 self.all_pickems[str(guild.id)][str(game.game_id)].name = new_name
             if old_pickem.game_start != game.game_start:
@@ -661,88 +752,87 @@ class HockeyPickems(MixinMeta):
     async def tally_guild_leaderboard(self, guild: discord.Guild) -> None:
         """
         Allows individual guilds to tally pickems leaderboard
+
+        All finished games are tallied in memory first so the leaderboard
+        and pickems are each written once and every winning voter
+        receives a single deposit for the day.
         """
         global_bank = await bank.is_global()
         if global_bank:
             base_credits = await self.pickems_config.base_credits()
         else:
             base_credits = await self.pickems_config.guild(guild).base_credits()
-        pickems_list = self.all_pickems.get(str(guild.id)).copy()
+        pickems_list = self.all_pickems.get(str(guild.id), {}).copy()
         to_remove = []
+        deltas: Dict[str, Dict[str, int]] = {}
+        correct_votes: Dict[str, int] = {}
         async for name, pickems in AsyncIter(pickems_list.items(), steps=10):
             # check for definitive winner here just incase
-            if name not in self.pickems_games:
-                game = await pickems.get_game()
-                self.pickems_games[name] = game
-                await self.set_guild_pickem_winner(self.pickems_games[name])
+            game = self.pickems_games.get(str(pickems.game_id))
+            if game is None:
+                game = await pickems.get_game(self.pickems_games, self.session)
+                if game is None:
+                    continue
+                await self.set_guild_pickem_winner(game)
                 # Go through all the current pickems for every server
                 # and handle editing postponed games, etc here
                 # This will ensure any games that never make it to
                 # the main loop still get checked
-            if not await pickems.check_winner(self.pickems_games[name]):
+            if not await pickems.check_winner(game):
                 continue
             log.debug("Tallying results for %s", repr(pickems))
             to_remove.append(name)
-            DEFAULT_LEADERBOARD = {
-                "season": 0,
-                "weekly": 0,
-                "total": 0,
-                "playoffs": 0,
-                "playoffs_weekly": 0,
-                "playoffs_total": 0,
-                "pre-season": 0,
-                "pre-season_weekly": 0,
-                "pre-season_total": 0,
-            }
+            points, weekly, total = LEADERBOARD_KEYS.get(pickems.game_type, LEADERBOARD_KEYS["R"])
+            async for user, choice in AsyncIter(list(pickems.votes.items()), steps=500):
+                if str(user) not in deltas:
+                    deltas[str(user)] = {}
+                user_delta = deltas[str(user)]
+                if choice == pickems.winner:
+                    correct_votes[str(user)] = correct_votes.get(str(user), 0) + 1
+                    for key in (points, weekly, total):
+                        user_delta[key] = user_delta.get(key, 0) + 1
+                else:
+                    user_delta[total] = user_delta.get(total, 0) + 1
+                    # Weekly reset weekly but we want to track this
+                    # regardless of playoffs and pre-season
+                    # If this causes confusion I can change it later
+                    # leaving this comment so I remember
+        if deltas:
             async with self.pickems_config.guild(guild).leaderboard() as leaderboard:
-                for user, choice in pickems.votes.items():
-                    if str(user) not in leaderboard:
-                        leaderboard[str(user)] = DEFAULT_LEADERBOARD.copy()
+                for user, user_delta in deltas.items():
+                    if user not in leaderboard:
+                        leaderboard[user] = DEFAULT_LEADERBOARD.copy()
                     for key, value in DEFAULT_LEADERBOARD.items():
                         # verify all defaults are in the setting
-                        if key not in leaderboard[str(user)]:
-                            leaderboard[str(user)][key] = value
-
-                    if choice == pickems.winner:
-                        if member := guild.get_member(int(user)):
-                            try:
-                                await bank.deposit_credits(member, int(base_credits))
-                            except Exception:
-                                log.debug("Could not deposit pickems credits for %s", repr(member))
-                        if pickems.game_type == "P":
-                            leaderboard[str(user)]["playoffs"] += 1
-                            leaderboard[str(user)]["playoffs_weekly"] += 1
-                            leaderboard[str(user)]["playoffs_total"] += 1
-                        elif pickems.game_type == "PR":
-                            leaderboard[str(user)]["pre-season"] += 1
-                            leaderboard[str(user)]["pre-season_weekly"] += 1
-                            leaderboard[str(user)]["pre-season_total"] += 1
-                        else:
-                            leaderboard[str(user)]["season"] += 1
-                            leaderboard[str(user)]["total"] += 1
-                            # The above needs to be adjusted when this current season
-                            # playoffs is finished
-                            leaderboard[str(user)]["weekly"] += 1
-                    else:
-                        if pickems.game_type == "P":
-                            leaderboard[str(user)]["playoffs_total"] += 1
-                        elif pickems.game_type == "PR":
-                            leaderboard[str(user)]["pre-season_total"] += 1
-                        else:
-                            leaderboard[str(user)]["total"] += 1
-                        # Weekly reset weekly but we want to track this
-                        # regardless of playoffs and pre-season
-                        # If this causes confusion I can change it later
-                        # leaving this comment so I remember
-        for name in to_remove:
+                        if key not in leaderboard[user]:
+                            leaderboard[user][key] = value
+                    for key, value in user_delta.items():
+                        leaderboard[user][key] += value
+        if to_remove:
             try:
-                log.debug(f"Removing pickem {name}")
-                del self.all_pickems[str(guild.id)][name]
+                for name in to_remove:
+                    log.debug(f"Removing pickem {name}")
+                    self.unindex_pickem(self.all_pickems[str(guild.id)].pop(name))
                 async with self.pickems_config.guild(guild).pickems() as data:
-                    if name in data:
-                        del data[name]
+                    for name in to_remove:
+                        if name in data:
+                            del data[name]
             except Exception:
                 log.error("Error removing pickems from memory", exc_info=True)
+        if base_credits and correct_votes:
+            deposits = []
+            for user, correct in correct_votes.items():
+                if member := guild.get_member(int(user)):
+                    deposits.append(
+                        self.deposit_pickems_credits(member, int(base_credits) * correct)
+                    )
+            await bounded_gather(*deposits, limit=DEPOSIT_CONCURRENCY)
+
+    async def deposit_pickems_credits(self, member: discord.Member, amount: int) -> None:
+        try:
+            await bank.deposit_credits(member, amount)
+        except Exception:
+            log.debug("Could not deposit pickems credits for %s", repr(member))
 
     async def tally_leaderboard(self) -> None:
         """
@@ -757,9 +847,9 @@ class HockeyPickems(MixinMeta):
                 await self.tally_guild_leaderboard(guild)
             except Exception:
                 log.exception(f"Error tallying leaderboard in {guild.name}")
-        self.pickems_games = {}
-        # Clear the data since we no longer need it after this
-        # anything new will be a new day and that's when we care
+        self.pickems_games.expire()
+        # Final games stick around for a while in case they're needed again
+        # anything else expires quickly so the next day fetches fresh data
 
     #######################################################################
     # All pickems related commands for setup, etc.                        #
@@ -1115,10 +1205,8 @@ class HockeyPickems(MixinMeta):
         """
         if true_or_false:
             await self.pickems_config.guild(ctx.guild).pickems.clear()
-            try:
-                del self.all_pickems[str(ctx.guild.id)]
-            except KeyError:
-                pass
+            for pickem in self.all_pickems.pop(str(ctx.guild.id), {}).values():
+                self.unindex_pickem(pickem)
             await ctx.send(_("All pickems removed on this server."))
         else:
             await ctx.send(_("I will not remove the current pickems on this server."))
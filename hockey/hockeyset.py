@@ -9,7 +9,7 @@ from redbot.core.utils.chat_formatting import humanize_list, pagify
 
 from .abc import MixinMeta
 from .constants import TEAMS
-from .helper import HockeyStates, HockeyTeams, TimezoneFinder
+from .helper import HockeyStates, HockeyTeams, TimezoneFinder, team_roles
 from .menu import BaseMenu, SimplePages
 from .standings import CONFERENCES, DIVISIONS, Standings
 
@@ -164,7 +164,7 @@ class HockeySetCommands(MixinMeta):
         non_mention_roles = []
         no_role = []
         for team in TEAMS:
-            role = discord.utils.get(guild.roles, name=team)
+            role = team_roles.get(guild, team)
             if not role:
                 no_role.append(team)
                 continue
@@ -481,7 +481,7 @@ class HockeySetCommands(MixinMeta):
             return
 
         standings, page = await Standings.get_team_standings(
-            standings_type.lower(), session=self.session
+            standings_type.lower(), session=self.api
         )
         if standings_type.lower() != "all":
             em = await Standings.build_standing_embed(standings, page)
@@ -321,9 +321,9 @@ class PlayerPages(menus.ListPageSource):
         return True
 
     async def format_page(self, menu: menus.MenuPages, page: int) -> discord.Embed:
-        player = await Player.from_id(page, session=menu.cog.session)
+        player = await Player.from_id(page, session=menu.cog.api)
         log.debug(player)
-        player = await player.get_full_stats(self.season, session=menu.cog.session)
+        player = await player.get_full_stats(self.season, session=menu.cog.api)
         em = player.get_embed()
         em.set_footer(text=f"Page {menu.current_page + 1}/{self.get_max_pages()}")
         return em
@@ -4,9 +4,11 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Tuple
 
+import aiohttp
 import discord
 from redbot.core.i18n import Translator
 
+from .cache import GameCache
 from .constants import TEAMS
 from .errors import NotAValidTeamError, UserHasVotedError, VotingHasEndedError
 from .game import Game
@@ -106,12 +108,12 @@ class Pickems:
         return {
             "game_id": self.game_id,
             "game_state": self.game_state,
-            "messages": self.messages,
+            "messages": self.messages.copy(),
             "guild": self.guild,
             "game_start": self.game_start.strftime("%Y-%m-%dT%H:%M:%SZ"),
             "home_team": self.home_team,
             "away_team": self.away_team,
-            "votes": self.votes,
+            "votes": self.votes.copy(),
             "name": self.name,
             "winner": self.winner,
             "link": self.link,
@@ -165,8 +167,18 @@ class Pickems:
             return True
         return False
 
-    async def get_game(self) -> Game:
-        return await Game.from_url(self.link)
+    async def get_game(
+        self, cache: Optional[GameCache] = None, session: Optional[aiohttp.ClientSession] = None
+    ) -> Optional[Game]:
+        """
+        Gets the game for this pickems, checking the shared game cache first
+        """
+        if cache is not None and (game := cache.get(str(self.game_id))) is not None:
+            return game
+        game = await Game.from_url(self.link, session)
+        if cache is not None and game is not None:
+            cache.add(game)
+        return game
 
     async def check_winner(self, game: Optional[Game] = None) -> bool:
         """
@@ -11,6 +11,7 @@ from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import box
 from tabulate import tabulate
 
+from .api import HockeyAPI, get_json
 from .constants import BASE_URL, HEADSHOT_URL, TEAMS
 
 _ = Translator("Hockey", __file__)
@@ -312,18 +313,14 @@ class Player:
         return em
 
     async def get_full_stats(
-        self, season: Optional[str], session: Optional[aiohttp.ClientSession] = None
+        self,
+        season: Optional[str],
+        session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None,
     ) -> Union[Player, Goalie, Skater]:
         url = f"https://statsapi.web.nhl.com/api/v1/people/{self.id}/stats?stats=yearByYear"
         log.debug(url)
         log.debug(season)
-        if session is None:
-            async with aiohttp.ClientSession() as new_session:
-                async with new_session.get(url) as resp:
-                    data = await resp.json()
-        else:
-            async with session.get(url) as resp:
-                data = await resp.json()
+        data = await get_json(url, session)
         for seasons in reversed(data["stats"][0]["splits"]):
             if seasons["league"].get("id", None) != 133:
                 continue
@@ -337,7 +334,7 @@ class Player:
                         stats_season,
                         *stats,
                     )
-                    return await player.get_full_stats(season or stats_season)
+                    return await player.get_full_stats(season or stats_season, session)
                 else:
                     stats = [seasons["stat"].get(v, "") for v in SKATER_STATS.values()]
                     player = Skater(
@@ -345,7 +342,7 @@ class Player:
                         stats_season,
                         *stats,
                     )
-                    return await player.get_full_stats(season or stats_season)
+                    return await player.get_full_stats(season or stats_season, session)
         log.debug(f"Returning {repr(self)}")
         return self
 
@@ -359,15 +356,11 @@ class Player:
         return f"https://www.capfriendly.com/players/{self.full_name_url()}"
 
     @classmethod
-    async def from_id(cls, player_id: int, session: Optional[aiohttp.ClientSession] = None) -> Player:
+    async def from_id(
+        cls, player_id: int, session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None
+    ) -> Player:
         url = f"https://records.nhl.com/site/api/player/{player_id}"
-        if session is None:
-            async with aiohttp.ClientSession() as new_session:
-                async with new_session.get(url) as resp:
-                    data = await resp.json()
-        else:
-            async with session.get(url) as resp:
-                data = await resp.json()
+        data = await get_json(url, session)
         return cls(*data["data"][0].values())
 
 
@@ -409,20 +402,16 @@ class Skater(Player):
         return "<Skater name={0.full_name} id={0.id} number={0.sweater_number}>".format(self)
 
     async def get_full_stats(
-        self, season: Optional[str], session: Optional[aiohttp.ClientSession] = None
+        self,
+        season: Optional[str],
+        session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None,
     ) -> Union[Skater, SkaterPlayoffs]:
         url = (
             f"https://statsapi.web.nhl.com/api/v1/people/{self.id}/stats?stats=yearByYearPlayoffs"
         )
         log.debug(url)
         log.debug(season)
-        if session is None:
-            async with aiohttp.ClientSession() as new_session:
-                async with new_session.get(url) as resp:
-                    data = await resp.json()
-        else:
-            async with session.get(url) as resp:
-                data = await resp.json()
+        data = await get_json(url, session)
         for seasons in reversed(data["stats"][0]["splits"]):
             stats_season = seasons["season"]
             if season in [stats_season, None]:
@@ -622,20 +611,16 @@ class Goalie(Player):
         return "<Goalie name={0.full_name} id={0.id} number={0.sweater_number}>".format(self)
 
     async def get_full_stats(
-        self, season: Optional[str], session: Optional[aiohttp.ClientSession] = None
+        self,
+        season: Optional[str],
+        session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None,
     ) -> Union[Goalie, GoaliePlayoffs]:
         url = (
             f"https://statsapi.web.nhl.com/api/v1/people/{self.id}/stats?stats=yearByYearPlayoffs"
         )
         log.debug(url)
         log.debug(season)
-        if session is None:
-            async with aiohttp.ClientSession() as new_session:
-                async with new_session.get(url) as resp:
-                    data = await resp.json()
-        else:
-            async with session.get(url) as resp:
-                data = await resp.json()
+        data = await get_json(url, session)
         for seasons in reversed(data["stats"][0]["splits"]):
             stats_season = seasons["season"]
             if season in [stats_season, None]:
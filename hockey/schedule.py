@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import aiohttp
 import discord
@@ -8,6 +8,7 @@ from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import pagify
 from redbot.vendored.discord.ext import menus
 
+from .api import HockeyAPI, get_json
 from .constants import BASE_URL, TEAMS
 from .errors import NoSchedule
 from .game import Game
@@ -28,7 +29,7 @@ class Schedule(menus.PageSource):
         self.limit: int = kwargs.get("limit", 10)
         self.team: str = kwargs.get("team", None)
         self._last_searched: str = ""
-        self._session: aiohttp.CLientSession = kwargs.get("session")
+        self._session: Union[aiohttp.ClientSession, HockeyAPI] = kwargs.get("session")
         self.search_range = 30
 
     @property
@@ -61,10 +62,8 @@ class Schedule(menus.PageSource):
         return page
 
     async def format_page(self, menu: menus.MenuPages, game: dict) -> discord.Embed:
-        async with aiohttp.ClientSession() as session:
-            log.debug(BASE_URL + game["link"])
-            async with session.get(BASE_URL + game["link"]) as resp:
-                data = await resp.json()
+        log.debug(BASE_URL + game["link"])
+        data = await get_json(BASE_URL + game["link"], self._session)
         game_obj = await Game.from_json(data)
         # return {"content": f"{self.index+1}/{len(self._cache)}", "embed": await game_obj.make_game_embed()}
         return await game_obj.make_game_embed(True)
@@ -159,8 +158,7 @@ class Schedule(menus.PageSource):
             url += "&teamId=" + ",".join(str(TEAMS[t]["id"]) for t in self.team)
         # log.debug(url)
         self._last_searched = f"<t:{date_timestamp}> to <t:{end_date_timestamp}>"
-        async with self._session.get(url) as resp:
-            data = await resp.json()
+        data = await get_json(url, self._session)
         games = [game for date in data["dates"] for game in date["games"]]
         if not games:
             # log.debug("No schedule, looking for more days")
@@ -185,7 +183,7 @@ class ScheduleList(menus.PageSource):
         self.limit: int = kwargs.get("limit", 10)
         self.team: List[str] = kwargs.get("team", [])
         self._last_searched: str = ""
-        self._session: aiohttp.ClientSession = kwargs.get("session")
+        self._session: Union[aiohttp.ClientSession, HockeyAPI] = kwargs.get("session")
         self.timezone: str = kwargs.get("timezone")
 
     @property
@@ -399,8 +397,7 @@ class ScheduleList(menus.PageSource):
             url += "&teamId=" + ",".join(str(TEAMS[t]["id"]) for t in self.team)
         # log.debug(url)
         self._last_searched = f"<t:{date_timestamp}> to <t:{end_date_timestamp}>"
-        async with self._session.get(url) as resp:
-            data = await resp.json()
+        data = await get_json(url, self._session)
         games = [game for date in data["dates"] for game in date["games"]]
         if not games:
             # log.debug("No schedule, looking for more days")
@@ -1,7 +1,10 @@
 from __future__ import annotations
+
+import asyncio
 import logging
+import time
 from datetime import datetime
-from typing import List, Literal, Optional, Tuple
+from typing import Dict, List, Literal, Optional, Tuple, Union
 
 import aiohttp
 import discord
@@ -9,6 +12,7 @@ from redbot import VersionInfo, version_info
 from redbot.core import Config
 from redbot.core.utils import AsyncIter
 
+from .api import HockeyAPI, get_json
 from .constants import BASE_URL, TEAMS
 
 log = logging.getLogger("red.trusty-cogs.Hockey")
@@ -28,6 +32,11 @@ DIVISIONS: List[str] = [
 CONFERENCES: List[str] = []  # ["eastern", "western", "conference"]
 # The NHL removed conferences from the standings in the 2021 season
 
+STANDINGS_EDIT_WORKERS = 5
+STANDINGS_EDITS_PER_SECOND = 10
+# Automatic standings edits share the bots global rate limit
+# so they're spread out instead of all being sent at once
+
 
 class Standings:
     def __init__(
@@ -93,7 +102,7 @@ class Standings:
     @staticmethod
     async def get_team_standings(
         style: str,
-        session: Optional[aiohttp.ClientSession] = None,
+        session: Optional[Union[aiohttp.ClientSession, HockeyAPI]] = None,
     ) -> List[Standings]:
         """
         Creates a list of standings when given a particular style
@@ -101,13 +110,7 @@ class Standings:
         returns a list of standings objects and the location of the given
         style in the list
         """
-        if session is None:
-            async with aiohttp.ClientSession() as new_session:
-                async with new_session.get(BASE_URL + "/api/v1/standings") as resp:
-                    data = await resp.json()
-        else:
-            async with session.get(BASE_URL + "/api/v1/standings") as resp:
-                data = await resp.json()
+        data = await get_json(BASE_URL + "/api/v1/standings", session)
         return await Standings.get_team_standings_from_data(style, data)
 
     @staticmethod
@@ -172,11 +175,16 @@ class Standings:
         """
         Automatically update a standings embed with the latest stats
         run when new games for the day is updated
+
+        Each standings type is only parsed and rendered once per update
+        and shared between every guild using it.
         """
         log.debug("Updating Standings.")
-        config = bot.get_cog("Hockey").config
-        async with bot.get_cog("Hockey").session.get(BASE_URL + "/api/v1/standings") as resp:
-            standings_data = await resp.json()
+        cog = bot.get_cog("Hockey")
+        config = cog.config
+        standings_data = await get_json(BASE_URL + "/api/v1/standings", cog.session)
+        embeds: Dict[str, discord.Embed] = {}
+        edits: List[Tuple[discord.Embed, discord.Guild, discord.Message]] = []
 
         all_guilds = await config.all_guilds()
         async for guild_id, data in AsyncIter(all_guilds.items(), steps=100):
@@ -210,23 +218,80 @@ class Standings:
                     await config.guild(guild).standings_msg.clear()
                     continue
 
-                standings, page = await Standings.get_team_standings_from_data(
-                    search, standings_data
-                )
-                team_stats = standings[page]
+                if search not in embeds:
+                    embeds[search] = await Standings.make_automatic_standings_embed(
+                        search, standings_data
+                    )
+                if message is not None:
+                    edits.append((embeds[search], guild, message))
+        log.debug("Rendered %s standings embeds for %s messages", len(embeds), len(edits))
+        await Standings.edit_standings_messages(edits, config)
 
-                if search in DIVISIONS:
-                    em = await Standings.make_division_standings_embed(team_stats)
+    @staticmethod
+    async def make_automatic_standings_embed(search: str, standings_data: dict) -> discord.Embed:
+        standings, page = await Standings.get_team_standings_from_data(search, standings_data)
+        team_stats = standings[page]
 
-                elif search in CONFERENCES:
-                    em = await Standings.make_conference_standings_embed(team_stats)
-                else:
-                    em = await Standings.all_standing_embed(standings)
-                if message is not None:
-                    bot.loop.create_task(
-                        Standings.edit_standings_message(em, guild, message, config)
+        if search in DIVISIONS:
+            return await Standings.make_division_standings_embed(team_stats)
+        elif search in CONFERENCES:
+            return await Standings.make_conference_standings_embed(team_stats)
+        return await Standings.all_standing_embed(standings)
+
+    @staticmethod
+    async def edit_standings_messages(
+        edits: List[Tuple[discord.Embed, discord.Guild, discord.Message]], config: Config
+    ) -> None:
+        """
+        Edits all the standings messages through a bounded set of workers
+
+        Edits are spaced out to at most `STANDINGS_EDITS_PER_SECOND`
+        and progress is logged as we go.
+        """
+        if not edits:
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        for edit in edits:
+            queue.put_nowait(edit)
+        interval = 1 / STANDINGS_EDITS_PER_SECOND
+        start = time.monotonic()
+        next_slot = start
+        done = 0
+        total_latency = 0.0
+
+        async def worker() -> None:
+            nonlocal next_slot, done, total_latency
+            while True:
+                try:
+                    embed, guild, message = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                now = time.monotonic()
+                slot = max(now, next_slot)
+                next_slot = slot + interval
+                if slot > now:
+                    await asyncio.sleep(slot - now)
+                sent = time.monotonic()
+                await Standings.edit_standings_message(embed, guild, message, config)
+                total_latency += time.monotonic() - sent
+                done += 1
+                if done % 100 == 0:
+                    log.debug(
+                        "Edited %s/%s standings messages, average latency %.3fs",
+                        done,
+                        len(edits),
+                        total_latency / done,
                     )
 
+        workers = min(STANDINGS_EDIT_WORKERS, len(edits))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        log.info(
+            "Edited %s standings messages in %.2fs, average latency %.3fs",
+            done,
+            time.monotonic() - start,
+            total_latency / max(done, 1),
+        )
+
     @staticmethod
     async def edit_standings_message(
         embed: discord.Embed, guild: discord.Guild, message: discord.Message, config: Config
@@ -0,0 +1,93 @@
+import json
+import logging
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+log = logging.getLogger("red.trusty-cogs.Hockey")
+
+
+class VoteJournal:
+    """
+    Append-only journal of pickems votes
+
+    Every vote is written here as it happens so that votes made between
+    the periodic pickems saves survive a crash or restart. The journal is
+    compacted into Config by rotating it before a save and discarding the
+    rotated file once the save has completed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rotated_path = path.with_suffix(path.suffix + ".old")
+        self._file: Optional[IO[str]] = None
+
+    def open(self) -> None:
+        if self._file is None:
+            self._file = self.path.open("a", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, guild_id: int, game_id: str, user_id: int, team: str) -> None:
+        """
+        Appends a single vote to the journal
+        """
+        if self._file is None:
+            self.open()
+        entry = {
+            "guild": str(guild_id),
+            "game_id": str(game_id),
+            "user": str(user_id),
+            "team": team,
+        }
+        try:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+        except OSError:
+            log.exception("Error writing pickems vote to the journal")
+
+    def replay(self) -> Iterator[dict]:
+        """
+        Yields every vote still in the journal, oldest first
+
+        A rotated journal is only left behind when a save failed
+        so it is replayed before the current journal.
+        """
+        for path in (self.rotated_path, self.path):
+            if not path.exists():
+                continue
+            with path.open("r", encoding="utf-8") as infile:
+                for line in infile:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # a partially written line from a crash
+                        continue
+
+    def rotate(self) -> None:
+        """
+        Starts a new journal, keeping the current one until it's compacted
+
+        If a previous compaction never completed the current journal
+        is merged into the rotated file instead of replacing it.
+        """
+        self.close()
+        if self.path.exists():
+            if self.rotated_path.exists():
+                with self.rotated_path.open("a", encoding="utf-8") as outfile:
+                    outfile.write(self.path.read_text(encoding="utf-8"))
+                self.path.unlink()
+            else:
+                self.path.replace(self.rotated_path)
+        self.open()
+
+    def compact(self) -> None:
+        """
+        Drops the rotated journal once its votes are saved in Config
+        """
+        try:
+            self.rotated_path.unlink()
+        except FileNotFoundError:
+            pass
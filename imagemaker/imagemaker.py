@@ -2,21 +2,23 @@ import asyncio
 import functools
 import json
 import logging
-import os
 import sys
 import textwrap
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 from io import BytesIO
-from typing import Optional, Union, cast, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Union, cast, Tuple
 
 import aiohttp
 import discord
 import numpy as np
 from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageSequence
 from redbot.core import commands
-from redbot.core.data_manager import bundled_data_path
+from redbot.core.data_manager import bundled_data_path, cog_data_path
 
-from .converter import ImageFinder
+from .converter import IMAGE_INDEX, ImageFinder
 
 log = logging.getLogger("red.trusty-cogs.imagemaker")
 
@@ -34,6 +36,24 @@ try:
 except ImportError:
     BANNER = False
 
+TEMPLATES = {
+    "beautiful": "https://i.imgur.com/kzE9XBE.png",
+    "feels": "https://i.imgur.com/4xr6cdw.png",
+    "wheeze": "https://i.imgur.com/c5uoDcd.jpg",
+    "pill": "https://i.imgur.com/n6r04O8.png",
+}
+# Templates are downloaded once into the cogs data folder
+# and kept decoded in memory while the cog is loaded
+
+RENDER_CACHE_BYTES = 32 * 1024 * 1024
+# Total size of finished images kept to answer repeated requests
+
+TRUMP_TEXT_SIZE = (160, 200)
+# Width and height of the text image warped onto the isnowillegal frames
+
+TRUMP_THREADS = 4
+# Threads used to warp the isnowillegal frames
+
 
 class ImageMaker(commands.Cog):
     """
@@ -46,10 +66,32 @@ class ImageMaker(commands.Cog):
         "Bruno Lemos (isnowillegal.com)",
         "Jo\u00e3o Pedro (isnowillegal.com)",
     ]
-    __version__ = "1.5.2"
+    __version__ = "1.6.0"
 
     def __init__(self, bot):
         self.bot = bot
+        self.session = aiohttp.ClientSession()
+        self.templates: Dict[str, Image.Image] = {}
+        self.render_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.render_cache_size = 0
+        self.trump_frames: Optional[list] = None
+        self.trump_palette: Optional[Image.Image] = None
+        self.bot.loop.create_task(self.initialize())
+
+    async def initialize(self) -> None:
+        for name in TEMPLATES:
+            try:
+                await self.get_template(name)
+            except Exception:
+                log.exception("Error loading the %s template", name)
+        if TRUMP:
+            try:
+                await self.bot.loop.run_in_executor(None, self.load_trump_frames)
+            except Exception:
+                log.exception("Error loading the isnowillegal frames")
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.session.close())
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
@@ -64,6 +106,46 @@ class ImageMaker(commands.Cog):
         """
         return
 
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        IMAGE_INDEX.add_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        IMAGE_INDEX.remove_message(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        IMAGE_INDEX.update_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        IMAGE_INDEX.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if before.display_name != after.display_name:
+            IMAGE_INDEX.update_member(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        if before.name == after.name:
+            return
+        for guild_id in list(IMAGE_INDEX.guilds):
+            guild = self.bot.get_guild(guild_id)
+            member = guild.get_member(after.id) if guild else None
+            if member:
+                IMAGE_INDEX.update_member(member)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        IMAGE_INDEX.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # the guilds members are loaded again after an outage so the index is rebuilt
+        IMAGE_INDEX.remove_guild(guild.id)
+
     async def safe_send(
         self, ctx: commands.Context, text: Optional[str], file: discord.File, file_size: int
     ):
@@ -93,13 +175,49 @@ class ImageMaker(commands.Cog):
                 return b
             except discord.HTTPException:
                 return None
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(url)) as resp:
-                if resp.status == 200:
-                    test = await resp.read()
-                    return BytesIO(test)
-                else:
-                    return None
+        async with self.session.get(str(url)) as resp:
+            if resp.status == 200:
+                test = await resp.read()
+                return BytesIO(test)
+            else:
+                return None
+
+    async def get_template(self, name: str) -> Image.Image:
+        """
+        Returns a copy of a template image ready to be drawn on
+        """
+        if name not in self.templates:
+            url = TEMPLATES[name]
+            path = cog_data_path(self) / "templates" / f"{name}{Path(url).suffix}"
+            if path.exists():
+                data = BytesIO(path.read_bytes())
+            else:
+                data = await self.dl_image(url)
+                if data is None:
+                    raise OSError(f"Could not download the {name} template")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(data.getvalue())
+            with Image.open(data) as template:
+                self.templates[name] = template.convert("RGBA")
+        return self.templates[name].copy()
+
+    def get_render(self, key: tuple) -> Optional[BytesIO]:
+        if key not in self.render_cache:
+            return None
+        self.render_cache.move_to_end(key)
+        return BytesIO(self.render_cache[key])
+
+    def set_render(self, key: tuple, image: BytesIO) -> None:
+        value = image.getvalue()
+        if len(value) > RENDER_CACHE_BYTES:
+            return
+        if key in self.render_cache:
+            self.render_cache_size -= len(self.render_cache.pop(key))
+        self.render_cache[key] = value
+        self.render_cache_size += len(value)
+        while self.render_cache_size > RENDER_CACHE_BYTES:
+            _key, old = self.render_cache.popitem(last=False)
+            self.render_cache_size -= len(old)
 
     @commands.command()
     @commands.bot_has_permissions(attach_files=True)
@@ -170,34 +288,33 @@ class ImageMaker(commands.Cog):
             msg = "A maximum character total of 280 is enforced. You sent: `{}` characters"
             return await ctx.send(msg.format(len(text)))
         async with ctx.typing():
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.post(
-                        url="http://talkobamato.me/synthesize.py", data={"input_text": text}
-                    ) as resp:
-                        if resp.status != 200:
-                            return await ctx.send(
-                                "Something went wrong while trying to get the video."
-                            )
-                        url = resp.url
-
-                    key = url.query["speech_key"]
-                    link = f"http://talkobamato.me/synth/output/{key}/obama.mp4"
-                    await asyncio.sleep(len(text) // 5)
-                    async with session.get(link) as resp:
-                        if resp.status != 200:
-                            return await ctx.send(
-                                "Something went wrong while trying to get the video."
-                            )
-                    async with session.get(link) as r:
-                        data = BytesIO(await r.read())
-                except aiohttp.ClientConnectionError:
-                    return await ctx.send("Something went wrong while trying to get the video.")
-                data.name = "obama.mp4"
-                data.seek(0)
-                file = discord.File(data)
-                file_size = data.tell()
-                data.close()
+            try:
+                async with self.session.post(
+                    url="http://talkobamato.me/synthesize.py", data={"input_text": text}
+                ) as resp:
+                    if resp.status != 200:
+                        return await ctx.send(
+                            "Something went wrong while trying to get the video."
+                        )
+                    url = resp.url
+
+                key = url.query["speech_key"]
+                link = f"http://talkobamato.me/synth/output/{key}/obama.mp4"
+                await asyncio.sleep(len(text) // 5)
+                async with self.session.get(link) as resp:
+                    if resp.status != 200:
+                        return await ctx.send(
+                            "Something went wrong while trying to get the video."
+                        )
+                async with self.session.get(link) as r:
+                    data = BytesIO(await r.read())
+            except aiohttp.ClientConnectionError:
+                return await ctx.send("Something went wrong while trying to get the video.")
+            data.name = "obama.mp4"
+            data.seek(0)
+            file = discord.File(data)
+            file_size = data.tell()
+            data.close()
         await self.safe_send(ctx, None, file, file_size)
 
     @commands.command()
@@ -274,12 +391,20 @@ class ImageMaker(commands.Cog):
             await ctx.send(msg)
             return
         async with ctx.channel.typing():
-            task = functools.partial(self.make_trump_gif, text=message)
-            task = self.bot.loop.run_in_executor(None, task)
-            try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
-            except asyncio.TimeoutError:
-                return
+            key = ("trump", None, message)
+            temp = self.get_render(key)
+            if temp is None:
+                if self.trump_frames is None:
+                    await self.bot.loop.run_in_executor(None, self.load_trump_frames)
+                task = functools.partial(self.make_trump_gif, text=message)
+                task = self.bot.loop.run_in_executor(None, task)
+                try:
+                    temp = await asyncio.wait_for(task, timeout=60)
+                except asyncio.TimeoutError:
+                    return
+                self.set_render(key, temp)
+            file = discord.File(temp, filename="Trump.gif")
+            file_size = len(temp.getvalue())
         await self.safe_send(ctx, None, file, file_size)
 
     @commands.command()
@@ -319,18 +444,22 @@ class ImageMaker(commands.Cog):
         await ctx.invoke(self.pill, "#008000")
 
     async def make_colour(self, colour):
-        template_str = "https://i.imgur.com/n6r04O8.png"
-        template = Image.open(await self.dl_image(template_str))
-        task = functools.partial(self.colour_convert, template=template, colour=colour)
-        task = self.bot.loop.run_in_executor(None, task)
-        try:
-            image = await asyncio.wait_for(task, timeout=60)
-        except asyncio.TimeoutError:
-            return
+        key = ("pill", None, colour.lower())
+        image = self.get_render(key)
+        if image is None:
+            template = await self.get_template("pill")
+            task = functools.partial(self.colour_convert, template=template, colour=colour)
+            task = self.bot.loop.run_in_executor(None, task)
+            try:
+                image = await asyncio.wait_for(task, timeout=60)
+            except asyncio.TimeoutError:
+                return None, 0
+            finally:
+                template.close()
+            self.set_render(key, image)
         image.seek(0)
-        template.close()
         file = discord.File(image, filename="pill.png")
-        file_size = image.tell()
+        file_size = len(image.getvalue())
         return file, file_size
 
     @commands.command()
@@ -353,114 +482,106 @@ class ImageMaker(commands.Cog):
     async def make_beautiful(
         self, user: discord.User, is_gif: bool
     ) -> Tuple[Optional[discord.File], int]:
-        template_str = "https://i.imgur.com/kzE9XBE.png"
-        template = Image.open(await self.dl_image(template_str))
-        if user.is_avatar_animated() and is_gif:
-            avatar = Image.open(
-                await self.dl_image(str(user.avatar_url_as(format="gif", size=128)))
-            )
-            task = functools.partial(self.make_beautiful_gif, template=template, avatar=avatar)
-
-        else:
-            avatar = Image.open(
-                await self.dl_image(str(user.avatar_url_as(format="png", size=128)))
-            )
-            task = functools.partial(self.make_beautiful_img, template=template, avatar=avatar)
-        task = self.bot.loop.run_in_executor(None, task)
-        try:
-            temp: BytesIO = await asyncio.wait_for(task, timeout=60)
-        except asyncio.TimeoutError:
-            avatar.close()
-            template.close()
-            return None, 0
-        avatar.close()
-        template.close()
+        animated = user.is_avatar_animated() and is_gif
+        avatar_url = str(user.avatar_url_as(format="gif" if animated else "png", size=128))
+        key = ("beautiful", avatar_url, None)
+        temp = self.get_render(key)
+        if temp is None:
+            template = await self.get_template("beautiful")
+            avatar = Image.open(await self.dl_image(avatar_url))
+            if animated:
+                task = functools.partial(self.make_beautiful_gif, template=template, avatar=avatar)
+            else:
+                task = functools.partial(self.make_beautiful_img, template=template, avatar=avatar)
+            task = self.bot.loop.run_in_executor(None, task)
+            try:
+                temp = await asyncio.wait_for(task, timeout=60)
+            except asyncio.TimeoutError:
+                return None, 0
+            finally:
+                avatar.close()
+                template.close()
+            self.set_render(key, temp)
         temp.seek(0)
         filename = "beautiful.gif" if is_gif else "beautiful.png"
         file = discord.File(temp, filename=filename)
-        file_size = temp.tell()
-        temp.close()
+        file_size = len(temp.getvalue())
         return file, file_size
 
     async def make_feels(
         self, user: discord.User, is_gif: bool
     ) -> Tuple[Optional[discord.File], int]:
-        template_str = "https://i.imgur.com/4xr6cdw.png"
-        template = Image.open(await self.dl_image(template_str))
         colour = user.colour.to_rgb()
-        if user.is_avatar_animated() and is_gif:
-            avatar = Image.open(
-                await self.dl_image(str(user.avatar_url_as(format="gif", size=64)))
-            )
-            task = functools.partial(
-                self.make_feels_gif, template=template, colour=colour, avatar=avatar
-            )
-        else:
-            avatar = Image.open(
-                await self.dl_image(str(user.avatar_url_as(format="png", size=64)))
-            )
-            task = functools.partial(
-                self.make_feels_img, template=template, colour=colour, avatar=avatar
-            )
-        task = self.bot.loop.run_in_executor(None, task)
-        try:
-            temp: BytesIO = await asyncio.wait_for(task, timeout=60)
-        except asyncio.TimeoutError:
-            avatar.close()
-            template.close()
-            return None, 0
-        avatar.close()
-        template.close()
+        animated = user.is_avatar_animated() and is_gif
+        avatar_url = str(user.avatar_url_as(format="gif" if animated else "png", size=64))
+        key = ("feels", avatar_url, colour)
+        temp = self.get_render(key)
+        if temp is None:
+            template = await self.get_template("feels")
+            avatar = Image.open(await self.dl_image(avatar_url))
+            if animated:
+                task = functools.partial(
+                    self.make_feels_gif, template=template, colour=colour, avatar=avatar
+                )
+            else:
+                task = functools.partial(
+                    self.make_feels_img, template=template, colour=colour, avatar=avatar
+                )
+            task = self.bot.loop.run_in_executor(None, task)
+            try:
+                temp = await asyncio.wait_for(task, timeout=60)
+            except asyncio.TimeoutError:
+                return None, 0
+            finally:
+                avatar.close()
+                template.close()
+            self.set_render(key, temp)
         temp.seek(0)
         filename = "feels.gif" if is_gif else "feels.png"
         file = discord.File(temp, filename=filename)
-        file_size = temp.tell()
-        temp.close()
+        file_size = len(temp.getvalue())
         return file, file_size
 
     async def make_wheeze(
         self, text: Union[discord.Member, str], is_gif=False
     ) -> Tuple[Optional[discord.File], int]:
-        template_path = "https://i.imgur.com/c5uoDcd.jpg"
-        template = Image.open(await self.dl_image(template_path))
-        avatar = None
         if type(text) == discord.Member:
             user = cast(discord.User, text)
-            if user.is_avatar_animated() and is_gif:
-                avatar = Image.open(
-                    await self.dl_image(str(user.avatar_url_as(format="gif", size=64)))
-                )
-
-                task = functools.partial(self.make_wheeze_gif, template=template, avatar=avatar)
-
-            else:
-                avatar = Image.open(
-                    await self.dl_image(str(user.avatar_url_as(format="png", size=64)))
-                )
-                task = functools.partial(self.make_wheeze_img, template=template, avatar=avatar)
-            task = self.bot.loop.run_in_executor(None, task)
-            try:
-                temp: BytesIO = await asyncio.wait_for(task, timeout=60)
-            except asyncio.TimeoutError:
-                avatar.close()
-                template.close()
-                return None, 0
+            animated = user.is_avatar_animated() and is_gif
+            avatar_url = str(user.avatar_url_as(format="gif" if animated else "png", size=64))
+            key = ("wheeze", avatar_url, None)
         else:
-            task = functools.partial(self.make_wheeze_img, template=template, avatar=text)
+            key = ("wheeze", None, text)
+        temp = self.get_render(key)
+        if temp is None:
+            template = await self.get_template("wheeze")
+            avatar = None
+            if type(text) == discord.Member:
+                avatar = Image.open(await self.dl_image(avatar_url))
+                if animated:
+                    task = functools.partial(
+                        self.make_wheeze_gif, template=template, avatar=avatar
+                    )
+                else:
+                    task = functools.partial(
+                        self.make_wheeze_img, template=template, avatar=avatar
+                    )
+            else:
+                task = functools.partial(self.make_wheeze_img, template=template, avatar=text)
             task = self.bot.loop.run_in_executor(None, task)
             try:
                 temp = await asyncio.wait_for(task, timeout=60)
             except asyncio.TimeoutError:
-                template.close()
                 return None, 0
-        if avatar:
-            avatar.close()
-        template.close()
-        file_size = temp.tell()
+            finally:
+                if avatar:
+                    avatar.close()
+                template.close()
+            self.set_render(key, temp)
         temp.seek(0)
         filename = "wheeze.gif" if is_gif else "wheeze.gif"
         file = discord.File(temp, filename=filename)
-        temp.close()
+        file_size = len(temp.getvalue())
         return file, file_size
 
     async def face_merge(self, urls: list) -> Tuple[Optional[discord.File], int]:
@@ -691,88 +812,96 @@ class ImageMaker(commands.Cog):
 
     """Code is from http://isnowillegal.com/ and made to work on redbot"""
 
-    def make_trump_gif(self, text: str) -> Tuple[Optional[discord.File], int]:
-        folder = str(bundled_data_path(self)) + "/trump_template"
-        jsonPath = os.path.join(folder, "frames.json")
-
-        # Load frames
-        frames = json.load(open(jsonPath))
-
-        # Used to compute motion blur
-        lastCorners = None
-        textImage = self.generateText(text)
-
-        # Will store all gif frames
-        frameImages = []
-
-        # Iterate trough frames
+    def load_trump_frames(self) -> None:
+        """
+        Decodes the isnowillegal frames once along with what's needed to warp each one
+        """
+        folder = bundled_data_path(self) / "trump_template"
+        with open(folder / "frames.json") as f:
+            frames = json.load(f)
+        width, height = TRUMP_TEXT_SIZE
+        # Points on the text image matched to each frames corners
+        pts1 = np.float32([[0, 0], [width, 0], [0, height]])
+        loaded = []
         for frame in frames:
-            # Load image
-            name = frame["file"]
-            filePath = os.path.join(folder, name)
-            finalFrame = None
-
-            # If it has transformations,
-            # process with opencv and convert back to pillow
+            file_path = str(folder / frame["file"])
             if frame["show"]:
-                image = cv2.imread(filePath)
-
-                # Do rotoscope
-                image = self.rotoscope(image, textImage, frame)
-
-                # Show final result
-                # cv2.imshow(name, image)
-                finalFrame = self.cvImageToPillow(image)
+                image = cv2.imread(file_path)
+                rows, cols, ch = image.shape
+                # Enlarge image to multisample
+                large = cv2.resize(image, (cols * 2, rows * 2))
+                pts2 = np.float32(frame["corners"]) * 2
+                M = cv2.getAffineTransform(pts1, pts2)
+                loaded.append((large, M))
             else:
-                finalFrame = Image.open(filePath)
-
-            frameImages.append(finalFrame)
+                with Image.open(file_path) as image:
+                    loaded.append((image.convert("RGB"), None))
+        self.trump_frames = loaded
+        # Every render shares one palette made from a sample render
+        # so frames are only mapped onto it rather than quantized one by one
+        sample = self.render_trump_frames("SAMPLE TEXT")
+        montage = Image.new("RGB", (sample[0].width, sample[0].height * len(sample)))
+        for i, frame in enumerate(sample):
+            montage.paste(frame, (0, i * frame.height))
+        self.trump_palette = montage.quantize(colors=256, method=Image.MEDIANCUT)
+
+    def render_trump_frames(self, text: str) -> List[Image.Image]:
+        # Apply blur on warp, the text is the same on every frame so it's blurred once
+        kernel = np.ones((5, 5), np.float32) / 25
+        warp = cv2.filter2D(self.generateText(text), -1, kernel)
+
+        def render(frame: Tuple[Union[np.ndarray, Image.Image], Optional[np.ndarray]]):
+            image, M = frame
+            if M is None:
+                return image
+            return self.cvImageToPillow(self.rotoscope(image, warp, M))
+
+        # OpenCV releases the GIL so the frames are warped side by side in threads
+        with ThreadPoolExecutor(max_workers=TRUMP_THREADS) as executor:
+            return list(executor.map(render, self.trump_frames))
+
+    def make_trump_gif(self, text: str) -> BytesIO:
+        if self.trump_frames is None:
+            self.load_trump_frames()
+        frameImages = [
+            frame.quantize(palette=self.trump_palette, dither=Image.NONE)
+            for frame in self.render_trump_frames(text)
+        ]
         temp = BytesIO()
-        # Saving...
+        # Saving... the frames already share a palette so pillow
+        # isn't asked to optimize a palette for each frame again
         frameImages[0].save(
-            temp, format="GIF", save_all=True, append_images=frameImages, duration=0, loop=0
+            temp,
+            format="GIF",
+            save_all=True,
+            append_images=frameImages[1:],
+            duration=0,
+            loop=0,
+            optimize=False,
         )
         temp.name = "Trump.gif"
         temp.seek(0)
-        finalFrame.close()
-        file = discord.File(temp)
-        file_size = temp.tell()
-        temp.close()
-        return file, file_size
-
-    def rotoscope(self, dst, warp, properties: dict):
-        if not properties["show"]:
-            return dst
-
-        corners = properties["corners"]
+        return temp
 
-        wRows, wCols, wCh = warp.shape
+    def rotoscope(self, dst: np.ndarray, warp: np.ndarray, M: np.ndarray) -> np.ndarray:
+        """
+        Draws `warp` onto a frame enlarged to twice its size using the affine matrix `M`
+        """
         rows, cols, ch = dst.shape
-
-        # Apply blur on warp
-        kernel = np.ones((5, 5), np.float32) / 25
-        warp = cv2.filter2D(warp, -1, kernel)
-
-        # Prepare points to be matched on Affine Transformation
-        pts1 = np.float32([[0, 0], [wCols, 0], [0, wRows]])
-        pts2 = np.float32(corners) * 2
-
-        # Enlarge image to multisample
-        dst = cv2.resize(dst, (cols * 2, rows * 2))
+        dst = dst.copy()
 
         # Transform image with the Matrix
-        M = cv2.getAffineTransform(pts1, pts2)
         cv2.warpAffine(
             warp,
             M,
-            (cols * 2, rows * 2),
+            (cols, rows),
             dst,
             flags=cv2.INTER_AREA,
             borderMode=cv2.BORDER_TRANSPARENT,
         )
 
         # Sample back image size
-        dst = cv2.resize(dst, (cols, rows))
+        dst = cv2.resize(dst, (cols // 2, rows // 2))
 
         return dst
 
@@ -804,7 +933,7 @@ class ImageMaker(commands.Cog):
         txtColor = (20, 20, 20)
         bgColor = (224, 233, 237)
         # bgColor = (100, 0, 0)
-        imgSize = (160, 200)
+        imgSize = TRUMP_TEXT_SIZE
 
         # Create image
         image = Image.new("RGB", imgSize, bgColor)
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import pickle
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+log = logging.getLogger("red.trusty-cogs.NotSoBot")
+
+
+class LRUCache:
+    """
+    LRU of bytes values bound by their total size
+
+    When given a `disk_path` values are also written there and entries
+    evicted from memory are read back from disk, which is itself kept
+    under `max_disk_bytes` by removing the least recently written files.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_path: Optional[Path] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_path = disk_path
+        self.size = 0
+        self.disk_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        if disk_path is not None:
+            disk_path.mkdir(parents=True, exist_ok=True)
+            self.disk_size = sum(f.stat().st_size for f in disk_path.iterdir())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_path / hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        if self.disk_path is not None:
+            try:
+                value = self._disk_file(key).read_bytes()
+            except OSError:
+                pass
+            else:
+                self.hits += 1
+                self._store(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        self._store(key, value)
+        if self.disk_path is not None:
+            self._write_disk(key, value)
+
+    def _store(self, key: str, value: bytes) -> None:
+        if key in self._data:
+            self.size -= len(self._data.pop(key))
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _key, old = self._data.popitem(last=False)
+            self.size -= len(old)
+
+    def _write_disk(self, key: str, value: bytes) -> None:
+        path = self._disk_file(key)
+        try:
+            if path.exists():
+                self.disk_size -= path.stat().st_size
+            path.write_bytes(value)
+            self.disk_size += len(value)
+        except OSError:
+            log.exception("Error writing to the image cache")
+            return
+        if self.disk_size > self.max_disk_bytes:
+            files = sorted(self.disk_path.iterdir(), key=lambda f: f.stat().st_mtime)
+            for old in files:
+                if self.disk_size <= self.max_disk_bytes * 0.9:
+                    break
+                self.disk_size -= old.stat().st_size
+                old.unlink()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+        if self.disk_path is not None:
+            for path in self.disk_path.iterdir():
+                path.unlink()
+            self.disk_size = 0
+
+
+def _hash_arg(arg: Any, digest: "hashlib._Hash") -> None:
+    if isinstance(arg, BytesIO):
+        digest.update(hashlib.sha1(arg.getvalue()).digest())
+    elif isinstance(arg, (list, tuple)):
+        digest.update(b"[")
+        for item in arg:
+            _hash_arg(item, digest)
+        digest.update(b"]")
+    else:
+        digest.update(repr(arg).encode())
+    digest.update(b"\0")
+
+
+def result_key(func: Callable, args: tuple) -> str:
+    """
+    Key for a transform result based on the transform and its inputs
+
+    Image inputs are hashed by their contents so the same image downloaded
+    from a different url still hits the cache.
+    """
+    digest = hashlib.sha1()
+    for arg in args:
+        _hash_arg(arg, digest)
+    return f"{func.__name__}:{digest.hexdigest()}"
+
+
+class PickledCache(LRUCache):
+    """
+    LRUCache of arbitrary picklable objects
+
+    Values are stored pickled so every hit returns fresh copies,
+    including file objects that are safe to send and close.
+    """
+
+    def get_object(self, key: str) -> Any:
+        data = self.get(key)
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def set_object(self, key: str, value: Any) -> None:
+        self.set(key, pickle.dumps(value))
@@ -2,7 +2,9 @@ import discord
 import re
 
 import unidecode
-from typing import Pattern, List, Union
+from bisect import bisect_right
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Pattern, Set, Tuple, Union
 from redbot.core import commands
 from discord.ext.commands.converter import Converter
 from discord.ext.commands.errors import BadArgument
@@ -14,6 +16,163 @@ EMOJI_REGEX: Pattern = re.compile(r"(<(a)?:[a-zA-Z0-9\_]+:([0-9]+)>)")
 MENTION_REGEX: Pattern = re.compile(r"<@!?([0-9]+)>")
 ID_REGEX: Pattern = re.compile(r"[0-9]{17,}")
 
+RECENT_IMAGE_MESSAGES = 10
+# How many messages with images are remembered per channel
+
+
+class GuildNameIndex:
+    """
+    Normalized display names and usernames of a guilds members
+
+    Names are run through unidecode once when a member is added or renamed
+    and kept in a single string so a substring lookup is one regex search
+    instead of normalizing every member on every lookup.
+    """
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        self._blob: Optional[str] = None
+        self._offsets: List[int] = []
+        self._ids: List[int] = []
+
+    @staticmethod
+    def normalize(member: discord.Member) -> str:
+        display_name = unidecode.unidecode(member.display_name.lower())
+        name = unidecode.unidecode(member.name.lower())
+        return f"{display_name}\n{name}"
+
+    def add(self, member: discord.Member) -> None:
+        names = self.normalize(member)
+        if self.names.get(member.id) != names:
+            self.names[member.id] = names
+            self._blob = None
+
+    def remove(self, member_id: int) -> None:
+        if self.names.pop(member_id, None) is not None:
+            self._blob = None
+
+    def _build(self) -> str:
+        offsets = []
+        ids = []
+        position = 0
+        for member_id, names in self.names.items():
+            offsets.append(position)
+            ids.append(member_id)
+            # one extra character for the separator between members
+            position += len(names) + 1
+        self._offsets = offsets
+        self._ids = ids
+        self._blob = "\0".join(self.names.values())
+        return self._blob
+
+    def search(self, argument: str) -> Iterator[int]:
+        """
+        Yields the ID of every member with a name containing `argument`
+        """
+        blob = self._blob if self._blob is not None else self._build()
+        last = None
+        for match in re.finditer(re.escape(argument.lower()), blob):
+            member_id = self._ids[bisect_right(self._offsets, match.start()) - 1]
+            if member_id != last:
+                last = member_id
+                yield member_id
+
+
+class ImageIndex:
+    """
+    Shared lookups for the ImageFinder converter
+
+    Holds a `GuildNameIndex` per guild and the most recent images posted
+    in each channel, both kept up to date by the cogs listeners.
+    """
+
+    def __init__(self):
+        self.guilds: Dict[int, GuildNameIndex] = {}
+        self.partial: Set[int] = set()
+        self.recent: Dict[int, Deque[Tuple[int, list]]] = {}
+        self.seeded: Set[int] = set()
+
+    def guild(self, guild: discord.Guild) -> GuildNameIndex:
+        if guild.id not in self.guilds:
+            index = GuildNameIndex()
+            for member in guild.members:
+                index.add(member)
+            self.guilds[guild.id] = index
+            if not guild.chunked:
+                self.partial.add(guild.id)
+        elif guild.id in self.partial:
+            # members loaded by chunking don't dispatch any events
+            # so they're picked up here until the guild is fully chunked
+            index = self.guilds[guild.id]
+            if len(index.names) != guild.member_count:
+                for member in guild.members:
+                    if member.id not in index.names:
+                        index.add(member)
+            if guild.chunked:
+                self.partial.discard(guild.id)
+        return self.guilds[guild.id]
+
+    def update_member(self, member: discord.Member) -> None:
+        if member.guild.id in self.guilds:
+            self.guilds[member.guild.id].add(member)
+
+    def remove_member(self, member: discord.Member) -> None:
+        if member.guild.id in self.guilds:
+            self.guilds[member.guild.id].remove(member.id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        self.guilds.pop(guild_id, None)
+        self.partial.discard(guild_id)
+
+    @staticmethod
+    def images_in(message: discord.Message) -> list:
+        images = list(message.attachments)
+        match = IMAGE_LINKS.match(message.content)
+        if match:
+            images.append(match.group(1))
+        return images
+
+    def add_message(self, message: discord.Message) -> None:
+        images = self.images_in(message)
+        if not images:
+            return
+        if message.channel.id not in self.recent:
+            self.recent[message.channel.id] = deque(maxlen=RECENT_IMAGE_MESSAGES)
+        self.recent[message.channel.id].append((message.id, images))
+
+    def remove_message(self, channel_id: int, message_id: int) -> None:
+        if channel_id not in self.recent:
+            return
+        recent = self.recent[channel_id]
+        for entry in [e for e in recent if e[0] == message_id]:
+            recent.remove(entry)
+
+    def seed(self, channel_id: int, messages: List[discord.Message]) -> None:
+        """
+        Merges messages read from a channels history into its recent images
+        """
+        self.seeded.add(channel_id)
+        entries = list(self.recent.get(channel_id, []))
+        seen = {message_id for message_id, _images in entries}
+        for message in messages:
+            images = self.images_in(message)
+            if images and message.id not in seen:
+                entries.append((message.id, images))
+        entries.sort(key=lambda entry: entry[0])
+        self.recent[channel_id] = deque(entries, maxlen=RECENT_IMAGE_MESSAGES)
+
+    def recent_images(self, channel_id: int) -> list:
+        """
+        Returns the images from the most recent messages in a channel, newest first
+        """
+        urls = []
+        for _message_id, images in reversed(self.recent.get(channel_id, [])):
+            urls += images
+        return urls
+
+
+IMAGE_INDEX = ImageIndex()
+
 
 class ImageFinder(Converter):
     """
@@ -58,17 +217,13 @@ class ImageFinder(Converter):
         if attachments:
             for attachment in attachments:
                 urls.append(attachment.url)
-        if not urls:
-            for m in ctx.guild.members:
-                if argument.lower() in unidecode.unidecode(m.display_name.lower()):
-                    # display_name so we can get the nick of the user first
-                    # without being NoneType and then check username if that matches
-                    # what we're expecting
-                    urls.append(m.avatar_url_as(format="png"))
-                    continue
-                if argument.lower() in unidecode.unidecode(m.name.lower()):
-                    urls.append(m.avatar_url_as(format="png"))
-                    continue
+        if not urls and ctx.guild:
+            # display_name is checked first so we get the nick of the user
+            # and then the username if that matches what we're expecting
+            for member_id in IMAGE_INDEX.guild(ctx.guild).search(argument):
+                member = ctx.guild.get_member(member_id)
+                if member:
+                    urls.append(member.avatar_url_as(format="png"))
 
         if not urls:
             raise BadArgument("No images provided.")
@@ -77,16 +232,14 @@ class ImageFinder(Converter):
     async def search_for_images(
         self, ctx: commands.Context
     ) -> List[Union[discord.Asset, discord.Attachment, str]]:
-        urls = []
-        if not ctx.channel.permissions_for(ctx.me).read_message_history:
-            raise BadArgument("I require read message history perms to find images.")
-        async for message in ctx.channel.history(limit=10):
-            if message.attachments:
-                for attachment in message.attachments:
-                    urls.append(attachment)
-            match = IMAGE_LINKS.match(message.content)
-            if match:
-                urls.append(match.group(1))
+        if ctx.channel.id not in IMAGE_INDEX.seeded:
+            # nothing has been seen in this channel since the bot started
+            # so the recent history is read once to fill in what was missed
+            if not ctx.channel.permissions_for(ctx.me).read_message_history:
+                raise BadArgument("I require read message history perms to find images.")
+            messages = await ctx.channel.history(limit=RECENT_IMAGE_MESSAGES).flatten()
+            IMAGE_INDEX.seed(ctx.channel.id, messages)
+        urls = IMAGE_INDEX.recent_images(ctx.channel.id)
         if not urls:
             raise BadArgument("No Images found in recent history.")
         return urls
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import site
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("red.trusty-cogs.NotSoBot")
+
+COG_PATH = str(Path(__file__).parent.parent)
+# Worker processes started with spawn (Windows and macOS) don't inherit
+# the bots imports so the directory this cog lives in is added to their path
+# in order to import the transforms by name.
+
+
+class EngineBusy(Exception):
+    """Raised when the image engine already has too many jobs queued"""
+
+    pass
+
+
+class ImageEngine:
+    """
+    Runs image transforms in a dedicated process pool
+
+    Jobs are limited by a global cap equal to the number of workers and
+    a per-guild cap so one guild can't occupy every worker. Once `max_queue`
+    jobs are waiting or running new jobs are refused with `EngineBusy`.
+    Jobs running longer than their timeout have their worker terminated.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 10, guild_concurrency: int = 2):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.guild_concurrency = guild_concurrency
+        self.pending = 0
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self._guild_semaphores: Dict[int, asyncio.Semaphore] = {}
+
+    def configure(self, workers: int, max_queue: int, guild_concurrency: int) -> None:
+        """
+        Applies new limits, jobs already running keep their old worker
+        """
+        if workers != self.workers and self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self.workers = workers
+        self.max_queue = max_queue
+        self.guild_concurrency = guild_concurrency
+        self._semaphore = asyncio.Semaphore(workers)
+        self._guild_semaphores = {}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._kill_pool(self._pool)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=site.addsitedir, initargs=(COG_PATH,)
+            )
+        return self._pool
+
+    def _kill_pool(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is pool:
+            self._pool = None
+        # A job that has started can't be cancelled through the executor
+        # so its worker processes are terminated and the next job starts a new pool
+        processes = getattr(pool, "_processes", None) or {}
+        for process in list(processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False)
+
+    def _guild_semaphore(self, guild_id: Optional[int]) -> asyncio.Semaphore:
+        key = guild_id or 0
+        if key not in self._guild_semaphores:
+            self._guild_semaphores[key] = asyncio.Semaphore(self.guild_concurrency)
+        return self._guild_semaphores[key]
+
+    def _stats_for(self, name: str) -> Dict[str, float]:
+        if name not in self.stats:
+            self.stats[name] = {
+                "jobs": 0,
+                "wait": 0.0,
+                "render": 0.0,
+                "max_wait": 0.0,
+                "max_render": 0.0,
+                "timeouts": 0,
+                "busy": 0,
+            }
+        return self.stats[name]
+
+    async def run(
+        self, name: str, guild_id: Optional[int], func: Callable, *args, timeout: float = 60
+    ) -> Any:
+        """
+        Runs `func(*args)` in the process pool and returns the result
+
+        `name` is the command the job is recorded under in the metrics.
+        Raises `EngineBusy` if the queue is full and `asyncio.TimeoutError`
+        if the job was terminated for running longer than `timeout` seconds.
+        """
+        stats = self._stats_for(name)
+        if self.pending >= self.max_queue:
+            stats["busy"] += 1
+            raise EngineBusy()
+        self.pending += 1
+        queued = time.monotonic()
+        try:
+            async with self._guild_semaphore(guild_id), self._semaphore:
+                started = time.monotonic()
+                wait = started - queued
+                stats["wait"] += wait
+                stats["max_wait"] = max(stats["max_wait"], wait)
+                try:
+                    return await self._submit(func, args, timeout)
+                except asyncio.TimeoutError:
+                    stats["timeouts"] += 1
+                    raise
+                finally:
+                    render = time.monotonic() - started
+                    stats["jobs"] += 1
+                    stats["render"] += render
+                    stats["max_render"] = max(stats["max_render"], render)
+                    log.debug("%s waited %.2fs and rendered in %.2fs", name, wait, render)
+        finally:
+            self.pending -= 1
+
+    async def _submit(self, func: Callable, args: tuple, timeout: float) -> Any:
+        loop = asyncio.get_running_loop()
+        retried = False
+        while True:
+            pool = self._get_pool()
+            future = loop.run_in_executor(pool, func, *args)
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._kill_pool(pool)
+                raise
+            except BrokenProcessPool:
+                # Another job timing out takes the rest of its pool with it
+                # so anything caught up in that is run once more on a new pool
+                if retried:
+                    raise
+                retried = True
+                if self._pool is pool:
+                    self._pool = None
@@ -0,0 +1,88 @@
+"""
+Lazy frame pipeline for animated image transforms
+
+Frames are read one at a time and processed a chunk at a time so only the
+current chunk of source frames is held in memory. Pillow's GIF writer still
+collects every processed frame before it writes any, so what bounds the
+output side is the MAX_FRAMES and MAX_FRAME_SIZE limits, not streaming.
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from typing import Callable, Iterator
+
+from PIL import Image, ImageSequence
+
+MAX_FRAMES = 100
+# Animations with more frames than this have frames dropped evenly
+# with the remaining frames lasting longer to keep the same speed
+
+MAX_FRAME_SIZE = 512
+# Frames larger than this on either side are shrunk before processing
+
+CHUNK_SIZE = 8
+FRAME_THREADS = 4
+# Frames are processed CHUNK_SIZE at a time across FRAME_THREADS threads.
+# PIL and NumPy release the GIL for most of their work so threads are
+# enough to use more than one core inside an image engine worker.
+
+
+def iter_frames(
+    image: Image.Image, max_frames: int = MAX_FRAMES, max_size: int = MAX_FRAME_SIZE
+) -> Iterator[Image.Image]:
+    """
+    Yields the frames of an animation as RGBA images
+
+    Each yielded frame has its `duration` info set, including the time of any
+    frames skipped to stay under `max_frames`.
+    """
+    n_frames = getattr(image, "n_frames", 1)
+    step = max(1, math.ceil(n_frames / max_frames))
+    kept = None
+    duration = 0
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        if index % step == 0:
+            if kept is not None:
+                kept.info["duration"] = duration
+                yield kept
+            kept = frame.convert("RGBA")
+            if kept.width > max_size or kept.height > max_size:
+                kept.thumbnail((max_size, max_size), Image.NEAREST)
+            duration = 0
+        duration += frame.info.get("duration", 0) or 0
+    if kept is not None:
+        kept.info["duration"] = duration
+        yield kept
+
+
+def process_frames(
+    frames: Iterator[Image.Image], func: Callable[[Image.Image], Image.Image]
+) -> Iterator[Image.Image]:
+    """
+    Applies `func` to every frame a chunk at a time keeping the frame order
+    """
+    with ThreadPoolExecutor(max_workers=FRAME_THREADS) as executor:
+        while True:
+            chunk = list(islice(frames, CHUNK_SIZE))
+            if not chunk:
+                break
+            for frame, new_frame in zip(chunk, executor.map(func, chunk)):
+                new_frame.info["duration"] = frame.info.get("duration", 0)
+                yield new_frame
+                frame.close()
+
+
+def save_frames(frames: Iterator[Image.Image], **kwargs) -> BytesIO:
+    """
+    Encodes frames into a looping gif
+
+    Frames are generated lazily but Pillow holds all of them until the
+    gif is written, at most `MAX_FRAMES` frames of `MAX_FRAME_SIZE`.
+    """
+    first = next(frames)
+    final = BytesIO()
+    first.save(final, format="GIF", save_all=True, append_images=frames, loop=0, **kwargs)
+    final.seek(0)
+    return final
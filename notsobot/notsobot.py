@@ -5,39 +5,33 @@ import logging
 import random
 import re
 import sys
-import textwrap
 import uuid
 from io import BytesIO
-from typing import List, Optional, Tuple, Union
-from urllib.parse import quote
+from typing import Any, Callable, Optional, Tuple, Union
 
 import aiohttp
 import discord
-import jpglitch
 import numpy as np
 import PIL
 import wand
 import wand.color
-import wand.drawing
-from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageSequence
-from pyfiglet import figlet_format
-from redbot.core import commands
+import wand.exceptions
+from PIL import ImageFont
+from redbot.core import Config, checks, commands
 from redbot.core.data_manager import bundled_data_path, cog_data_path
+from redbot.core.utils.chat_formatting import box, humanize_list, pagify
 
-from .converter import ImageFinder
-from .vw import macintoshplus
+from . import transforms
+from .cache import PickledCache, result_key
+from .converter import IMAGE_INDEX, ImageFinder
+from .engine import EngineBusy, ImageEngine
+from .pixelsort.interval import INTERVAL_FUNCTIONS
+from .pixelsort.sorting import SORTING_FUNCTIONS
+from .sniff import SNIFF_BYTES, sniff_image
+from .transforms import AALIB_INSTALLED, ImageResult
 
 log = logging.getLogger("red.trusty-cogs.NotSoBot")
 
-try:
-    import aalib
-
-    AALIB_INSTALLED = True
-except Exception:
-    AALIB_INSTALLED = False
-
-code = "```py\n{0}\n```"
-
 
 def posnum(num):
     if num < 0:
@@ -93,12 +87,32 @@ class NotSoBot(commands.Cog):
     """
 
     __author__ = ["NotSoSuper", "TrustyJAID"]
-    __version__ = "2.5.1"
+    __version__ = "2.6.0"
 
     def __init__(self, bot):
         self.bot = bot
-        self.image_cache = {}
-        self.search_cache = {}
+        self.config = Config.get_conf(self, 1647488574, force_registration=True)
+        self.config.register_global(
+            workers=2,
+            max_queue=10,
+            guild_concurrency=2,
+            cache_size=64,
+            disk_cache=False,
+            max_download=20,
+            max_dimension=4096,
+        )
+        self.session = aiohttp.ClientSession()
+        self.max_download = 20 * 1024 * 1024
+        self.max_dimension = 4096
+        self.font_checked = False
+        # the ascii art font only needs to be checked for once
+        self.engine = ImageEngine()
+        self.bot.loop.create_task(self.initialize())
+        self.image_cache = PickledCache(64 * 1024 * 1024)
+        # rendered transform results keyed by the transform and its inputs
+        self.search_cache = PickledCache(64 * 1024 * 1024)
+        # downloaded source images keyed by url
+        self._cache_settings: Tuple[int, bool] = (64, False)
         self.youtube_cache = {}
         self.twitch_cache = []
         self.api_count = 0
@@ -150,6 +164,28 @@ class NotSoBot(commands.Cog):
         self.image_mimes = ["image/png", "image/pjpeg", "image/jpeg", "image/x-icon"]
         self.gif_mimes = ["image/gif"]
 
+    async def initialize(self) -> None:
+        settings = await self.config.all()
+        self.engine.configure(
+            settings["workers"], settings["max_queue"], settings["guild_concurrency"]
+        )
+        self.configure_caches(settings["cache_size"], settings["disk_cache"])
+        self.max_download = settings["max_download"] * 1024 * 1024
+        self.max_dimension = settings["max_dimension"]
+
+    def configure_caches(self, cache_size: int, disk_cache: bool) -> None:
+        if self._cache_settings == (cache_size, disk_cache):
+            return
+        self._cache_settings = (cache_size, disk_cache)
+        max_bytes = cache_size * 1024 * 1024
+        disk_path = cog_data_path(self) / "cache" if disk_cache else None
+        self.image_cache = PickledCache(max_bytes, disk_path / "results" if disk_path else None)
+        self.search_cache = PickledCache(max_bytes, disk_path / "sources" if disk_path else None)
+
+    def cog_unload(self):
+        self.engine.shutdown()
+        self.bot.loop.create_task(self.session.close())
+
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
         Thanks Sinbad!
@@ -163,6 +199,46 @@ class NotSoBot(commands.Cog):
         """
         return
 
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        IMAGE_INDEX.add_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        IMAGE_INDEX.remove_message(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        IMAGE_INDEX.update_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        IMAGE_INDEX.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if before.display_name != after.display_name:
+            IMAGE_INDEX.update_member(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        if before.name == after.name:
+            return
+        for guild_id in list(IMAGE_INDEX.guilds):
+            guild = self.bot.get_guild(guild_id)
+            member = guild.get_member(after.id) if guild else None
+            if member:
+                IMAGE_INDEX.update_member(member)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        IMAGE_INDEX.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # the guilds members are loaded again after an outage so the index is rebuilt
+        IMAGE_INDEX.remove_guild(guild.id)
+
     def random(self, image=False, ext: str = "png"):
         h = str(uuid.uuid4().hex)
         if image:
@@ -171,13 +247,12 @@ class NotSoBot(commands.Cog):
 
     async def get_text(self, url: str):
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    try:
-                        text = await resp.text()
-                        return text
-                    except Exception:
-                        return False
+            async with self.session.get(url) as resp:
+                try:
+                    text = await resp.text()
+                    return text
+                except Exception:
+                    return False
         except asyncio.TimeoutError:
             return False
 
@@ -209,86 +284,130 @@ class NotSoBot(commands.Cog):
             await ctx.send("The contents of this command is too large to upload!")
         file.close()
 
+    async def run_image_job(
+        self, ctx: commands.Context, func: Callable, *args, timeout: int = 60, cache: bool = True
+    ) -> Any:
+        """
+        Runs an image transform on the image engine
+
+        Results are cached by the transform and its inputs unless `cache` is False
+        which should be used for transforms with random output.
+        Returns `None` after letting the user know if the engine is too busy.
+        """
+        key = result_key(func, args) if cache else None
+        if key is not None:
+            result = self.image_cache.get_object(key)
+            if result is not None:
+                return result
+        guild_id = ctx.guild.id if ctx.guild else None
+        try:
+            result = await self.engine.run(
+                ctx.command.qualified_name, guild_id, func, *args, timeout=timeout
+            )
+        except EngineBusy:
+            await ctx.send("I'm busy processing other images right now, try again in a moment.")
+            return None
+        if key is not None:
+            self.image_cache.set_object(key, result)
+        return result
+
+    async def send_image(self, ctx: commands.Context, text: Optional[str], result: ImageResult):
+        file = discord.File(result.data, filename=result.filename)
+        await self.safe_send(ctx, text, file, result.size)
+
+    def header_too_large(self, data: bytes) -> bool:
+        header = sniff_image(data)
+        if header is None:
+            return False
+        return header.width > self.max_dimension or header.height > self.max_dimension
+
+    async def read_limited(self, resp: aiohttp.ClientResponse) -> Optional[bytes]:
+        """
+        Streams a response body, returning `None` as soon as it's too large
+
+        The download is stopped once it passes the size limit or the image
+        header shows it's larger than the dimension limit.
+        """
+        if resp.content_length is not None and resp.content_length > self.max_download:
+            log.debug("%s is too large to download", resp.url)
+            return None
+        data = bytearray()
+        checked = False
+        async for chunk in resp.content.iter_chunked(SNIFF_BYTES):
+            data.extend(chunk)
+            if len(data) > self.max_download:
+                log.debug("%s is too large to download", resp.url)
+                return None
+            if not checked and len(data) >= SNIFF_BYTES:
+                checked = True
+                if self.header_too_large(data):
+                    log.debug("%s has too large dimensions", resp.url)
+                    return None
+        if not checked and self.header_too_large(data):
+            log.debug("%s has too large dimensions", resp.url)
+            return None
+        return bytes(data)
+
     async def bytes_download(
         self, url: Union[discord.Asset, discord.Attachment, str]
     ) -> Tuple[Union[BytesIO, bool], Union[str, bool]]:
         if isinstance(url, discord.Asset) or isinstance(url, discord.Attachment):
+            # discord urls change whenever the content does so these never need checking
+            key = url.url if isinstance(url, discord.Attachment) else str(url)
+            cached = self.search_cache.get_object(key)
+            if cached is not None:
+                return BytesIO(cached[3]), cached[2]
+            if isinstance(url, discord.Attachment) and (
+                url.size > self.max_download
+                or (url.width or 0) > self.max_dimension
+                or (url.height or 0) > self.max_dimension
+            ):
+                log.debug("Attachment %s is too large", url.url)
+                return False, False
             log.debug("Pulling data from discord")
             try:
                 b = BytesIO()
                 await url.save(b)
                 mime = getattr(url, "content_type", "None")
+                self.search_cache.set_object(key, (None, None, mime, b.getvalue()))
+                b.seek(0)
                 return b, mime
             except discord.HTTPException:
                 return False, False
 
+        headers = {}
+        cached = self.search_cache.get_object(url)
+        if cached is not None:
+            etag, modified, _mime, _data = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if modified:
+                headers["If-Modified-Since"] = modified
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        mime = resp.headers.get("Content-type", "").lower()
-                        b = BytesIO(data)
-                        b.seek(0)
-                        return b, mime
-                    else:
+            async with self.session.get(url, headers=headers) as resp:
+                if resp.status == 304 and cached is not None:
+                    return BytesIO(cached[3]), cached[2]
+                if resp.status == 200:
+                    data = await self.read_limited(resp)
+                    if data is None:
                         return False, False
+                    mime = resp.headers.get("Content-type", "").lower()
+                    etag = resp.headers.get("ETag")
+                    modified = resp.headers.get("Last-Modified")
+                    if etag or modified:
+                        # only responses we can revalidate are kept
+                        self.search_cache.set_object(url, (etag, modified, mime, data))
+                    b = BytesIO(data)
+                    b.seek(0)
+                    return b, mime
+                else:
+                    return False, False
         except asyncio.TimeoutError:
             return False, False
         except Exception:
             log.error("Error downloading to bytes", exc_info=True)
             return False, False
 
-    def do_magik(self, scale, img):
-        try:
-            list_imgs = []
-            exif = {}
-            exif_msg = ""
-            count = 0
-            i = wand.image.Image(file=img)
-            i.format = "png"
-            i.alpha_channel = True
-            if i.size >= (3000, 3000):
-                return ":warning: `Image exceeds maximum resolution >= (3000, 3000).`", None, 0
-            exif.update(
-                {count: (k[5:], v) for k, v in i.metadata.items() if k.startswith("exif:")}
-            )
-            count += 1
-            i.transform(resize="800x800>")
-            i.liquid_rescale(
-                width=int(i.width * 0.5),
-                height=int(i.height * 0.5),
-                delta_x=int(0.5 * scale) if scale else 1,
-                rigidity=0,
-            )
-            i.liquid_rescale(
-                width=int(i.width * 1.5),
-                height=int(i.height * 1.5),
-                delta_x=scale if scale else 2,
-                rigidity=0,
-            )
-            magikd = BytesIO()
-            i.save(file=magikd)
-            file_size = magikd.tell()
-            magikd.seek(0)
-            list_imgs.append(magikd)
-            for x in exif:
-                if len(exif[x]) >= 2000:
-                    continue
-                exif_msg += "**Exif data for image #{0}**\n".format(str(x + 1)) + code.format(
-                    exif[x]
-                )
-            else:
-                if len(exif_msg) == 0:
-                    exif_msg = None
-            file = discord.File(list_imgs[0], filename="magik.png")
-            i.close()
-            for img in list_imgs:
-                img.close()
-            return file, exif_msg, file_size
-        except Exception:
-            log.error("Error processing magik", exc_info=True)
-
     @commands.command(aliases=["imagemagic", "imagemagick", "magic", "magick", "cas", "liquid"])
     @commands.cooldown(2, 5, commands.BucketType.user)
     async def magik(self, ctx, urls: ImageFinder = None, scale: int = 2, scale_msg: str = ""):
@@ -306,84 +425,29 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
             await msg.delete()
-            task = self.bot.loop.run_in_executor(None, self.do_magik, scale, b)
             try:
-                file, content_msg, file_size = await asyncio.wait_for(task, timeout=60)
-            except (asyncio.TimeoutError, TypeError):
+                result = await self.run_image_job(ctx, transforms.do_magik, scale, b)
+            except asyncio.TimeoutError:
+                return await ctx.send(
+                    "That image is either too large or given image format is unsupported."
+                )
+            except Exception:
+                log.error("Error processing magik", exc_info=True)
                 return await ctx.send(
                     "That image is either too large or given image format is unsupported."
                 )
-            if type(file) == str:
-                await ctx.send(file)
+            if result is None:
+                return
+            image, content_msg = result
+            if type(image) == str:
+                await ctx.send(image)
                 return
             if content_msg is None:
                 content_msg = scale_msg
             else:
                 content_msg = scale_msg + content_msg
 
-            await self.safe_send(ctx, content_msg, file, file_size)
-
-    def do_gmagik(self, image, frame_delay):
-        final = BytesIO()
-        # if is_gif:
-        is_gif = False
-        with wand.image.Image() as new_image:
-            with wand.image.Image(file=image) as img:
-                if len(getattr(img, "sequence", [])) > 1:
-                    is_gif = True
-                if is_gif:
-                    log.debug("Is gif")
-                    for change in img.sequence:
-                        change.transform(resize="512x512>")
-                        change.liquid_rescale(
-                            width=int(change.width * 0.5),
-                            height=int(change.height * 0.5),
-                            delta_x=1,
-                            rigidity=0,
-                        )
-                        change.liquid_rescale(
-                            width=int(change.width * 1.5),
-                            height=int(change.height * 1.5),
-                            delta_x=2,
-                            rigidity=0,
-                        )
-                        # change.sample(200, 200)
-                        # i.save(filename=image)
-                        new_image.sequence.append(change)
-                    # for i in range(len(img.sequence)):
-                    # with img.sequence[i] as change:
-                else:
-                    log.debug("Is not gif")
-                    for x in range(0, 30):
-                        if x == 0:
-                            log.debug("Cloning initial image")
-                            i = img.clone().convert("gif")
-                        else:
-                            i = new_image.sequence[-1].clone()
-                        i.transform(resize="512x512>")
-                        i.liquid_rescale(
-                            width=int(i.width * 0.75),
-                            height=int(i.height * 0.75),
-                            delta_x=1,
-                            rigidity=0,
-                        )
-                        i.liquid_rescale(
-                            width=int(i.width * 1.25),
-                            height=int(i.height * 1.25),
-                            delta_x=2,
-                            rigidity=0,
-                        )
-                        i.resize(img.width, img.height)
-                        new_image.sequence.append(i)
-            new_image.format = "gif"
-            new_image.dispose = "background"
-            new_image.type = "optimize"
-            new_image.save(file=final)
-            file_size = final.tell()
-            final.seek(0)
-        file = discord.File(final, filename="gmagik.gif")
-        final.close()
-        return file, file_size
+            await self.send_image(ctx, content_msg, image)
 
     @commands.command()
     @commands.cooldown(1, 20, commands.BucketType.guild)
@@ -404,8 +468,9 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
             try:
-                task = self.bot.loop.run_in_executor(None, self.do_gmagik, b, frame_delay)
-                file, file_size = await asyncio.wait_for(task, timeout=120)
+                result = await self.run_image_job(
+                    ctx, transforms.do_gmagik, b, frame_delay, timeout=120
+                )
             except asyncio.TimeoutError:
                 return await ctx.send("That image is too large.")
 
@@ -413,7 +478,9 @@ class NotSoBot(commands.Cog):
                 log.exception("Error running gmagik")
                 await ctx.send(":warning: Gmagik failed...")
                 return
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
             await x.delete()
 
     @commands.command()
@@ -458,12 +525,11 @@ class NotSoBot(commands.Cog):
             is_gif = mime in self.gif_mimes
             font_path = str(bundled_data_path(self)) + "/arial.ttf"
             try:
-                color = wand.color.Color(color)
+                wand.color.Color(color)
             except ValueError:
                 await ctx.send(":warning: **That is not a valid color!**")
                 await xx.delete()
                 return
-            font = wand.font.Font(path=font_path, size=size, color=color)
             if x > 100:
                 x = 100
             if x < 0:
@@ -473,82 +539,25 @@ class NotSoBot(commands.Cog):
             if y < 0:
                 y = 0
 
-            def make_caption_image(b, text, color, font, x, y, is_gif):
-                final = BytesIO()
-                with wand.image.Image(file=b) as img:
-
-                    i = img.clone()
-                    x = int(i.height * (x * 0.01))
-                    y = int(i.width * (y * 0.01))
-                    if not is_gif:
-                        i.caption(str(text), left=x, top=y, font=font)
-                    else:
-                        with wand.image.Image() as new_image:
-                            for frame in img.sequence:
-                                frame.caption(str(text), left=x, top=y, font=font)
-                                new_image.sequence.append(frame)
-                            new_image.save(file=final)
-                    i.save(file=final)
-                file_size = final.tell()
-                final.seek(0)
-                filename = f"caption.{'png' if not is_gif else 'gif'}"
-                file = discord.File(final, filename=filename)
-                final.close()
-                return file, file_size
-
             await xx.delete()
-            task = ctx.bot.loop.run_in_executor(
-                None, make_caption_image, b, text, color, font, x, y, is_gif
-            )
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(
+                    ctx,
+                    transforms.make_caption_image,
+                    b,
+                    text,
+                    color,
+                    font_path,
+                    size,
+                    x,
+                    y,
+                    is_gif,
+                )
             except asyncio.TimeoutError:
                 return await ctx.send("That image is too large.")
-            await ctx.send(file=file)
-
-    def trigger_image(self, path: BytesIO, t_path: BytesIO) -> Tuple[discord.File, int]:
-        final = BytesIO()
-        with wand.image.Image(width=512, height=680) as img:
-            img.format = "gif"
-            img.dispose = "background"
-            img.type = "optimize"
-            with wand.image.Image(file=path) as top_img:
-                top_img.transform(resize="640x640!")
-                with wand.image.Image(file=t_path) as trigger:
-                    with wand.image.Image(width=512, height=660) as temp_img:
-                        i = top_img.clone()
-                        t = trigger.clone()
-                        temp_img.composite(i, -60, -60)
-                        temp_img.composite(t, 0, 572)
-                        img.composite(temp_img)
-                    with wand.image.Image(width=512, height=660) as temp_img:
-                        i = top_img.clone()
-                        t = trigger.clone()
-                        temp_img.composite(i, -45, -50)
-                        temp_img.composite(t, 0, 572)
-                        img.sequence.append(temp_img)
-                    with wand.image.Image(width=512, height=660) as temp_img:
-                        i = top_img.clone()
-                        t = trigger.clone()
-                        temp_img.composite(i, -50, -45)
-                        temp_img.composite(t, 0, 572)
-                        img.sequence.append(temp_img)
-                    with wand.image.Image(width=512, height=660) as temp_img:
-                        i = top_img.clone()
-                        t = trigger.clone()
-                        temp_img.composite(i, -45, -65)
-                        temp_img.composite(t, 0, 572)
-                        img.sequence.append(temp_img)
-            # img.optimize_layers()
-            # img.optimize_transparency()
-            for frame in img.sequence:
-                frame.delay = 2
-            img.save(file=final)
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="triggered.gif")
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await ctx.send(file=discord.File(result.data, filename=result.filename))
 
     @commands.command()
     @commands.cooldown(1, 5)
@@ -565,11 +574,12 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
             try:
-                task = ctx.bot.loop.run_in_executor(None, self.trigger_image, img, trig)
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.trigger_image, img, trig)
             except asyncio.TimeoutError:
                 return await ctx.send("Error creating trigger image")
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["aes"])
     @commands.bot_has_permissions(attach_files=True)
@@ -584,28 +594,6 @@ class NotSoBot(commands.Cog):
             final += chr(ord(char) + 65248)
         await self.truncate(ctx.message.channel, final)
 
-    def do_ascii(self, text):
-        try:
-            i = Image.new("RGB", (2000, 1000))
-            img = ImageDraw.Draw(i)
-            txt = figlet_format(text, font="starwars")
-            img.text((20, 20), figlet_format(text, font="starwars"), fill=(0, 255, 0))
-            text_width, text_height = img.textsize(figlet_format(text, font="starwars"))
-            imgs = Image.new("RGB", (text_width + 30, text_height))
-            ii = ImageDraw.Draw(imgs)
-            ii.text((20, 20), figlet_format(text, font="starwars"), fill=(0, 255, 0))
-            text_width, text_height = ii.textsize(figlet_format(text, font="starwars"))
-            final = BytesIO()
-            imgs.save(final, "png")
-            file_size = final.tell()
-            final.seek(0)
-            file = discord.File(final, filename="ascii.png")
-            final.close()
-            imgs.close()
-            return file, txt, file_size
-        except Exception:
-            return False, False
-
     @commands.command(aliases=["expand"])
     @commands.cooldown(1, 5)
     @commands.bot_has_permissions(attach_files=True)
@@ -617,14 +605,16 @@ class NotSoBot(commands.Cog):
         if text == "donger" or text == "dong":
             text = "8====D"
         async with ctx.typing():
-            task = self.bot.loop.run_in_executor(None, self.do_ascii, text)
             try:
-                file, txt, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_ascii, text)
             except asyncio.TimeoutError:
                 return await ctx.send("That image is too large.")
-            if file is False:
+            except Exception:
                 await ctx.send(":no_entry: go away with your invalid characters.")
                 return
+            if result is None:
+                return
+            image, txt = result
             if len(txt) >= 1999:
                 # await self.gist(ctx, text, txt)
                 msg = None
@@ -633,48 +623,23 @@ class NotSoBot(commands.Cog):
             else:
                 msg = None
 
-            await self.safe_send(ctx, msg, file, file_size)
-
-    def generate_ascii(self, image):
-        font = ImageFont.truetype(str(cog_data_path(self)) + "/FreeMonoBold.ttf", 15)
-        image_width, image_height = image.size
-        aalib_screen_width = int(image_width / 24.9) * 10
-        aalib_screen_height = int(image_height / 41.39) * 10
-        screen = aalib.AsciiScreen(width=aalib_screen_width, height=aalib_screen_height)
-
-        im = image.convert("L").resize(screen.virtual_size)
-        screen.put_image((0, 0), im)
-        y = 0
-        how_many_rows = len(screen.render().splitlines())
-        new_img_width, font_size = font.getsize(screen.render().splitlines()[0])
-        img = Image.new("RGBA", (new_img_width, how_many_rows * 15), (255, 255, 255))
-        draw = ImageDraw.Draw(img)
-        for lines in screen.render().splitlines():
-            draw.text((0, y), lines, (0, 0, 0), font=font)
-            y += 15
-        imagefit = ImageOps.fit(img, (image_width, image_height), Image.ANTIALIAS)
-
-        final = BytesIO()
-        img.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        # file = discord.File(final, filename="iascii.png")
-        # final.close()
-        img.close()
-        return final, file_size
+            await self.send_image(ctx, msg, image)
 
     async def check_font_file(self):
+        if self.font_checked:
+            return
         try:
-            ImageFont.truetype(cog_data_path(self) / "FreeMonoBold.ttf", 15)
+            ImageFont.truetype(str(cog_data_path(self) / "FreeMonoBold.ttf"), 15)
+            self.font_checked = True
         except Exception:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    "https://github.com/opensourcedesign/fonts"
-                    "/raw/master/gnu-freefont_freemono/FreeMonoBold.ttf"
-                ) as resp:
-                    data = await resp.read()
+            async with self.session.get(
+                "https://github.com/opensourcedesign/fonts"
+                "/raw/master/gnu-freefont_freemono/FreeMonoBold.ttf"
+            ) as resp:
+                data = await resp.read()
                 with open(cog_data_path(self) / "FreeMonoBold.ttf", "wb") as save_file:
                     save_file.write(data)
+            self.font_checked = True
 
     @commands.command()
     @commands.cooldown(1, 5, commands.BucketType.user)
@@ -697,42 +662,17 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            im = Image.open(b)
-            task = self.bot.loop.run_in_executor(None, self.generate_ascii, im)
+            font_path = str(cog_data_path(self) / "FreeMonoBold.ttf")
             try:
-                temp, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_iascii, b, font_path)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "That image is either too large or image filetype is unsupported."
                 )
-            file = discord.File(temp, "iascii.png")
-            temp.close()
+            if result is None:
+                return
             await x.delete()
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_gascii(self, b):
-        img_list = []
-        temp = BytesIO()
-        try:
-            image = Image.open(b)
-            gif_list = [frame.copy() for frame in ImageSequence.Iterator(image)]
-            count = 0
-            for frame in gif_list[:20]:
-                im = frame.copy()
-                new_im, size = self.generate_ascii(im)
-                img = Image.open(new_im)
-                img_list.append(img)
-                count += 1
-            temp = BytesIO()
-            img.save(temp, format="GIF", save_all=True, append_images=img_list, duration=0, loop=0)
-            file_size = temp.tell()
-            temp.seek(0)
-            file = discord.File(temp, filename="gascii.gif")
-            temp.close()
-            image.close()
-            return file, file_size
-        except Exception:
-            raise
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.cooldown(1, 10, commands.BucketType.guild)
@@ -754,16 +694,18 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            result = self.bot.loop.run_in_executor(None, self.do_gascii, b)
+            font_path = str(cog_data_path(self) / "FreeMonoBold.ttf")
             try:
-                file, file_size = await asyncio.wait_for(result, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_gascii, b, font_path)
             except asyncio.TimeoutError:
                 return
             except Exception:
                 log.exception("Error Running gascii")
                 return await ctx.send("There was an error performing gascii.")
+            if result is None:
+                return
             await x.delete()
-            await self.safe_send(ctx, None, file, file_size)
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.bot_has_permissions(attach_files=True)
@@ -784,43 +726,14 @@ class NotSoBot(commands.Cog):
         if not b:
             return
 
-        def make_rip(image, text):
-            img = Image.open(image).convert("RGB")
-            draw = ImageDraw.Draw(img)
-            font_path = str(bundled_data_path(self)) + "/arial.ttf"
-            font1 = ImageFont.truetype(font_path, 35)
-            text = "\n".join(line for line in textwrap.wrap(text, width=15))
-            w, h = draw.multiline_textsize(text, font=font1)
-            draw.multiline_text(
-                (((400 - w) / 2) - 1, 50), text, fill=(50, 50, 50), font=font1, align="center"
-            )
-            draw.multiline_text(
-                (((400 - w) / 2) + 1, 50), text, fill=(50, 50, 50), font=font1, align="center"
-            )
-            draw.multiline_text(
-                (((400 - w) / 2), 49), text, fill=(50, 50, 50), font=font1, align="center"
-            )
-            draw.multiline_text(
-                (((400 - w) / 2), 51), text, fill=(50, 50, 50), font=font1, align="center"
-            )
-            draw.multiline_text(
-                ((400 - w) / 2, 50), text, fill=(105, 105, 105), font=font1, align="center"
-            )
-            final = BytesIO()
-            img.save(final, "JPEG")
-            file_size = final.tell()
-            final.seek(0)
-            file = discord.File(final, filename="rip.jpg")
-            final.close()
-            img.close()
-            return file, file_size
-
-        task = ctx.bot.loop.run_in_executor(None, make_rip, b, text)
+        font_path = str(bundled_data_path(self)) + "/arial.ttf"
         try:
-            file, file_size = await asyncio.wait_for(task, timeout=60)
+            result = await self.run_image_job(ctx, transforms.make_rip, b, text, font_path)
         except asyncio.TimeoutError:
             return await ctx.send("That image is too large.")
-        await self.safe_send(ctx, None, file, file_size)
+        if result is None:
+            return
+        await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.cooldown(1, 5)
@@ -855,38 +768,18 @@ class NotSoBot(commands.Cog):
                     continue
                 list_im.append(b)
 
-            def make_merge(list_im):
-                imgs = [Image.open(i).convert("RGBA") for i in list_im]
-                if vertical:
-                    # Vertical
-                    max_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[1][1]
-                    imgs_comb = np.vstack([np.asarray(i.resize(max_shape)) for i in imgs])
-                else:
-                    # Horizontal
-                    min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
-                    imgs_comb = np.hstack([np.asarray(i.resize(min_shape)) for i in imgs])
-                imgs_comb = Image.fromarray(imgs_comb)
-                final = BytesIO()
-                imgs_comb.save(final, "png")
-                file_size = final.tell()
-                final.seek(0)
-                file = discord.File(final, filename="merge.png")
-                final.close()
-                for i in imgs:
-                    i.close()
-                return file, file_size
-
             if len(list_im) < 2:
                 return await ctx.send("You need to supply more than 1 image.")
             await xx.delete()
-            task = ctx.bot.loop.run_in_executor(None, make_merge, list_im)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.make_merge, list_im, vertical)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "That image is either too large or image filetype is unsupported."
                 )
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     async def emojify(self, ctx, *, txt: str):
@@ -933,36 +826,15 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
 
-            def make_jpeg(b):
-                img = Image.open(b).convert("RGB")
-                final = BytesIO()
-                img.save(final, "JPEG", quality=quality)
-                file_size = final.tell()
-                final.seek(0)
-                file = discord.File(final, filename="needsmorejpeg.jpg")
-                final.close()
-                return file, file_size
-
-            task = ctx.bot.loop.run_in_executor(None, make_jpeg, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.make_jpeg, b, quality)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "That image is either too large or image filetype is unsupported."
                 )
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_vw(self, b, txt):
-        im = Image.open(b)
-        k = random.randint(0, 100)
-        im = macintoshplus.draw_method1(k, txt, im)
-        final = BytesIO()
-        im.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="vapewave.png")
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["vaporwave", "vape", "vapewave"])
     @commands.cooldown(2, 5)
@@ -979,13 +851,14 @@ class NotSoBot(commands.Cog):
             await ctx.send(":warning: **Command download function failed...**")
             return
         try:
-            task = self.bot.loop.run_in_executor(None, self.do_vw, b, txt)
-            file, file_size = await asyncio.wait_for(task, timeout=60)
+            result = await self.run_image_job(ctx, transforms.do_vw, b, txt, cache=False)
         except asyncio.TimeoutError:
             return await ctx.send("That image is too large.")
         except Exception:
             return await ctx.send("That image cannot be vaporwaved.")
-        await self.safe_send(ctx, None, file, file_size)
+        if result is None:
+            return
+        await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["achievement"])
     @commands.bot_has_permissions(attach_files=True)
@@ -999,28 +872,16 @@ class NotSoBot(commands.Cog):
         if len(txt) > 20:
             txt = txt[:20] + " ..."
 
-        def make_mc(b, txt):
-            image = Image.open(b).convert("RGBA")
-            draw = ImageDraw.Draw(image)
-            font_path = str(bundled_data_path(self)) + "/Minecraftia.ttf"
-            font = ImageFont.truetype(font_path, 17)
-            draw.text((60, 30), txt, (255, 255, 255), font=font)
-            final = BytesIO()
-            image.save(final, "png")
-            file_size = final.tell()
-            final.seek(0)
-            file = discord.File(final, filename="achievement.png")
-            final.close()
-            return file, file_size
-
+        font_path = str(bundled_data_path(self)) + "/Minecraftia.ttf"
         try:
-            task = self.bot.loop.run_in_executor(None, make_mc, b, txt)
-            file, file_size = await asyncio.wait_for(task, timeout=60)
+            result = await self.run_image_job(ctx, transforms.make_mc, b, txt, font_path)
         except asyncio.TimeoutError:
             return await ctx.send("That image is too large.")
         except Exception:
             return await ctx.send("I cannot make that minecraft achievement.")
-        await self.safe_send(ctx, None, file, file_size)
+        if result is None:
+            return
+        await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["wm"])
     @commands.bot_has_permissions(attach_files=True)
@@ -1082,120 +943,15 @@ class NotSoBot(commands.Cog):
                 if wm_gif:
                     wmm.name = "watermark.gif"
 
-            def add_watermark(b, wmm, x, y, transparency, wm_gif=False):
-                final = BytesIO()
-                with wand.image.Image(file=b) as img:
-                    is_gif = len(getattr(img, "sequence")) > 1
-                    if not is_gif and not wm_gif:
-                        log.debug("There are no gifs")
-                        with img.clone() as new_img:
-                            new_img.transform(resize="65536@")
-                            final_x = int(new_img.height * (x * 0.01))
-                            final_y = int(new_img.width * (y * 0.01))
-                            with wand.image.Image(file=wmm) as wm:
-                                new_img.watermark(
-                                    image=wm, left=final_x, top=final_y, transparency=transparency
-                                )
-                            new_img.save(file=final)
-
-                    elif is_gif and not wm_gif:
-                        log.debug("The base image is a gif")
-                        wm = wand.image.Image(file=wmm)
-                        with wand.image.Image() as new_image:
-                            with img.clone() as new_img:
-                                for frame in new_img.sequence:
-                                    frame.transform(resize="65536@")
-                                    final_x = int(frame.height * (x * 0.01))
-                                    final_y = int(frame.width * (y * 0.01))
-                                    frame.watermark(
-                                        image=wm,
-                                        left=final_x,
-                                        top=final_y,
-                                        transparency=transparency,
-                                    )
-                                    new_image.sequence.append(frame)
-                            new_image.save(file=final)
-
-                    else:
-                        log.debug("The mark is a gif")
-                        with wand.image.Image() as new_image:
-                            with wand.image.Image(file=wmm) as new_img:
-                                for frame in new_img.sequence:
-                                    with img.clone() as clone:
-                                        if is_gif:
-                                            clone = clone.sequence[0]
-                                            # we only care about the first frame of the gif in this case
-                                        else:
-                                            clone = clone.convert("gif")
-
-                                        clone.transform(resize="65536@")
-                                        final_x = int(clone.height * (x * 0.01))
-                                        final_y = int(clone.width * (y * 0.01))
-                                        clone.watermark(
-                                            image=frame,
-                                            left=final_x,
-                                            top=final_y,
-                                            transparency=transparency,
-                                        )
-                                        new_image.sequence.append(clone)
-                                        new_image.dispose = "background"
-                                        with new_image.sequence[-1] as new_frame:
-                                            new_frame.delay = frame.delay
-
-                            new_image.save(file=final)
-
-                size = final.tell()
-                final.seek(0)
-                filename = f"watermark.{'gif' if is_gif or wm_gif else 'png'}"
-
-                file = discord.File(final, filename=filename)
-                final.close()
-                return file, size
-
             try:
-                task = ctx.bot.loop.run_in_executor(
-                    None, add_watermark, b, wmm, x, y, transparency, wm_gif
+                result = await self.run_image_job(
+                    ctx, transforms.add_watermark, b, wmm, x, y, transparency, wm_gif, timeout=120
                 )
-                file, file_size = await asyncio.wait_for(task, timeout=120)
             except asyncio.TimeoutError:
                 return await ctx.send("That image is too large.")
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_glitch(self, b, amount, seed, iterations):
-        img = Image.open(b)
-        is_gif = img.is_animated
-        if not is_gif:
-            img = img.convert("RGB")
-            b = BytesIO()
-            img.save(b, format="JPEG")
-            b.seek(0)
-            img = jpglitch.Jpeg(bytearray(b.getvalue()), amount, seed, iterations)
-            final = BytesIO()
-            final.name = "glitch.jpg"
-            img.save_image(final)
-            file_size = final.tell()
-            final.seek(0)
-            file = discord.File(final, filename="glitch.jpeg")
-            final.close()
-            # img.close()
-        else:
-            # img.close()
-            b = bytearray(b.getvalue())
-            for x in range(0, sys.getsizeof(b)):
-                if b[x] == 33:
-                    if b[x + 1] == 255:
-                        end = x
-                        break
-                    elif b[x + 1] == 249:
-                        end = x
-                        break
-            for x in range(13, end):
-                b[x] = random.randint(0, 255)
-            final = BytesIO(b)
-            file_size = final.tell()
-            file = discord.File(final, filename="glitch.jpeg")
-            final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["jpglitch"])
     @commands.cooldown(2, 5)
@@ -1219,6 +975,7 @@ class NotSoBot(commands.Cog):
                 amount = random.randint(1, 20)
             elif amount > 99:
                 amount = 99
+            seeded = seed is not None
             if seed is None:
                 seed = random.randint(1, 20)
             b, mime = await self.bytes_download(url)
@@ -1226,16 +983,26 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            task = self.bot.loop.run_in_executor(None, self.do_glitch, b, amount, seed, iterations)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                # glitched gifs and unseeded images are random every time
+                result = await self.run_image_job(
+                    ctx,
+                    transforms.do_glitch,
+                    b,
+                    amount,
+                    seed,
+                    iterations,
+                    cache=seeded and not gif,
+                )
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "The image is either too large or image filetype is unsupported."
                 )
+            if result is None:
+                return
 
             msg = f"Iterations: `{iterations}` | Amount: `{amount}` | Seed: `{seed}`"
-            await self.safe_send(ctx, msg, file, file_size)
+            await self.send_image(ctx, msg, result)
 
     @commands.command(aliases=["pixel"])
     @commands.bot_has_permissions(attach_files=True)
@@ -1252,92 +1019,77 @@ class NotSoBot(commands.Cog):
                     await ctx.send(":warning: **Command download function failed...**")
                     return
             if mime in self.gif_mimes:
-                task = ctx.bot.loop.run_in_executor(None, self.make_pixel_gif, b, pixels)
+                func = transforms.make_pixel_gif
             else:
-                task = ctx.bot.loop.run_in_executor(None, self.make_pixel, b, pixels)
+                func = transforms.make_pixel
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, func, b, pixels)
             except asyncio.TimeoutError:
                 return await ctx.send("The image is too large.")
-            await self.safe_send(ctx, None, file, file_size)
-
-    def make_pixel(self, b: BytesIO, pixels: int) -> Tuple[discord.File, int]:
-        bg = (0, 0, 0)
-        img = Image.open(b)
-        img = img.resize((int(img.size[0] / pixels), int(img.size[1] / pixels)), Image.NEAREST)
-        img = img.resize((int(img.size[0] * pixels), int(img.size[1] * pixels)), Image.NEAREST)
-        load = img.load()
-        for i in range(0, img.size[0], pixels):
-            for j in range(0, img.size[1], pixels):
-                for r in range(pixels):
-                    load[i + r, j] = bg
-                    load[i, j + r] = bg
-        final = BytesIO()
-        img.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="pixelated.png")
-        final.close()
-        img.close()
-        return file, file_size
-
-    def make_pixel_gif(self, b, pixels, scale_msg):
-        try:
-            image = Image.open(b)
-            gif_list = [frame.copy() for frame in ImageSequence.Iterator(image)]
-        except IOError:
-            return ":warning: Cannot load gif."
-        bg = (0, 0, 0)
-        img_list = []
-        for frame in gif_list:
-            img = Image.new("RGBA", frame.size)
-            img.paste(frame, (0, 0))
-            img = img.resize((int(img.size[0] / pixels), int(img.size[1] / pixels)), Image.NEAREST)
-            img = img.resize((int(img.size[0] * pixels), int(img.size[1] * pixels)), Image.NEAREST)
-            load = img.load()
-            for i in range(0, img.size[0], pixels):
-                for j in range(0, img.size[1], pixels):
-                    for r in range(pixels):
-                        load[i + r, j] = bg
-                        load[i, j + r] = bg
-            img_list.append(img)
-        final = BytesIO()
-        img.save(final, format="GIF", save_all=True, append_images=img_list, duration=0, loop=0)
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="pixelated.gif")
-        final.close()
-        img.close()
-        return file, file_size
-
-    def do_waaw(self, b):
-        f = BytesIO()
-        f2 = BytesIO()
-        with wand.image.Image(file=b) as img:
-            h1 = img.clone()
-            width = int(img.width / 2) if int(img.width / 2) > 0 else 1
-            h1.crop(width=width, height=int(img.height), gravity="east")
-            h2 = h1.clone()
-            h1.rotate(degree=180)
-            h1.flip()
-            h1.save(file=f)
-            h2.save(file=f2)
-        f.seek(0)
-        f2.seek(0)
-        list_im = [f2, f]
-        imgs = [ImageOps.mirror(Image.open(i).convert("RGBA")) for i in list_im]
-        min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
-        imgs_comb = np.hstack([np.asarray(i.resize(min_shape)) for i in imgs])
-        imgs_comb = Image.fromarray(imgs_comb)
-        final = BytesIO()
-        imgs_comb.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="waaw.png")
-        f.close()
-        f2.close()
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
+
+    @commands.command()
+    @commands.cooldown(2, 5, commands.BucketType.user)
+    @commands.bot_has_permissions(attach_files=True)
+    async def pixelsort(
+        self,
+        ctx,
+        urls: ImageFinder = None,
+        interval: str = "threshold",
+        sort: str = "lightness",
+        angle: int = 0,
+        randomness: int = 0,
+    ):
+        """
+        Sort the pixels of an image
+
+        `[urls]` are the image urls or users or previous images in chat to sort.
+        `[interval=threshold]` is how rows are split up for sorting, one of `threshold`, `edge`, `random`, `waves` or `none`.
+        `[sort=lightness]` is what the pixels are sorted by, one of `lightness`, `intensity`, `maximum` or `minimum`.
+        `[angle=0]` is the angle in degrees the pixels are sorted at.
+        `[randomness=0]` is the percentage chance each interval is left unsorted.
+        """
+        if interval not in INTERVAL_FUNCTIONS:
+            return await ctx.send(
+                "The interval must be one of " + humanize_list(list(INTERVAL_FUNCTIONS)) + "."
+            )
+        if sort not in SORTING_FUNCTIONS:
+            return await ctx.send(
+                "The sort must be one of " + humanize_list(list(SORTING_FUNCTIONS)) + "."
+            )
+        randomness = min(max(randomness, 0), 100)
+        if urls is None:
+            urls = await ImageFinder().search_for_images(ctx)
+        url = urls[0]
+        async with ctx.typing():
+            b, mime = await self.bytes_download(url)
+            if b is False:
+                await ctx.send(":warning: **Command download function failed...**")
+                return
+            # random intervals give a different result every time
+            cache = interval not in ("random", "waves") and not randomness
+            try:
+                result = await self.run_image_job(
+                    ctx,
+                    transforms.do_pixelsort,
+                    b,
+                    interval,
+                    sort,
+                    angle,
+                    randomness,
+                    0.25,
+                    0.8,
+                    cache=cache,
+                )
+            except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
+                return await ctx.send(
+                    "That image is either too large or image filetype is unsupported."
+                )
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     # Thanks to Iguniisu#9746 for the idea
     @commands.command(aliases=["magik3", "mirror"])
@@ -1353,42 +1105,15 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            task = self.bot.loop.run_in_executor(None, self.do_waaw, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_waaw, b)
             except (asyncio.TimeoutError, wand.exceptions.MissingDelegateError):
                 return await ctx.send(
                     "The image is either too large or you're missing delegates for this image format."
                 )
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_haah(self, b):
-        f = BytesIO()
-        f2 = BytesIO()
-        with wand.image.Image(file=b) as img:
-            h1 = img.clone()
-            h1.transform("50%x100%")
-            h2 = h1.clone()
-            h2.rotate(degree=180)
-            h2.flip()
-            h1.save(file=f)
-            h2.save(file=f2)
-        f.seek(0)
-        f2.seek(0)
-        list_im = [f2, f]
-        imgs = [ImageOps.mirror(Image.open(i).convert("RGBA")) for i in list_im]
-        min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
-        imgs_comb = np.hstack([np.asarray(i.resize(min_shape)) for i in imgs])
-        imgs_comb = Image.fromarray(imgs_comb)
-        final = BytesIO()
-        imgs_comb.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="haah.png")
-        f.close()
-        f2.close()
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["magik4", "mirror2"])
     @commands.cooldown(2, 5, commands.BucketType.user)
@@ -1403,43 +1128,15 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            task = self.bot.loop.run_in_executor(None, self.do_haah, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_haah, b)
             except (asyncio.TimeoutError, wand.exceptions.MissingDelegateError):
                 return await ctx.send(
                     "The image is either too large or you're missing delegates for this image format."
                 )
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_woow(self, b):
-        f = BytesIO()
-        f2 = BytesIO()
-        with wand.image.Image(file=b) as img:
-            h1 = img.clone()
-            width = int(img.width) if int(img.width) > 0 else 1
-            h1.crop(width=width, height=int(img.height / 2), gravity="north")
-            h2 = h1.clone()
-            h2.rotate(degree=180)
-            h2.flop()
-            h1.save(file=f)
-            h2.save(file=f2)
-        f.seek(0)
-        f2.seek(0)
-        list_im = [f, f2]
-        imgs = [Image.open(i).convert("RGBA") for i in list_im]
-        min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
-        imgs_comb = np.vstack([np.asarray(i.resize(min_shape)) for i in imgs])
-        imgs_comb = Image.fromarray(imgs_comb)
-        final = BytesIO()
-        imgs_comb.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="woow.png")
-        f.close()
-        f2.close()
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["magik5", "mirror3"])
     @commands.cooldown(2, 5, commands.BucketType.user)
@@ -1454,43 +1151,15 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            task = self.bot.loop.run_in_executor(None, self.do_woow, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_woow, b)
             except (asyncio.TimeoutError, wand.exceptions.MissingDelegateError):
                 return await ctx.send(
                     "The image is either too large or you're missing delegates for this image format."
                 )
-            await self.safe_send(ctx, None, file, file_size)
-
-    def do_hooh(self, b):
-        f = BytesIO()
-        f2 = BytesIO()
-        with wand.image.Image(file=b) as img:
-            h1 = img.clone()
-            width = int(img.width) if int(img.width) > 0 else 1
-            h1.crop(width=width, height=int(img.height / 2), gravity="south")
-            h2 = h1.clone()
-            h1.rotate(degree=180)
-            h2.flop()
-            h1.save(file=f)
-            h2.save(file=f2)
-        f.seek(0)
-        f2.seek(0)
-        list_im = [f, f2]
-        imgs = [Image.open(i).convert("RGBA") for i in list_im]
-        min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
-        imgs_comb = np.vstack([np.asarray(i.resize(min_shape)) for i in imgs])
-        imgs_comb = Image.fromarray(imgs_comb)
-        final = BytesIO()
-        imgs_comb.save(final, "png")
-        file_size = final.tell()
-        final.seek(0)
-        file = discord.File(final, filename="hooh.png")
-        f.close()
-        f2.close()
-        final.close()
-        return file, file_size
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["magik6", "mirror4"])
     @commands.cooldown(2, 5, commands.BucketType.user)
@@ -1505,14 +1174,15 @@ class NotSoBot(commands.Cog):
             if b is False:
                 await ctx.send(":warning: **Command download function failed...**")
                 return
-            task = self.bot.loop.run_in_executor(None, self.do_hooh, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.do_hooh, b)
             except (asyncio.TimeoutError, wand.exceptions.MissingDelegateError):
                 return await ctx.send(
                     "The image is either too large or you're missing delegates for this image format."
                 )
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.bot_has_permissions(attach_files=True)
@@ -1527,24 +1197,15 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
 
-            def flip_img(b):
-                with Image.open(b) as img:
-                    img = ImageOps.flip(img)
-                with BytesIO() as final:
-                    img.save(final, "png")
-                    file_size = final.tell()
-                    final.seek(0)
-                    file = discord.File(final, filename="flip.png")
-                return file, file_size
-
-            task = ctx.bot.loop.run_in_executor(None, flip_img, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.flip_img, b)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "The image is either too large or image filetype is unsupported."
                 )
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.bot_has_permissions(attach_files=True)
@@ -1561,22 +1222,13 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
 
-            def flop_img(b):
-                with Image.open(b) as img:
-                    img = ImageOps.mirror(img)
-                with BytesIO() as final:
-                    img.save(final, "png")
-                    file_size = final.tell()
-                    final.seek(0)
-                    file = discord.File(final, filename="flop.png")
-                return file, file_size
-
-            task = ctx.bot.loop.run_in_executor(None, flop_img, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.flop_img, b)
             except asyncio.TimeoutError:
                 return await ctx.send("That image is too large.")
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command(aliases=["inverse", "negate"])
     @commands.bot_has_permissions(attach_files=True)
@@ -1591,24 +1243,15 @@ class NotSoBot(commands.Cog):
                 await ctx.send(":warning: **Command download function failed...**")
                 return
 
-            def invert_img(b):
-                with Image.open(b).convert("RGB") as img:
-                    img = ImageOps.invert(img)
-                with BytesIO() as final:
-                    img.save(final, "png")
-                    file_size = final.tell()
-                    final.seek(0)
-                    file = discord.File(final, filename="flop.png")
-                return file, file_size
-
-            task = ctx.bot.loop.run_in_executor(None, invert_img, b)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.invert_img, b)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "That image is either too large or image filetype is unsupported."
                 )
-            await self.safe_send(ctx, None, file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, None, result)
 
     @commands.command()
     @commands.bot_has_permissions(attach_files=True)
@@ -1622,21 +1265,141 @@ class NotSoBot(commands.Cog):
             if not b:
                 return await ctx.send("That's not a valid image to rotate.")
 
-            def rotate_img(b, degrees):
-                with Image.open(b).convert("RGBA") as img:
-                    img = img.rotate(int(degrees))
-                with BytesIO() as final:
-                    img.save(final, "png")
-                    file_size = final.tell()
-                    final.seek(0)
-                    file = discord.File(final, filename="rotate.png")
-                return file, file_size
-
-            task = ctx.bot.loop.run_in_executor(None, rotate_img, b, degrees)
             try:
-                file, file_size = await asyncio.wait_for(task, timeout=60)
+                result = await self.run_image_job(ctx, transforms.rotate_img, b, degrees)
             except (asyncio.TimeoutError, PIL.UnidentifiedImageError):
                 return await ctx.send(
                     "That image is either too large or image filetype is unsupported."
                 )
-            await self.safe_send(ctx, f"Rotated: `{degrees}°`", file, file_size)
+            if result is None:
+                return
+            await self.send_image(ctx, f"Rotated: `{degrees}°`", result)
+
+    @commands.group()
+    @checks.is_owner()
+    async def notsobotset(self, ctx: commands.Context):
+        """Settings for the NotSoBot image engine"""
+        pass
+
+    @notsobotset.command(name="workers")
+    async def notsobotset_workers(self, ctx: commands.Context, workers: int):
+        """
+        Set how many processes are used to render images
+
+        This is also the most images that will be rendered at once.
+        """
+        if workers < 1:
+            return await ctx.send("There must be at least 1 worker.")
+        await self.config.workers.set(workers)
+        await self.initialize()
+        await ctx.send(f"Images will now be rendered by {workers} worker processes.")
+
+    @notsobotset.command(name="queue")
+    async def notsobotset_queue(self, ctx: commands.Context, max_queue: int):
+        """
+        Set how many images can be queued or rendering before new ones are refused
+        """
+        if max_queue < 1:
+            return await ctx.send("The queue must hold at least 1 image.")
+        await self.config.max_queue.set(max_queue)
+        await self.initialize()
+        await ctx.send(f"Up to {max_queue} images can now be queued.")
+
+    @notsobotset.command(name="guildlimit")
+    async def notsobotset_guildlimit(self, ctx: commands.Context, limit: int):
+        """
+        Set how many images a single server can have rendering at once
+        """
+        if limit < 1:
+            return await ctx.send("Servers must be able to render at least 1 image.")
+        await self.config.guild_concurrency.set(limit)
+        await self.initialize()
+        await ctx.send(f"Servers can now render {limit} images at once.")
+
+    @notsobotset.command(name="cachesize")
+    async def notsobotset_cachesize(self, ctx: commands.Context, megabytes: int):
+        """
+        Set how many megabytes of downloaded and rendered images are kept in memory
+
+        Downloads and results each get this much space, `0` disables caching.
+        """
+        if megabytes < 0:
+            return await ctx.send("The cache size can't be negative.")
+        await self.config.cache_size.set(megabytes)
+        await self.initialize()
+        await ctx.send(f"Up to {megabytes}MB of images will now be cached.")
+
+    @notsobotset.command(name="diskcache")
+    async def notsobotset_diskcache(self, ctx: commands.Context, true_or_false: bool):
+        """
+        Toggle also caching downloaded and rendered images on disk
+
+        This keeps images that fall out of memory and persists them between restarts.
+        """
+        await self.config.disk_cache.set(true_or_false)
+        await self.initialize()
+        if true_or_false:
+            await ctx.send("Images will now also be cached on disk.")
+        else:
+            await ctx.send("Images will no longer be cached on disk.")
+
+    @notsobotset.command(name="clearcache")
+    async def notsobotset_clearcache(self, ctx: commands.Context):
+        """
+        Clear all cached downloads and rendered images
+        """
+        self.image_cache.clear()
+        self.search_cache.clear()
+        await ctx.send("The image cache has been cleared.")
+
+    @notsobotset.command(name="maxdownload")
+    async def notsobotset_maxdownload(self, ctx: commands.Context, megabytes: int):
+        """
+        Set the largest file in megabytes that will be downloaded for image commands
+        """
+        if megabytes < 1:
+            return await ctx.send("The download limit must be at least 1MB.")
+        await self.config.max_download.set(megabytes)
+        await self.initialize()
+        await ctx.send(f"Images up to {megabytes}MB will now be downloaded.")
+
+    @notsobotset.command(name="maxdimension")
+    async def notsobotset_maxdimension(self, ctx: commands.Context, pixels: int):
+        """
+        Set the largest width or height in pixels of images that will be downloaded
+        """
+        if pixels < 1:
+            return await ctx.send("The dimension limit must be at least 1 pixel.")
+        await self.config.max_dimension.set(pixels)
+        await self.initialize()
+        await ctx.send(f"Images up to {pixels}x{pixels} will now be downloaded.")
+
+    @notsobotset.command(name="stats")
+    async def notsobotset_stats(self, ctx: commands.Context):
+        """
+        Show queue wait and render times per command
+        """
+        engine = self.engine
+        msg = (
+            f"Workers: {engine.workers} | Queue: {engine.pending}/{engine.max_queue} | "
+            f"Per server: {engine.guild_concurrency}\n"
+        )
+        for name, cache in (("Results", self.image_cache), ("Downloads", self.search_cache)):
+            msg += (
+                f"{name} cache: {len(cache)} items {cache.size / 1024 / 1024:.1f}MB | "
+                f"hits {cache.hits} | misses {cache.misses}\n"
+            )
+        if not engine.stats:
+            return await ctx.send(msg + "No images have been rendered yet.")
+        lines = []
+        for name, stats in sorted(engine.stats.items()):
+            jobs = stats["jobs"] or 1
+            lines.append(
+                f"{name}: jobs {stats['jobs']} | "
+                f"wait avg {stats['wait'] / jobs:.2f}s max {stats['max_wait']:.2f}s | "
+                f"render avg {stats['render'] / jobs:.2f}s max {stats['max_render']:.2f}s | "
+                f"timeouts {stats['timeouts']} | busy {stats['busy']}"
+            )
+        await ctx.send(msg)
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
@@ -0,0 +1,28 @@
+import numpy as np
+from PIL import Image
+
+from . import util
+from .interval import INTERVAL_FUNCTIONS
+from .sorter import sort_image
+from .sorting import SORTING_FUNCTIONS
+
+
+def pixelsort(
+    image: Image.Image,
+    interval_function: str = "threshold",
+    sorting_function: str = "lightness",
+    angle: int = 0,
+    randomness: int = 0,
+    lower: float = 0.25,
+    upper: float = 0.8,
+) -> Image.Image:
+    """
+    Sorts the pixels of an image along rows at `angle` degrees
+    """
+    original = image.convert("RGBA")
+    rotated = original.rotate(angle, expand=True)
+    pixels = np.asarray(rotated)
+    intervals = INTERVAL_FUNCTIONS[interval_function](pixels, rotated, lower, upper)
+    sorted_pixels = sort_image(pixels, intervals, randomness, SORTING_FUNCTIONS[sorting_function])
+    output = Image.fromarray(sorted_pixels, "RGBA").rotate(-angle, expand=True)
+    return util.crop_to(output, original)
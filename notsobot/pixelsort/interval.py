@@ -1,171 +1,58 @@
-import random as rand
-
+import numpy as np
 from PIL import Image, ImageFilter
 
-from . import constants, util
-
-
-def edge(pixels, image, angle):
-    img = Image.open(image)
-    img = img.rotate(angle, expand=True)
-    edges = img.filter(ImageFilter.FIND_EDGES)
-    edges = edges.convert("RGBA")
-    edge_data = edges.load()
-
-    filter_pixels = []
-    edge_pixels = []
-    intervals = []
-
-    for y in range(img.size[1]):
-        filter_pixels.append([])
-        for x in range(img.size[0]):
-            filter_pixels[y].append(edge_data[x, y])
-
-    for y in range(len(pixels)):
-        edge_pixels.append([])
-        for x in range(len(pixels[0])):
-            if util.lightness(filter_pixels[y][x]) < 0.25:
-                edge_pixels[y].append(constants.white_pixel)
-            else:
-                edge_pixels[y].append(constants.black_pixel)
-
-    for y in range(len(pixels) - 1, 1, -1):
-        for x in range(len(pixels[0]) - 1, 1, -1):
-            if (
-                edge_pixels[y][x] == constants.black_pixel
-                and edge_pixels[y][x - 1] == constants.black_pixel
-            ):
-                edge_pixels[y][x] = constants.white_pixel
-
-    for y in range(len(pixels)):
-        intervals.append([])
-        for x in range(len(pixels[0])):
-            if edge_pixels[y][x] == constants.black_pixel:
-                intervals[y].append(x)
-        intervals[y].append(len(pixels[0]))
-    return intervals
+from . import util
 
+# Every interval function returns a (height, width) boolean array
+# marking the pixels where a new interval to be sorted starts
 
-def threshold(pixels, image, angle):
-    intervals = []
 
-    for y in range(len(pixels)):
-        intervals.append([])
-        for x in range(len(pixels[0])):
-            if util.lightness(pixels[y][x]) < 0.25 or util.lightness(pixels[y][x]) > 0.8:
-                intervals[y].append(x)
-        intervals[y].append(len(pixels[0]))
+def _edge_intervals(edges: Image.Image) -> np.ndarray:
+    edge_data = np.asarray(edges.convert("RGBA"))
+    intervals = util.lightness(edge_data) >= 0.25
+    # only the first pixel of a run of edge pixels starts an interval
+    intervals[2:, 2:] &= ~intervals[2:, 1:-1].copy()
     return intervals
 
 
-def random(pixels, image, angle):
-    intervals = []
-
-    for y in range(len(pixels)):
-        intervals.append([])
-        x = 0
-        while True:
-            width = util.random_width(50)
-            x += width
-            if x > len(pixels[0]):
-                intervals[y].append(len(pixels[0]))
-                break
-            else:
-                intervals[y].append(x)
-    return intervals
+def edge(pixels: np.ndarray, image: Image.Image, lower: float, upper: float) -> np.ndarray:
+    return _edge_intervals(image.filter(ImageFilter.FIND_EDGES))
+
+
+def threshold(pixels: np.ndarray, image: Image.Image, lower: float, upper: float) -> np.ndarray:
+    lightness = util.lightness(pixels)
+    return (lightness < lower) | (lightness > upper)
 
 
-def waves(pixels, image, angle):
-    intervals = []
-
-    for y in range(len(pixels)):
-        intervals.append([])
-        x = 0
-        while True:
-            width = 50 + rand.randint(0, 10)
-            x += width
-            if x > len(pixels[0]):
-                intervals[y].append(len(pixels[0]))
-                break
-            else:
-                intervals[y].append(x)
+def _width_intervals(pixels: np.ndarray, widths: np.ndarray) -> np.ndarray:
+    height, width = pixels.shape[:2]
+    intervals = np.zeros((height, width), dtype=bool)
+    starts = np.cumsum(widths, axis=1)
+    rows = np.broadcast_to(np.arange(height)[:, None], starts.shape)
+    inside = starts < width
+    intervals[rows[inside], starts[inside]] = True
     return intervals
 
 
-def file_mask(pixels, image, angle):
-    intervals = []
-    file_pixels = []
-
-    img = Image.open(image)
-    img = img.convert("RGBA")
-    data = img.load()
-    for y in range(img.size[1]):
-        file_pixels.append([])
-        for x in range(img.size[0]):
-            file_pixels[y].append(data[x, y])
-
-    for y in range(len(pixels) - 1, 1, -1):
-        for x in range(len(pixels[0]) - 1, 1, -1):
-            if (
-                file_pixels[y][x] == constants.black_pixel
-                and file_pixels[y][x - 1] == constants.black_pixel
-            ):
-                file_pixels[y][x] = constants.white_pixel
-
-    for y in range(len(pixels)):
-        intervals.append([])
-        for x in range(len(pixels[0])):
-            if file_pixels[y][x] == constants.black_pixel:
-                intervals[y].append(x)
-        intervals[y].append(len(pixels[0]))
+def random(pixels: np.ndarray, image: Image.Image, lower: float, upper: float) -> np.ndarray:
+    height, width = pixels.shape[:2]
+    return _width_intervals(pixels, util.random_widths(50, (height, width)))
 
-    return intervals
 
+def waves(pixels: np.ndarray, image: Image.Image, lower: float, upper: float) -> np.ndarray:
+    height, width = pixels.shape[:2]
+    widths = 50 + np.random.randint(0, 11, size=(height, width // 50 + 1))
+    return _width_intervals(pixels, widths)
 
-def file_edges(pixels, image, angle):
-    img = Image.open(image)
-    img = img.rotate(angle, expand=True)
-    img = img.resize((len(pixels[0]), len(pixels)), Image.ANTIALIAS)
-    edges = img.filter(ImageFilter.FIND_EDGES)
-    edges = edges.convert("RGBA")
-    edge_data = edges.load()
-
-    filter_pixels = []
-    edge_pixels = []
-    intervals = []
-
-    for y in range(img.size[1]):
-        filter_pixels.append([])
-        for x in range(img.size[0]):
-            filter_pixels[y].append(edge_data[x, y])
-
-    for y in range(len(pixels)):
-        edge_pixels.append([])
-        for x in range(len(pixels[0])):
-            if util.lightness(filter_pixels[y][x]) < 0.25:
-                edge_pixels[y].append(constants.white_pixel)
-            else:
-                edge_pixels[y].append(constants.black_pixel)
-
-    for y in range(len(pixels) - 1, 1, -1):
-        for x in range(len(pixels[0]) - 1, 1, -1):
-            if (
-                edge_pixels[y][x] == constants.black_pixel
-                and edge_pixels[y][x - 1] == constants.black_pixel
-            ):
-                edge_pixels[y][x] = constants.white_pixel
-
-    for y in range(len(pixels)):
-        intervals.append([])
-        for x in range(len(pixels[0])):
-            if edge_pixels[y][x] == constants.black_pixel:
-                intervals[y].append(x)
-        intervals[y].append(len(pixels[0]))
-    return intervals
 
+def none(pixels: np.ndarray, image: Image.Image, lower: float, upper: float) -> np.ndarray:
+    return np.zeros(pixels.shape[:2], dtype=bool)
 
-def none(pixels, image, angle):
-    intervals = []
-    for y in range(len(pixels)):
-        intervals.append([len(pixels[y])])
-    return intervals
+
+INTERVAL_FUNCTIONS = {
+    "edge": edge,
+    "threshold": threshold,
+    "random": random,
+    "waves": waves,
+    "none": none,
+}
@@ -1,24 +1,29 @@
-import random
+from typing import Callable
 
+import numpy as np
 
-def sort_image(pixels, intervals, randomness, s_func):
-    sorted_pixels = []
-    for y in range(len(pixels)):
-        row = []
-        x_min = 0
-        for x_max in intervals[y]:
-            interval = []
-            for x in range(x_min, x_max):
-                interval.append(pixels[y][x])
-            if random.randint(0, 100) >= randomness:
-                row += sort_interval(interval, s_func)
-            else:
-                row += interval
-            x_min = x_max
-        row.append(pixels[y][0])
-        sorted_pixels.append(row)
-    return sorted_pixels
 
+def sort_image(
+    pixels: np.ndarray, intervals: np.ndarray, randomness: int, s_func: Callable
+) -> np.ndarray:
+    """
+    Sorts the pixels of every interval in every row
 
-def sort_interval(interval, sorting_function):
-    return [] if interval == [] else sorted(interval, key=sorting_function)
+    `intervals` is a (height, width) boolean array marking where a new interval
+    starts. Each interval is left unsorted with a `randomness` percent chance.
+    """
+    height, width = intervals.shape
+    segments = np.cumsum(intervals, axis=1)
+    values = s_func(pixels).astype(np.float64)
+    if randomness:
+        skip = np.random.randint(0, 101, size=(height, int(segments.max()) + 1)) < randomness
+        # an unsorted interval is "sorted" by position which keeps it in order
+        positions = np.broadcast_to(np.arange(width, dtype=np.float64), (height, width))
+        values = np.where(np.take_along_axis(skip, segments, axis=1), positions, values)
+    # every interval gets its own range of keys so one sort orders the pixels
+    # within each interval without moving any of them to another interval
+    groups = segments + np.arange(height)[:, None] * (int(segments.max()) + 1)
+    span = float(values.max()) + 1 if values.size else 1.0
+    order = np.argsort((groups * span + values).ravel(), kind="stable")
+    flat = pixels.reshape(height * width, -1)
+    return flat[order].reshape(pixels.shape)
@@ -1,17 +1,30 @@
+import numpy as np
+
 from . import util
 
+# Every sorting function takes an (height, width, channels) array of pixels
+# and returns the (height, width) array of values they're sorted by
+
+
+def lightness(pixels: np.ndarray) -> np.ndarray:
+    return util.lightness(pixels)
+
 
-def lightness(pixel):
-    return util.lightness(pixel)
+def intensity(pixels: np.ndarray) -> np.ndarray:
+    return pixels[..., :3].sum(axis=-1, dtype=np.int32)
 
 
-def intensity(pixel):
-    return pixel[0] + pixel[1] + pixel[2]
+def maximum(pixels: np.ndarray) -> np.ndarray:
+    return pixels[..., :3].max(axis=-1)
 
 
-def maximum(pixel):
-    return max(pixel[0], pixel[1], pixel[2])
+def minimum(pixels: np.ndarray) -> np.ndarray:
+    return pixels[..., :3].min(axis=-1)
 
 
-def minimum(pixel):
-    return min(pixel[0], pixel[1], pixel[2])
+SORTING_FUNCTIONS = {
+    "lightness": lightness,
+    "intensity": intensity,
+    "maximum": maximum,
+    "minimum": minimum,
+}
@@ -1,22 +1,22 @@
 import random
 import string
-from colorsys import rgb_to_hsv
+
+import numpy as np
 
 
 def id_generator(size=5, chars=string.ascii_lowercase + string.ascii_uppercase + string.digits):
     return "".join(random.choice(chars) for _ in range(size))
 
 
-def lightness(pixel):
-    return (
-        rgb_to_hsv(pixel[0], pixel[1], pixel[2])[2] / 255.0
-    )  # For backwards compatibility with python2
+def lightness(pixels: np.ndarray) -> np.ndarray:
+    """
+    The HSV value of every pixel in an (height, width, channels) array between 0 and 1
+    """
+    return pixels[..., :3].max(axis=-1) / 255.0
 
 
-def random_width(clength):
-    x = random.random()
-    width = int(clength * (1 - x))
-    return width
+def random_widths(clength: int, shape: tuple) -> np.ndarray:
+    return (clength * (1 - np.random.random(shape))).astype(np.int64)
 
 
 def crop_to(image_to_crop, reference_image):
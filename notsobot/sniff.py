@@ -0,0 +1,70 @@
+import struct
+from typing import NamedTuple, Optional
+
+SNIFF_BYTES = 32 * 1024
+# How much of a download is read before its header is checked.
+# This covers every format's dimensions except JPEGs with very large metadata.
+
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: int
+    height: int
+
+
+def _sniff_jpeg(data: bytes) -> Optional[ImageHeader]:
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # padding between segments
+            i += 1
+            continue
+        (length,) = struct.unpack(">H", data[i + 2 : i + 4])
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return ImageHeader("jpeg", width, height)
+        i += 2 + length
+    return None
+
+
+def _sniff_webp(data: bytes) -> Optional[ImageHeader]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageHeader("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L" and len(data) >= 25:
+        b = data[21:25]
+        width = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        height = 1 + (((b[3] & 0xF) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return ImageHeader("webp", width, height)
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = 1 + int.from_bytes(data[24:27], "little")
+        height = 1 + int.from_bytes(data[27:30], "little")
+        return ImageHeader("webp", width, height)
+    return None
+
+
+def sniff_image(data: bytes) -> Optional[ImageHeader]:
+    """
+    Reads the format and dimensions of an image from the start of its data
+
+    Returns `None` if the format isn't recognised or the dimensions
+    aren't within `data` yet.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return ImageHeader("png", width, height)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageHeader("gif", width, height)
+    if data.startswith(b"\xff\xd8"):
+        return _sniff_jpeg(data)
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return _sniff_webp(data)
+    if data.startswith(b"BM") and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return ImageHeader("bmp", width, abs(height))
+    return None
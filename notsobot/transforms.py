@@ -0,0 +1,602 @@
+"""
+Image transforms run by the NotSoBot image engine
+
+Everything in here runs inside a worker process so every function must be
+importable at module level and only take and return picklable data.
+Images are returned as an `ImageResult` and turned into `discord.File`
+objects back in the cog.
+"""
+
+import logging
+import random
+import textwrap
+from functools import partial
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import jpglitch
+import numpy as np
+import wand
+import wand.color
+import wand.drawing
+import wand.font
+import wand.image
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from pyfiglet import figlet_format
+
+from .frames import iter_frames, process_frames, save_frames
+from .pixelsort import pixelsort
+from .vw import macintoshplus
+
+log = logging.getLogger("red.trusty-cogs.NotSoBot")
+
+try:
+    import aalib
+
+    AALIB_INSTALLED = True
+except Exception:
+    AALIB_INSTALLED = False
+
+code = "```py\n{0}\n```"
+
+
+class ImageResult(NamedTuple):
+    data: BytesIO
+    filename: str
+    size: int
+
+
+def _save_pil(img: Image.Image, filename: str, fmt: str, **kwargs) -> ImageResult:
+    final = BytesIO()
+    img.save(final, fmt, **kwargs)
+    file_size = final.tell()
+    final.seek(0)
+    return ImageResult(final, filename, file_size)
+
+
+def do_magik(scale: int, img: BytesIO) -> Tuple[Union[str, ImageResult], Optional[str]]:
+    exif = {}
+    exif_msg = ""
+    count = 0
+    i = wand.image.Image(file=img)
+    i.format = "png"
+    i.alpha_channel = True
+    if i.size >= (3000, 3000):
+        i.close()
+        return ":warning: `Image exceeds maximum resolution >= (3000, 3000).`", None
+    exif.update({count: (k[5:], v) for k, v in i.metadata.items() if k.startswith("exif:")})
+    count += 1
+    i.transform(resize="800x800>")
+    i.liquid_rescale(
+        width=int(i.width * 0.5),
+        height=int(i.height * 0.5),
+        delta_x=int(0.5 * scale) if scale else 1,
+        rigidity=0,
+    )
+    i.liquid_rescale(
+        width=int(i.width * 1.5),
+        height=int(i.height * 1.5),
+        delta_x=scale if scale else 2,
+        rigidity=0,
+    )
+    magikd = BytesIO()
+    i.save(file=magikd)
+    file_size = magikd.tell()
+    magikd.seek(0)
+    for x in exif:
+        if len(exif[x]) >= 2000:
+            continue
+        exif_msg += "**Exif data for image #{0}**\n".format(str(x + 1)) + code.format(exif[x])
+    else:
+        if len(exif_msg) == 0:
+            exif_msg = None
+    i.close()
+    return ImageResult(magikd, "magik.png", file_size), exif_msg
+
+
+def do_gmagik(image: BytesIO, frame_delay: int) -> ImageResult:
+    final = BytesIO()
+    is_gif = False
+    with wand.image.Image() as new_image:
+        with wand.image.Image(file=image) as img:
+            if len(getattr(img, "sequence", [])) > 1:
+                is_gif = True
+            if is_gif:
+                log.debug("Is gif")
+                for change in img.sequence:
+                    change.transform(resize="512x512>")
+                    change.liquid_rescale(
+                        width=int(change.width * 0.5),
+                        height=int(change.height * 0.5),
+                        delta_x=1,
+                        rigidity=0,
+                    )
+                    change.liquid_rescale(
+                        width=int(change.width * 1.5),
+                        height=int(change.height * 1.5),
+                        delta_x=2,
+                        rigidity=0,
+                    )
+                    new_image.sequence.append(change)
+            else:
+                log.debug("Is not gif")
+                for x in range(0, 30):
+                    if x == 0:
+                        log.debug("Cloning initial image")
+                        i = img.clone().convert("gif")
+                    else:
+                        i = new_image.sequence[-1].clone()
+                    i.transform(resize="512x512>")
+                    i.liquid_rescale(
+                        width=int(i.width * 0.75),
+                        height=int(i.height * 0.75),
+                        delta_x=1,
+                        rigidity=0,
+                    )
+                    i.liquid_rescale(
+                        width=int(i.width * 1.25),
+                        height=int(i.height * 1.25),
+                        delta_x=2,
+                        rigidity=0,
+                    )
+                    i.resize(img.width, img.height)
+                    new_image.sequence.append(i)
+        new_image.format = "gif"
+        new_image.dispose = "background"
+        new_image.type = "optimize"
+        new_image.save(file=final)
+        file_size = final.tell()
+        final.seek(0)
+    return ImageResult(final, "gmagik.gif", file_size)
+
+
+def make_caption_image(
+    b: BytesIO, text: str, color: str, font_path: str, size: int, x: int, y: int, is_gif: bool
+) -> ImageResult:
+    final = BytesIO()
+    font = wand.font.Font(path=font_path, size=size, color=wand.color.Color(color))
+    with wand.image.Image(file=b) as img:
+        i = img.clone()
+        x = int(i.height * (x * 0.01))
+        y = int(i.width * (y * 0.01))
+        if not is_gif:
+            i.caption(str(text), left=x, top=y, font=font)
+        else:
+            with wand.image.Image() as new_image:
+                for frame in img.sequence:
+                    frame.caption(str(text), left=x, top=y, font=font)
+                    new_image.sequence.append(frame)
+                new_image.save(file=final)
+        i.save(file=final)
+    file_size = final.tell()
+    final.seek(0)
+    return ImageResult(final, f"caption.{'png' if not is_gif else 'gif'}", file_size)
+
+
+def trigger_image(path: BytesIO, t_path: BytesIO) -> ImageResult:
+    final = BytesIO()
+    with wand.image.Image(width=512, height=680) as img:
+        img.format = "gif"
+        img.dispose = "background"
+        img.type = "optimize"
+        with wand.image.Image(file=path) as top_img:
+            top_img.transform(resize="640x640!")
+            with wand.image.Image(file=t_path) as trigger:
+                with wand.image.Image(width=512, height=660) as temp_img:
+                    i = top_img.clone()
+                    t = trigger.clone()
+                    temp_img.composite(i, -60, -60)
+                    temp_img.composite(t, 0, 572)
+                    img.composite(temp_img)
+                with wand.image.Image(width=512, height=660) as temp_img:
+                    i = top_img.clone()
+                    t = trigger.clone()
+                    temp_img.composite(i, -45, -50)
+                    temp_img.composite(t, 0, 572)
+                    img.sequence.append(temp_img)
+                with wand.image.Image(width=512, height=660) as temp_img:
+                    i = top_img.clone()
+                    t = trigger.clone()
+                    temp_img.composite(i, -50, -45)
+                    temp_img.composite(t, 0, 572)
+                    img.sequence.append(temp_img)
+                with wand.image.Image(width=512, height=660) as temp_img:
+                    i = top_img.clone()
+                    t = trigger.clone()
+                    temp_img.composite(i, -45, -65)
+                    temp_img.composite(t, 0, 572)
+                    img.sequence.append(temp_img)
+        for frame in img.sequence:
+            frame.delay = 2
+        img.save(file=final)
+    file_size = final.tell()
+    final.seek(0)
+    return ImageResult(final, "triggered.gif", file_size)
+
+
+def do_ascii(text: str) -> Tuple[ImageResult, str]:
+    txt = figlet_format(text, font="starwars")
+    i = Image.new("RGB", (2000, 1000))
+    img = ImageDraw.Draw(i)
+    text_width, text_height = img.textsize(txt)
+    imgs = Image.new("RGB", (text_width + 30, text_height))
+    ii = ImageDraw.Draw(imgs)
+    ii.text((20, 20), txt, fill=(0, 255, 0))
+    result = _save_pil(imgs, "ascii.png", "png")
+    imgs.close()
+    return result, txt
+
+
+GLYPH_HEIGHT = 15
+# The height of each row of ascii art, also the font size
+
+_glyph_atlases: Dict[str, np.ndarray] = {}
+# Pre-rendered glyphs per font path, kept for the life of the worker process
+
+
+def glyph_atlas(font_path: str) -> np.ndarray:
+    """
+    Returns an array of every printable ascii character drawn in black on white
+
+    The array is indexed by `ord(char) - 32` and each glyph is one tile
+    of the monospace font's character width by `GLYPH_HEIGHT`.
+    """
+    if font_path not in _glyph_atlases:
+        font = ImageFont.truetype(font_path, GLYPH_HEIGHT)
+        width, _height = font.getsize("M")
+        tiles = []
+        for code in range(32, 127):
+            tile = Image.new("L", (width, GLYPH_HEIGHT), 255)
+            ImageDraw.Draw(tile).text((0, 0), chr(code), 0, font=font)
+            tiles.append(np.asarray(tile))
+        _glyph_atlases[font_path] = np.stack(tiles)
+    return _glyph_atlases[font_path]
+
+
+def generate_ascii(image: Image.Image, font_path: str) -> Image.Image:
+    atlas = glyph_atlas(font_path)
+    image_width, image_height = image.size
+    aalib_screen_width = int(image_width / 24.9) * 10
+    aalib_screen_height = int(image_height / 41.39) * 10
+    screen = aalib.AsciiScreen(width=aalib_screen_width, height=aalib_screen_height)
+
+    im = image.convert("L").resize(screen.virtual_size)
+    screen.put_image((0, 0), im)
+    lines = screen.render().splitlines()
+    columns = max(len(line) for line in lines)
+    text = "".join(line.ljust(columns) for line in lines).encode("ascii", "replace")
+    codes = np.frombuffer(text, dtype=np.uint8).astype(np.intp) - 32
+    codes[(codes < 0) | (codes >= len(atlas))] = 0
+    # (rows, columns, glyph height, glyph width) -> (rows * height, columns * width)
+    tiles = atlas[codes.reshape(len(lines), columns)]
+    rows, columns, height, width = tiles.shape
+    pixels = tiles.transpose(0, 2, 1, 3).reshape(rows * height, columns * width)
+    return Image.fromarray(pixels, "L")
+
+
+def do_iascii(b: BytesIO, font_path: str) -> ImageResult:
+    with Image.open(b) as im:
+        img = generate_ascii(im, font_path)
+    return _save_pil(img, "iascii.png", "png")
+
+
+def do_gascii(b: BytesIO, font_path: str) -> ImageResult:
+    with Image.open(b) as image:
+        frames = iter_frames(image, max_frames=20)
+        temp = save_frames(process_frames(frames, partial(generate_ascii, font_path=font_path)))
+    return ImageResult(temp, "gascii.gif", temp.getbuffer().nbytes)
+
+
+def make_rip(image: BytesIO, text: str, font_path: str) -> ImageResult:
+    img = Image.open(image).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    font1 = ImageFont.truetype(font_path, 35)
+    text = "\n".join(line for line in textwrap.wrap(text, width=15))
+    w, h = draw.multiline_textsize(text, font=font1)
+    draw.multiline_text(
+        (((400 - w) / 2) - 1, 50), text, fill=(50, 50, 50), font=font1, align="center"
+    )
+    draw.multiline_text(
+        (((400 - w) / 2) + 1, 50), text, fill=(50, 50, 50), font=font1, align="center"
+    )
+    draw.multiline_text((((400 - w) / 2), 49), text, fill=(50, 50, 50), font=font1, align="center")
+    draw.multiline_text((((400 - w) / 2), 51), text, fill=(50, 50, 50), font=font1, align="center")
+    draw.multiline_text(
+        ((400 - w) / 2, 50), text, fill=(105, 105, 105), font=font1, align="center"
+    )
+    result = _save_pil(img, "rip.jpg", "JPEG")
+    img.close()
+    return result
+
+
+def make_merge(list_im: List[BytesIO], vertical: bool) -> ImageResult:
+    imgs = [Image.open(i).convert("RGBA") for i in list_im]
+    if vertical:
+        # Vertical
+        max_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[1][1]
+        imgs_comb = np.vstack([np.asarray(i.resize(max_shape)) for i in imgs])
+    else:
+        # Horizontal
+        min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
+        imgs_comb = np.hstack([np.asarray(i.resize(min_shape)) for i in imgs])
+    imgs_comb = Image.fromarray(imgs_comb)
+    result = _save_pil(imgs_comb, "merge.png", "png")
+    for i in imgs:
+        i.close()
+    return result
+
+
+def make_jpeg(b: BytesIO, quality: int) -> ImageResult:
+    img = Image.open(b).convert("RGB")
+    return _save_pil(img, "needsmorejpeg.jpg", "JPEG", quality=quality)
+
+
+def do_vw(b: BytesIO, txt: str) -> ImageResult:
+    im = Image.open(b)
+    k = random.randint(0, 100)
+    im = macintoshplus.draw_method1(k, txt, im)
+    return _save_pil(im, "vapewave.png", "png")
+
+
+def make_mc(b: BytesIO, txt: str, font_path: str) -> ImageResult:
+    image = Image.open(b).convert("RGBA")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(font_path, 17)
+    draw.text((60, 30), txt, (255, 255, 255), font=font)
+    return _save_pil(image, "achievement.png", "png")
+
+
+def add_watermark(
+    b: BytesIO, wmm: BytesIO, x: int, y: int, transparency: float, wm_gif: bool = False
+) -> ImageResult:
+    final = BytesIO()
+    with wand.image.Image(file=b) as img:
+        is_gif = len(getattr(img, "sequence")) > 1
+        if not is_gif and not wm_gif:
+            log.debug("There are no gifs")
+            with img.clone() as new_img:
+                new_img.transform(resize="65536@")
+                final_x = int(new_img.height * (x * 0.01))
+                final_y = int(new_img.width * (y * 0.01))
+                with wand.image.Image(file=wmm) as wm:
+                    new_img.watermark(
+                        image=wm, left=final_x, top=final_y, transparency=transparency
+                    )
+                new_img.save(file=final)
+
+        elif is_gif and not wm_gif:
+            log.debug("The base image is a gif")
+            wm = wand.image.Image(file=wmm)
+            with wand.image.Image() as new_image:
+                with img.clone() as new_img:
+                    for frame in new_img.sequence:
+                        frame.transform(resize="65536@")
+                        final_x = int(frame.height * (x * 0.01))
+                        final_y = int(frame.width * (y * 0.01))
+                        frame.watermark(
+                            image=wm,
+                            left=final_x,
+                            top=final_y,
+                            transparency=transparency,
+                        )
+                        new_image.sequence.append(frame)
+                new_image.save(file=final)
+
+        else:
+            log.debug("The mark is a gif")
+            with wand.image.Image() as new_image:
+                with wand.image.Image(file=wmm) as new_img:
+                    for frame in new_img.sequence:
+                        with img.clone() as clone:
+                            if is_gif:
+                                clone = clone.sequence[0]
+                                # we only care about the first frame of the gif in this case
+                            else:
+                                clone = clone.convert("gif")
+
+                            clone.transform(resize="65536@")
+                            final_x = int(clone.height * (x * 0.01))
+                            final_y = int(clone.width * (y * 0.01))
+                            clone.watermark(
+                                image=frame,
+                                left=final_x,
+                                top=final_y,
+                                transparency=transparency,
+                            )
+                            new_image.sequence.append(clone)
+                            new_image.dispose = "background"
+                            with new_image.sequence[-1] as new_frame:
+                                new_frame.delay = frame.delay
+
+                new_image.save(file=final)
+
+    size = final.tell()
+    final.seek(0)
+    return ImageResult(final, f"watermark.{'gif' if is_gif or wm_gif else 'png'}", size)
+
+
+def do_glitch(b: BytesIO, amount: int, seed: int, iterations: int) -> ImageResult:
+    img = Image.open(b)
+    is_gif = getattr(img, "is_animated", False)
+    if not is_gif:
+        img = img.convert("RGB")
+        b = BytesIO()
+        img.save(b, format="JPEG")
+        b.seek(0)
+        img = jpglitch.Jpeg(bytearray(b.getvalue()), amount, seed, iterations)
+        final = BytesIO()
+        final.name = "glitch.jpg"
+        img.save_image(final)
+        file_size = final.tell()
+        final.seek(0)
+    else:
+        data = np.frombuffer(b.getvalue(), dtype=np.uint8).copy()
+        # the global colour table ends at the first extension block
+        # which is either an application or graphic control extension
+        blocks = np.flatnonzero((data[:-1] == 33) & ((data[1:] == 255) | (data[1:] == 249)))
+        end = int(blocks[0]) if len(blocks) else len(data)
+        data[13:end] = np.random.randint(0, 256, size=max(end - 13, 0), dtype=np.uint8)
+        final = BytesIO(data.tobytes())
+        file_size = len(data)
+    return ImageResult(final, "glitch.jpeg", file_size)
+
+
+def _pixel_grid(img: Image.Image, pixels: int) -> Image.Image:
+    """
+    Pixelates an image and draws a black grid line between every block
+    """
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+    img = img.resize((int(img.size[0] / pixels), int(img.size[1] / pixels)), Image.NEAREST)
+    img = img.resize((int(img.size[0] * pixels), int(img.size[1] * pixels)), Image.NEAREST)
+    data = np.array(img)
+    data[::pixels, :, :3] = 0
+    data[:, ::pixels, :3] = 0
+    if img.mode == "RGBA":
+        data[::pixels, :, 3] = 255
+        data[:, ::pixels, 3] = 255
+    return Image.fromarray(data, img.mode)
+
+
+def make_pixel(b: BytesIO, pixels: int) -> ImageResult:
+    with Image.open(b) as image:
+        img = _pixel_grid(image, pixels)
+    result = _save_pil(img, "pixelated.png", "png")
+    img.close()
+    return result
+
+
+def make_pixel_gif(b: BytesIO, pixels: int) -> ImageResult:
+    with Image.open(b) as image:
+        frames = process_frames(iter_frames(image), partial(_pixel_grid, pixels=pixels))
+        final = save_frames(frames)
+    return ImageResult(final, "pixelated.gif", final.getbuffer().nbytes)
+
+
+def do_pixelsort(
+    b: BytesIO,
+    interval_function: str,
+    sorting_function: str,
+    angle: int,
+    randomness: int,
+    lower: float,
+    upper: float,
+) -> ImageResult:
+    with Image.open(b) as img:
+        sorted_img = pixelsort(
+            img, interval_function, sorting_function, angle, randomness, lower, upper
+        )
+    return _save_pil(sorted_img, "pixelsort.png", "png")
+
+
+def _mirror_halves(f: BytesIO, f2: BytesIO, filename: str) -> ImageResult:
+    list_im = [f2, f]
+    imgs = [ImageOps.mirror(Image.open(i).convert("RGBA")) for i in list_im]
+    min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
+    imgs_comb = np.hstack([np.asarray(i.resize(min_shape)) for i in imgs])
+    result = _save_pil(Image.fromarray(imgs_comb), filename, "png")
+    f.close()
+    f2.close()
+    return result
+
+
+def _stack_halves(f: BytesIO, f2: BytesIO, filename: str) -> ImageResult:
+    list_im = [f, f2]
+    imgs = [Image.open(i).convert("RGBA") for i in list_im]
+    min_shape = sorted([(np.sum(i.size), i.size) for i in imgs])[0][1]
+    imgs_comb = np.vstack([np.asarray(i.resize(min_shape)) for i in imgs])
+    result = _save_pil(Image.fromarray(imgs_comb), filename, "png")
+    f.close()
+    f2.close()
+    return result
+
+
+def do_waaw(b: BytesIO) -> ImageResult:
+    f = BytesIO()
+    f2 = BytesIO()
+    with wand.image.Image(file=b) as img:
+        h1 = img.clone()
+        width = int(img.width / 2) if int(img.width / 2) > 0 else 1
+        h1.crop(width=width, height=int(img.height), gravity="east")
+        h2 = h1.clone()
+        h1.rotate(degree=180)
+        h1.flip()
+        h1.save(file=f)
+        h2.save(file=f2)
+    f.seek(0)
+    f2.seek(0)
+    return _mirror_halves(f, f2, "waaw.png")
+
+
+def do_haah(b: BytesIO) -> ImageResult:
+    f = BytesIO()
+    f2 = BytesIO()
+    with wand.image.Image(file=b) as img:
+        h1 = img.clone()
+        h1.transform("50%x100%")
+        h2 = h1.clone()
+        h2.rotate(degree=180)
+        h2.flip()
+        h1.save(file=f)
+        h2.save(file=f2)
+    f.seek(0)
+    f2.seek(0)
+    return _mirror_halves(f, f2, "haah.png")
+
+
+def do_woow(b: BytesIO) -> ImageResult:
+    f = BytesIO()
+    f2 = BytesIO()
+    with wand.image.Image(file=b) as img:
+        h1 = img.clone()
+        width = int(img.width) if int(img.width) > 0 else 1
+        h1.crop(width=width, height=int(img.height / 2), gravity="north")
+        h2 = h1.clone()
+        h2.rotate(degree=180)
+        h2.flop()
+        h1.save(file=f)
+        h2.save(file=f2)
+    f.seek(0)
+    f2.seek(0)
+    return _stack_halves(f, f2, "woow.png")
+
+
+def do_hooh(b: BytesIO) -> ImageResult:
+    f = BytesIO()
+    f2 = BytesIO()
+    with wand.image.Image(file=b) as img:
+        h1 = img.clone()
+        width = int(img.width) if int(img.width) > 0 else 1
+        h1.crop(width=width, height=int(img.height / 2), gravity="south")
+        h2 = h1.clone()
+        h1.rotate(degree=180)
+        h2.flop()
+        h1.save(file=f)
+        h2.save(file=f2)
+    f.seek(0)
+    f2.seek(0)
+    return _stack_halves(f, f2, "hooh.png")
+
+
+def flip_img(b: BytesIO) -> ImageResult:
+    with Image.open(b) as img:
+        img = ImageOps.flip(img)
+    return _save_pil(img, "flip.png", "png")
+
+
+def flop_img(b: BytesIO) -> ImageResult:
+    with Image.open(b) as img:
+        img = ImageOps.mirror(img)
+    return _save_pil(img, "flop.png", "png")
+
+
+def invert_img(b: BytesIO) -> ImageResult:
+    with Image.open(b).convert("RGB") as img:
+        img = ImageOps.invert(img)
+    return _save_pil(img, "invert.png", "png")
+
+
+def rotate_img(b: BytesIO, degrees: int) -> ImageResult:
+    with Image.open(b).convert("RGBA") as img:
+        img = img.rotate(int(degrees))
+    return _save_pil(img, "rotate.png", "png")
@@ -1,7 +1,7 @@
-from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from enum import Enum
+from typing import Set
 
 import pytz
 from redbot.core.utils.chat_formatting import humanize_number
@@ -87,7 +87,41 @@ class Activities:
         self.last_id: str = kwargs.get("last_id")
         self.last_timestamp = kwargs.get("last_timestamp")
         self.username: str = kwargs.get("username")
-        self.posted_activities: deque = deque(kwargs.get("posted_activities", []), 20)
+        self.posted_activities: Set[str] = set(kwargs.get("posted_activities", []))
+        self.prune()
+
+    @staticmethod
+    def activity_timestamp(activity_id: str) -> int:
+        return int(activity_id.split("-", 1)[0])
+
+    def prune(self) -> None:
+        """
+        Drops posted activities older than the newest one posted
+
+        Those are already skipped by their timestamp so only activities
+        sharing the newest timestamp need to be remembered by id.
+        """
+        if self.last_timestamp is None:
+            return
+        self.posted_activities = {
+            activity_id
+            for activity_id in self.posted_activities
+            if self.activity_timestamp(activity_id) >= self.last_timestamp
+        }
+
+    def is_new(self, activity: Activity) -> bool:
+        timestamp = int(activity.date.timestamp())
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return False
+        return activity.id not in self.posted_activities
+
+    def add(self, activity: Activity) -> None:
+        timestamp = int(activity.date.timestamp())
+        self.posted_activities.add(activity.id)
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            self.last_timestamp = timestamp
+            self.last_id = activity.id
+            self.prune()
 
     def to_json(self):
         return {
@@ -0,0 +1,25 @@
+import asyncio
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host by at least `interval` seconds
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last: Dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        host = urlparse(url).netloc
+        if host not in self._locks:
+            self._locks[host] = asyncio.Lock()
+        async with self._locks[host]:
+            delay = self._last.get(host, 0.0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = time.monotonic()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import re
@@ -13,6 +14,7 @@ from redbot.core.utils.chat_formatting import box, humanize_number, pagify
 from tabulate import tabulate
 
 from .profile import Activities, Activity, Profile
+from .ratelimit import HostRateLimiter
 
 log = logging.getLogger("red.trusty-cogs.runescape")
 
@@ -24,6 +26,12 @@ XP_RE = re.compile(r"\d+XP IN (.+)", flags=re.I)
 KILLED_RE = re.compile(r"(?:I )?(?:killed|defeated) (?:\d+ |the )?([a-z \-,]+)", flags=re.I)
 FOUND_RE = re.compile(r"I found (?:a pair of|some|a|an) (.+)", flags=re.I)
 
+METRICS_CONCURRENCY = 10
+# How many RuneMetrics profiles are fetched at once
+
+REQUEST_INTERVAL = 0.1
+# Minimum seconds between requests to the same Runescape host
+
 
 class Runescape(commands.Cog):
     """
@@ -31,7 +39,7 @@ class Runescape(commands.Cog):
     """
 
     __author__ = ["TrustyJAID"]
-    __version__ = "1.3.1"
+    __version__ = "1.4.0"
 
     def __init__(self, bot):
         self.bot: Red = bot
@@ -41,6 +49,7 @@ class Runescape(commands.Cog):
         self.metrics: Dict[str, Activities] = {}
         self.check_new_metrics.start()
         self.session = aiohttp.ClientSession()
+        self.rate_limiter = HostRateLimiter(REQUEST_INTERVAL)
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """
@@ -66,16 +75,40 @@ class Runescape(commands.Cog):
 
     @tasks.loop(seconds=60)
     async def check_new_metrics(self):
-        for username, activities in self.metrics.items():
+        semaphore = asyncio.Semaphore(METRICS_CONCURRENCY)
+        usernames = list(self.metrics)
+        results = await asyncio.gather(
+            *[self.check_user_metrics(username, semaphore) for username in usernames],
+            return_exceptions=True,
+        )
+        updated = []
+        for username, result in zip(usernames, results):
+            if isinstance(result, Exception):
+                log.error("Error checking metrics for %s", username, exc_info=result)
+            elif result:
+                updated.append(username)
+        if updated:
+            async with self.config.metrics() as metrics:
+                for username in updated:
+                    if username in self.metrics:
+                        metrics[username] = self.metrics[username].to_json()
+
+    async def check_user_metrics(self, username: str, semaphore: asyncio.Semaphore) -> bool:
+        """
+        Posts any new activities for one account and returns whether there were any
+        """
+        async with semaphore:
             data = await self.get_profile(username, 20)
-            for activity in reversed(data.activities):
-                if activity.id not in activities.posted_activities:
-                    await self.post_activity(data, activities.channels, activity)
-                    activities.last_timestamp = int(activity.date.timestamp())
-                    activities.last_id = activity.id
-                    activities.posted_activities.append(activity.id)
-                    async with self.config.metrics() as metrics:
-                        metrics[username] = activities.to_json()
+        if data == "NO PROFILE" or username not in self.metrics:
+            return False
+        activities = self.metrics[username]
+        posted = False
+        for activity in reversed(data.activities):
+            if activities.is_new(activity):
+                await self.post_activity(data, activities.channels, activity)
+                activities.add(activity)
+                posted = True
+        return posted
 
     async def post_activity(
         self, profile: Profile, channels: Dict[str, int], activity: Activity
@@ -274,7 +307,9 @@ class Runescape(commands.Cog):
         )
 
     async def get_osrs_hiscores(self, runescape_name: str) -> Optional[dict]:
-        async with self.session.get(await self.osrs_highscores(runescape_name)) as resp:
+        url = await self.osrs_highscores(runescape_name)
+        await self.rate_limiter.wait(url)
+        async with self.session.get(url) as resp:
             if resp.status != 200:
                 return None
             return await resp.read()
@@ -294,7 +329,9 @@ class Runescape(commands.Cog):
         )
 
     async def get_player_details(self, runescape_name: str) -> dict:
-        async with self.session.get(await self.make_url_player_details(runescape_name)) as resp:
+        url = await self.make_url_player_details(runescape_name)
+        await self.rate_limiter.wait(url)
+        async with self.session.get(url) as resp:
             data = await resp.text()
         try:
             json_data = json.loads(
@@ -306,9 +343,9 @@ class Runescape(commands.Cog):
         # return await resp.json()
 
     async def get_data_profile(self, runescape_name: str, activities: int) -> dict:
-        async with self.session.get(
-            await self.make_url_profile(runescape_name, activities)
-        ) as resp:
+        url = await self.make_url_profile(runescape_name, activities)
+        await self.rate_limiter.wait(url)
+        async with self.session.get(url) as resp:
             data = await resp.json()
         # log.debug(data)
         return data
@@ -2,27 +2,65 @@ import asyncio
 import functools
 import logging
 import sys
+from collections import OrderedDict
 from datetime import datetime
 from io import BytesIO
+from pathlib import Path
 from random import choice, randint
 from typing import Optional, Tuple, Union
 
 import aiohttp
 import discord
+import numpy as np
 from PIL import Image, ImageSequence
 from redbot.core import Config, VersionInfo, checks, commands, version_info
+from redbot.core.data_manager import cog_data_path
 
 log = logging.getLogger("red.trusty-cogs.TrustyAvatar")
 
+PRESET_COLOURS = [
+    "teal",
+    "dark_teal",
+    "green",
+    "dark_green",
+    "blue",
+    "dark_blue",
+    "purple",
+    "dark_purple",
+    "magenta",
+    "dark_magenta",
+    "gold",
+    "dark_gold",
+    "orange",
+    "dark_orange",
+    "red",
+    "dark_red",
+    "lighter_grey",
+    "dark_grey",
+    "light_grey",
+    "darker_grey",
+    "blurple",
+    "greyple",
+]
+# discord.Colour presets most role colours come from, every face is
+# recoloured with these ahead of time and saved to disk
+
+PRESET_RGB = {getattr(discord.Colour, name)().to_rgb() for name in PRESET_COLOURS}
+
+COLOUR_CACHE_SIZE = 64
+# How many recolours with other colours are kept in memory
+
 
 class TrustyAvatar(commands.Cog):
     """Changes the bot's image every so often"""
 
     __author__ = ["TrustyJAID"]
-    __version__ = "1.2.3"
+    __version__ = "1.3.1"
 
     def __init__(self, bot):
         self.bot = bot
+        self.session = aiohttp.ClientSession()
+        self.colours: "OrderedDict[Tuple[str, Tuple[int, int, int]], bytes]" = OrderedDict()
 
         self.activities = [
             discord.ActivityType.playing,
@@ -111,30 +149,114 @@ class TrustyAvatar(commands.Cog):
         """
         return
 
-    async def dl_image(self, url: str) -> BytesIO:
+    async def dl_image(self, url: str) -> Optional[BytesIO]:
         """Download bytes like object of user avatar"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(url)) as resp:
-                test = await resp.read()
-                return BytesIO(test)
+        async with self.session.get(str(url)) as resp:
+            if resp.status != 200:
+                log.error("Error downloading %s: HTTP %s", url, resp.status)
+                return None
+            test = await resp.read()
+            return BytesIO(test)
+
+    @staticmethod
+    def is_image(data: bytes) -> bool:
+        try:
+            with Image.open(BytesIO(data)) as img:
+                img.verify()
+        except Exception:
+            return False
+        return True
 
-    def replace_colour(self, img: Image, to_colour: tuple) -> BytesIO:
-        """https://stackoverflow.com/questions/765736/using-pil-to-make-all-white-pixels-transparent"""
-        img = Image.open(img)
-        img = img.convert("RGBA")
-        datas = img.getdata()
-        # reds = [94, 221, 170]
-        # greens = [123, 227, 185]
-        # blues = [75, 217, 160]
-        newData = []
-        for item in datas:
-            # if item[0] in [94] and item[1] in [123] and item[2] in [75]:
-            if item[3] == 0:
-                newData.append(to_colour)
-            else:
-                newData.append(item)
+    @staticmethod
+    def write_file(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # written beside the file first so a partial write is never read back
+        temp = path.with_suffix(".tmp")
+        temp.write_bytes(data)
+        temp.replace(path)
+
+    def avatar_path(self, url: str) -> Path:
+        return cog_data_path(self) / "avatars" / url.rsplit("/", 1)[-1]
+
+    def colour_path(self, face: str, colour: Tuple[int, int, int]) -> Path:
+        hex_colour = "{:02x}{:02x}{:02x}".format(*colour)
+        return cog_data_path(self) / "colours" / f"{face}_{hex_colour}.png"
+
+    async def get_image(self, url: str) -> Optional[bytes]:
+        """
+        Returns one of the bots avatar images, downloading it the first time
+
+        Returns `None` if the image isn't saved and can't be downloaded.
+        """
+        path = self.avatar_path(url)
+        if path.is_file():
+            data = path.read_bytes()
+            if self.is_image(data):
+                return data
+            log.info("Saved avatar %s is unreadable, downloading it again", path.name)
+            path.unlink()
+        download = await self.dl_image(url)
+        if download is None or not self.is_image(download.getvalue()):
+            log.error("Could not download avatar %s", url)
+            return None
+        self.write_file(path, download.getvalue())
+        return download.getvalue()
+
+    def get_saved_colour(self, face: str, colour: Tuple[int, int, int]) -> Optional[BytesIO]:
+        key = (face, colour)
+        if key in self.colours:
+            self.colours.move_to_end(key)
+            return BytesIO(self.colours[key])
+        path = self.colour_path(face, colour)
+        if colour in PRESET_RGB and path.is_file():
+            return BytesIO(path.read_bytes())
+        return None
+
+    def save_colour(self, face: str, colour: Tuple[int, int, int], image: BytesIO) -> None:
+        """
+        Keeps a recoloured face, preset colours on disk and any others in memory
+        """
+        if colour in PRESET_RGB:
+            self.write_file(self.colour_path(face, colour), image.getvalue())
+            return
+        self.colours[(face, colour)] = image.getvalue()
+        self.colours.move_to_end((face, colour))
+        while len(self.colours) > COLOUR_CACHE_SIZE:
+            self.colours.popitem(last=False)
 
-        img.putdata(newData)
+    async def build_avatar_cache(self) -> None:
+        """
+        Saves every avatar and recolours each face with the preset colours
+        """
+        for status in self.statuses.values():
+            for key in ("link", "xmas", "transparent"):
+                await self.get_image(status[key])
+        colours_path = cog_data_path(self) / "colours"
+        if colours_path.is_dir():
+            # only preset colours are kept on disk
+            keep = {self.colour_path(f, c).name for f in self.statuses for c in PRESET_RGB}
+            for path in colours_path.iterdir():
+                if path.name not in keep:
+                    path.unlink()
+        for face, status in self.statuses.items():
+            data = None
+            for colour in PRESET_RGB:
+                if self.colour_path(face, colour).is_file():
+                    continue
+                if data is None:
+                    data = await self.get_image(status["transparent"])
+                    if data is None:
+                        break
+                task = functools.partial(self.replace_colour, img=BytesIO(data), to_colour=colour)
+                image = await self.bot.loop.run_in_executor(None, task)
+                self.save_colour(face, colour, image)
+
+    def replace_colour(self, img: BytesIO, to_colour: tuple) -> BytesIO:
+        """Fill the transparent background of an avatar with a colour"""
+        img = Image.open(img)
+        data = np.array(img.convert("RGBA"))
+        data[data[..., 3] == 0] = (*to_colour, 255)
+        img = Image.fromarray(data)
         temp = BytesIO()
         img.save(temp, format="PNG")
         temp.name = "trustyavatar.png"
@@ -203,15 +325,20 @@ class TrustyAvatar(commands.Cog):
                 return
             new_avatar = face
         if isinstance(style, discord.Colour):
-            choice_avatar = await self.dl_image(self.statuses[new_avatar]["transparent"])
-            task = functools.partial(
-                self.replace_colour, img=choice_avatar, to_colour=style.to_rgb()
-            )
-            task = self.bot.loop.run_in_executor(None, task)
-            try:
-                file = await asyncio.wait_for(task, timeout=60)
-            except asyncio.TimeoutError:
-                return
+            colour = style.to_rgb()
+            file = self.get_saved_colour(new_avatar, colour)
+            if file is None:
+                data = await self.get_image(self.statuses[new_avatar]["transparent"])
+                if data is None:
+                    await ctx.send("I couldn't download that face, try again later.")
+                    return
+                task = functools.partial(self.replace_colour, img=BytesIO(data), to_colour=colour)
+                task = self.bot.loop.run_in_executor(None, task)
+                try:
+                    file = await asyncio.wait_for(task, timeout=60)
+                except asyncio.TimeoutError:
+                    return
+                self.save_colour(new_avatar, colour, file)
         else:
             if isinstance(style, discord.Member):
                 author = style
@@ -219,7 +346,11 @@ class TrustyAvatar(commands.Cog):
                 author_avatar = await self.dl_image(author.avatar_url_as(format="gif"))
             else:
                 author_avatar = await self.dl_image(author.avatar_url_as(format="png"))
-            choice_avatar = await self.dl_image(self.statuses[new_avatar]["transparent"])
+            choice_data = await self.get_image(self.statuses[new_avatar]["transparent"])
+            if author_avatar is None or choice_data is None:
+                await ctx.send("I couldn't download those avatars, try again later.")
+                return
+            choice_avatar = BytesIO(choice_data)
             task = functools.partial(
                 self.make_new_avatar,
                 author_avatar=author_avatar,
@@ -320,9 +451,10 @@ class TrustyAvatar(commands.Cog):
         if (now - last) > 1800:
             # Some extra checks so we don't get rate limited over reloads/resets
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as image:
-                        data = await image.read()
+                data = await self.get_image(url)
+                if data is None:
+                    # tried again on the next change instead of waiting another half hour
+                    return
                 await self.bot.user.edit(avatar=data)
             except Exception as e:
                 print(e)
@@ -377,6 +509,10 @@ class TrustyAvatar(commands.Cog):
             await self.bot.wait_until_red_ready()
         else:
             await self.bot.wait_until_ready()
+        try:
+            await self.build_avatar_cache()
+        except Exception:
+            log.exception("Error building the avatar cache")
         while self is self.bot.get_cog("TrustyAvatar"):
 
             new_avatar = choice([s for s in self.statuses])
@@ -398,5 +534,6 @@ class TrustyAvatar(commands.Cog):
 
     def cog_unload(self):
         self.loop.cancel()
+        self.bot.loop.create_task(self.session.close())
 
     __unload = cog_unload
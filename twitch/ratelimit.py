@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+INTERACTIVE = 0
+BACKGROUND = 1
+# Request priorities, lower numbers are let through first when waiting
+
+REQUEST_PRIORITY: ContextVar[int] = ContextVar("twitch_request_priority", default=INTERACTIVE)
+# Priority of requests made from the current task.
+# The polling loop sets this to BACKGROUND so everything it calls waits
+# behind commands without passing a priority through every helper.
+
+
+class TokenBucket:
+    """
+    Async token bucket shared by every Twitch request
+
+    Starts at Twitch's lowest limit and is corrected from the
+    `Ratelimit-Limit`, `Ratelimit-Remaining` and `Ratelimit-Reset` headers
+    of every response. Callers that have to wait are let through by
+    priority and then in the order they arrived.
+    """
+
+    def __init__(self, capacity: int = 30, window: float = 60.0):
+        self.capacity = capacity
+        self.window = window
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.requests = 0
+        self.waits = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: Optional[int] = None) -> None:
+        if priority is None:
+            priority = REQUEST_PRIORITY.get()
+        self.requests += 1
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and time.monotonic() >= self._blocked_until:
+            self.tokens -= 1
+            return
+        self.waits += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the token was handed over just as we were cancelled
+                self.tokens += 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._refill()
+        now = time.monotonic()
+        if now >= self._blocked_until:
+            while self._waiters and self.tokens >= 1:
+                _priority, _order, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue
+                self.tokens -= 1
+                future.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters:
+            delay = max(self._blocked_until - now, (1 - self.tokens) / self.rate, 0)
+            self._handle = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def update(self, limit: int, remaining: int, reset: int) -> None:
+        """
+        Corrects the bucket from a responses rate limit headers
+
+        `reset` is the unix time Twitch expects the bucket to be full again.
+        """
+        self._refill()
+        self.capacity = limit
+        until_reset = reset - time.time()
+        if remaining < limit and until_reset > 0:
+            self.rate = (limit - remaining) / until_reset
+        else:
+            self.rate = limit / self.window
+        # requests still in flight aren't counted by twitch yet
+        # so we only ever lower what's left here and let it refill locally
+        self.tokens = min(self.tokens, remaining)
+        if self._waiters:
+            self._dispatch()
+
+    def throttle(self, reset: Optional[int]) -> None:
+        """
+        Holds every request until `reset` after twitch has returned a 429
+        """
+        self.throttled += 1
+        self.tokens = 0
+        wait = reset - time.time() if reset else self.window / self.capacity
+        self._blocked_until = time.monotonic() + max(wait, 0) + 0.1
@@ -2,11 +2,13 @@ import asyncio
 import logging
 from typing import Literal, Optional
 
+import aiohttp
 import discord
 from redbot.core import Config, checks, commands
 from redbot.core.commands.converter import TimedeltaConverter
 
 from .errors import TwitchError
+from .ratelimit import TokenBucket
 from .twitch_api import TwitchAPI
 from .twitch_models import TwitchFollower
 from .menus import BaseMenu, TwitchClipsPages, TwitchFollowersPages
@@ -15,6 +17,9 @@ log = logging.getLogger("red.Trusty-cogs.Twitch")
 
 BASE_URL = "https://api.twitch.tv/helix"
 
+UNLOAD_TASK = "Twitch final save"
+# Name of the task saving accounts on unload, a reloaded cog waits for it before loading
+
 
 class Twitch(TwitchAPI, commands.Cog):
     """
@@ -22,7 +27,7 @@ class Twitch(TwitchAPI, commands.Cog):
     """
 
     __author__ = ["TrustyJAID"]
-    __version__ = "1.3.7"
+    __version__ = "1.4.2"
 
     def __init__(self, bot):
         self.bot = bot
@@ -36,8 +41,14 @@ class Twitch(TwitchAPI, commands.Cog):
         user_defaults = {"id": "", "login": "", "display_name": ""}
         self.config.register_global(**global_defaults, force_registration=True)
         self.config.register_user(**user_defaults, force_registration=True)
-        self.rate_limit_resets = set()
-        self.rate_limit_remaining = 0
+        self.session = aiohttp.ClientSession()
+        self.rate_limiter = TokenBucket()
+        self.profile_cache = {}
+        self.api_calls = 0
+        self.follow_accounts = {}
+        self.clip_accounts = {}
+        self.accounts_dirty = False
+        self.clips_dirty = False
         self.loop = None
         self.streams = {}
 
@@ -66,6 +77,10 @@ class Twitch(TwitchAPI, commands.Cog):
             await self.config.version.set("1.2.0")
         if await self.config.version() < "1.3.3":
             await self.migrate_clips()
+        for task in asyncio.all_tasks():
+            if task.get_name() == UNLOAD_TASK:
+                await task
+        await self.load_accounts()
         self.loop = asyncio.create_task(self.check_for_new_followers())
 
     async def migrate_clips(self):
@@ -149,32 +164,28 @@ class Twitch(TwitchAPI, commands.Cog):
         except TwitchError as e:
             await ctx.send(e)
             return
-        async with self.config.twitch_accounts() as cur_accounts:
-            user_data = await self.check_account_added(cur_accounts, profile)
-            if user_data is None:
-                try:
-                    followers, total = await self.get_all_followers(profile.id)
-                except TwitchError as e:
-                    return await ctx.send(e)
-                user_data = {
-                    "id": profile.id,
-                    "login": profile.login,
-                    "display_name": profile.display_name,
-                    "followers": followers,
-                    "total_followers": total,
-                    "channels": [channel.id],
-                }
-
-                cur_accounts.append(user_data)
-            else:
-                cur_accounts.remove(user_data)
-                user_data["channels"].append(channel.id)
-                cur_accounts.append(user_data)
-            await ctx.send(
-                "{} has been setup for twitch follow notifications in {}".format(
-                    profile.display_name, channel.mention
-                )
+        user_data = self.follow_accounts.get(profile.id)
+        if user_data is None:
+            try:
+                followers, total = await self.get_all_followers(profile.id)
+            except TwitchError as e:
+                return await ctx.send(e)
+            self.follow_accounts[profile.id] = {
+                "id": profile.id,
+                "login": profile.login,
+                "display_name": profile.display_name,
+                "followers": set(followers),
+                "total_followers": total,
+                "channels": [channel.id],
+            }
+        else:
+            user_data["channels"].append(channel.id)
+        await self.save_follow_accounts()
+        await ctx.send(
+            "{} has been setup for twitch follow notifications in {}".format(
+                profile.display_name, channel.mention
             )
+        )
 
     @twitch_clips.command(name="setclips")
     @checks.admin_or_permissions(manage_channels=True)
@@ -207,28 +218,28 @@ class Twitch(TwitchAPI, commands.Cog):
         except TwitchError as e:
             await ctx.send(e)
             return
-        async with self.config.twitch_clips() as cur_accounts:
-            chan_data = {
-                "view_count": view_count,
-                "check_back": check_back.total_seconds() if check_back else None,
-                "clips": []
+        chan_data = {
+            "view_count": view_count,
+            "check_back": check_back.total_seconds() if check_back else None,
+            "clips": set(),
+        }
+        if str(profile.id) not in self.clip_accounts:
+            try:
+                clips = await self.get_new_clips(profile.id)
+            except TwitchError as e:
+                return await ctx.send(e)
+
+            user_data = {
+                "id": profile.id,
+                "login": profile.login,
+                "display_name": profile.display_name,
+                "channels": {str(channel.id): chan_data},
             }
-            if str(profile.id) not in cur_accounts:
-                try:
-                    clips = await self.get_new_clips(profile.id)
-                except TwitchError as e:
-                    return await ctx.send(e)
-
-                user_data = {
-                    "id": profile.id,
-                    "login": profile.login,
-                    "display_name": profile.display_name,
-                    "channels": {str(channel.id): chan_data},
-                }
-
-                cur_accounts[str(profile.id)] = user_data
-            else:
-                cur_accounts[str(profile.id)]["channels"][str(channel.id)] = chan_data
+
+            self.clip_accounts[str(profile.id)] = user_data
+        else:
+            self.clip_accounts[str(profile.id)]["channels"][str(channel.id)] = chan_data
+        await self.save_clip_accounts()
         await ctx.send(
             "{} has been setup for new clip notifications in {}".format(
                 profile.display_name, channel.mention
@@ -252,32 +263,33 @@ class Twitch(TwitchAPI, commands.Cog):
             profile = await self.maybe_get_twitch_profile(ctx, twitch_name)
         except TwitchError as e:
             return await ctx.send(e)
-        async with self.config.twitch_clips() as cur_accounts:
-            if str(profile.id) not in cur_accounts:
+        cur_accounts = self.clip_accounts
+        if str(profile.id) not in cur_accounts:
+            await ctx.send(
+                "{} is not currently posting clip notifications in {}".format(
+                    profile.login, channel.mention
+                )
+            )
+            return
+        else:
+            if str(channel.id) not in cur_accounts[str(profile.id)]["channels"]:
                 await ctx.send(
-                    "{} is not currently posting clip notifications in {}".format(
+                    "{} is not currently posting new clips in {}".format(
                         profile.login, channel.mention
                     )
                 )
                 return
             else:
-                if str(channel.id) not in cur_accounts[str(profile.id)]["channels"]:
-                    await ctx.send(
-                        "{} is not currently posting new clips in {}".format(
-                            profile.login, channel.mention
-                        )
-                    )
-                    return
-                else:
-                    del cur_accounts[str(profile.id)]["channels"][str(channel.id)]
-                    if len(cur_accounts[str(profile.id)]["channels"]) == 0:
-                        # We don't need to be checking if there's no channels to post in
-                        del cur_accounts[str(profile.id)]
-            await ctx.send(
-                "Done, {}'s new clips won't be posted in {} anymore.".format(
-                    profile.login, channel.mention
-                )
+                del cur_accounts[str(profile.id)]["channels"][str(channel.id)]
+                if len(cur_accounts[str(profile.id)]["channels"]) == 0:
+                    # We don't need to be checking if there's no channels to post in
+                    del cur_accounts[str(profile.id)]
+        await self.save_clip_accounts()
+        await ctx.send(
+            "Done, {}'s new clips won't be posted in {} anymore.".format(
+                profile.login, channel.mention
             )
+        )
 
     @twitchhelp.command(name="testfollow")
     @checks.admin_or_permissions(manage_channels=True)
@@ -331,9 +343,16 @@ class Twitch(TwitchAPI, commands.Cog):
             profile = await self.maybe_get_twitch_profile(ctx, twitch_name)
         except TwitchError as e:
             return await ctx.send(e)
-        async with self.config.twitch_accounts() as cur_accounts:
-            user_data = await self.check_account_added(cur_accounts, profile)
-            if user_data is None:
+        user_data = self.follow_accounts.get(profile.id)
+        if user_data is None:
+            await ctx.send(
+                "{} is not currently posting follow notifications in {}".format(
+                    profile.login, channel.mention
+                )
+            )
+            return
+        else:
+            if channel.id not in user_data["channels"]:
                 await ctx.send(
                     "{} is not currently posting follow notifications in {}".format(
                         profile.login, channel.mention
@@ -341,23 +360,16 @@ class Twitch(TwitchAPI, commands.Cog):
                 )
                 return
             else:
-                if channel.id not in user_data["channels"]:
-                    await ctx.send(
-                        "{} is not currently posting follow notifications in {}".format(
-                            profile.login, channel.mention
-                        )
-                    )
-                    return
-                else:
-                    user_data["channels"].remove(channel.id)
-                    if len(user_data["channels"]) == 0:
-                        # We don't need to be checking if there's no channels to post in
-                        cur_accounts.remove(user_data)
-            await ctx.send(
-                "Done, {}'s new followers won't be posted in {} anymore.".format(
-                    profile.login, channel.mention
-                )
+                user_data["channels"].remove(channel.id)
+                if len(user_data["channels"]) == 0:
+                    # We don't need to be checking if there's no channels to post in
+                    del self.follow_accounts[profile.id]
+        await self.save_follow_accounts()
+        await ctx.send(
+            "Done, {}'s new followers won't be posted in {} anymore.".format(
+                profile.login, channel.mention
             )
+        )
 
     @twitchhelp.command(name="set")
     async def twitch_set(self, ctx: commands.Context, twitch_name: str) -> None:
@@ -462,3 +474,16 @@ class Twitch(TwitchAPI, commands.Cog):
     def cog_unload(self):
         if getattr(self, "loop", None):
             self.loop.cancel()
+        self.bot.loop.create_task(self.close(), name=UNLOAD_TASK)
+
+    async def close(self) -> None:
+        """
+        Writes anything seen since the last check then closes the session
+        """
+        if self.loop:
+            await asyncio.wait([self.loop])
+        try:
+            await self.save_accounts()
+        except Exception:
+            log.exception("Error saving twitch accounts")
+        await self.session.close()
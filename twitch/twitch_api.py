@@ -2,7 +2,7 @@ import asyncio
 import logging
 import time
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
 import discord
@@ -11,12 +11,22 @@ from redbot.core.bot import Red
 from redbot.core.utils import bounded_gather
 
 from .errors import TwitchError
+from .ratelimit import BACKGROUND, REQUEST_PRIORITY, TokenBucket
 from .twitch_models import TwitchProfile, TwitchFollower
 
 log = logging.getLogger("red.Trusty-cogs.Twitch")
 
 BASE_URL = "https://api.twitch.tv/helix"
 
+PROFILE_TTL = 600
+# Seconds a fetched profile is reused before asking Twitch again
+
+USERS_PER_REQUEST = 100
+# Most ids Helix accepts in a single /users request
+
+POLL_CONCURRENCY = 10
+# How many accounts are checked for new followers or clips at once
+
 
 class TwitchAPI:
     """
@@ -25,14 +35,26 @@ class TwitchAPI:
 
     config: Config
     bot: Red
-    rate_limit_resets: set
-    rate_limit_remaining: int
+    session: aiohttp.ClientSession
+    rate_limiter: TokenBucket
+    profile_cache: Dict[str, Tuple[float, TwitchProfile]]
+    api_calls: int
+    follow_accounts: Dict[str, dict]
+    clip_accounts: Dict[str, dict]
+    accounts_dirty: bool
+    clips_dirty: bool
 
     def __init__(self, bot):
         self.config: Config
         self.bot: Red
-        self.rate_limit_resets: set = set()
-        self.rate_limit_remaining: int = 0
+        self.session = aiohttp.ClientSession()
+        self.rate_limiter = TokenBucket()
+        self.profile_cache: Dict[str, Tuple[float, TwitchProfile]] = {}
+        self.api_calls: int = 0
+        self.follow_accounts: Dict[str, dict] = {}
+        self.clip_accounts: Dict[str, dict] = {}
+        self.accounts_dirty: bool = False
+        self.clips_dirty: bool = False
 
     #####################################################################################
     # Logic for accessing twitch API with rate limit checks                             #
@@ -55,22 +77,6 @@ class TwitchAPI:
             header["Authorization"] = "Bearer {}".format(access_token["access_token"])
         return header
 
-    async def wait_for_rate_limit_reset(self) -> None:
-        """Check rate limits in response header and ensure we're following them
-        https://github.com/tsifrer/python-twitch-client/blob/master/twitch/helix/base.py
-        """
-        if self.rate_limit_remaining == 0:
-            current_time = int(time.time())
-            self.rate_limit_resets = set(x for x in self.rate_limit_resets if x > current_time)
-
-            if len(self.rate_limit_resets) > 0:
-                reset_time = list(self.rate_limit_resets)[0]
-                # Calculate wait time and add 0.1s to the wait time to allow Twitch to reset
-                # their counter
-                wait_time = reset_time - current_time + 0.1
-                log.debug(wait_time)
-                await asyncio.sleep(wait_time)
-
     async def oauth_check(self) -> None:
         url = "https://id.twitch.tv/oauth2/token"
         keys = await self._get_api_tokens()
@@ -96,9 +102,8 @@ class TwitchAPI:
                 "grant_type": "client_credentials",
                 "scope": " ".join(s for s in scope),
             }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, params=params) as resp:
-                    access_token = await resp.json()
+            async with self.session.post(url, params=params) as resp:
+                access_token = await resp.json()
             await self.config.access_token.set(access_token)
         else:
             if "access_token" not in access_token:
@@ -107,9 +112,9 @@ class TwitchAPI:
                 return await self.oauth_check()
             header = {"Authorization": "OAuth {}".format(access_token["access_token"])}
             url = "https://id.twitch.tv/oauth2/validate"
-            async with aiohttp.ClientSession() as session:
-                resp = await session.get(url, headers=header)
-            if resp.status == 200:
+            async with self.session.get(url, headers=header) as resp:
+                status = resp.status
+            if status == 200:
                 # Validates the access token before use
                 return
             else:
@@ -120,21 +125,22 @@ class TwitchAPI:
         """Get responses from twitch after checking rate limits"""
         await self.oauth_check()
         header = await self.get_header()
-        await self.wait_for_rate_limit_reset()
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
+        while True:
+            await self.rate_limiter.acquire()
+            self.api_calls += 1
+            async with self.session.get(
                 url, headers=header, timeout=aiohttp.ClientTimeout(total=None)
             ) as resp:
+                limit = resp.headers.get("Ratelimit-Limit")
                 remaining = resp.headers.get("Ratelimit-Remaining")
-                if remaining:
-                    self.rate_limit_remaining = int(remaining)
                 reset = resp.headers.get("Ratelimit-Reset")
-                if reset:
-                    self.rate_limit_resets.add(int(reset))
+                if limit and remaining and reset:
+                    self.rate_limiter.update(int(limit), int(remaining), int(reset))
 
                 if resp.status == 429:
-                    log.info("Trying again")
-                    return await self.get_response(url)
+                    log.info("Rate limited by twitch, trying again")
+                    self.rate_limiter.throttle(int(reset) if reset else None)
+                    continue
 
                 return await resp.json()
 
@@ -178,8 +184,38 @@ class TwitchAPI:
         return TwitchProfile.from_json(await self.get_response(url))
 
     async def get_profile_from_id(self, twitch_id: str) -> TwitchProfile:
-        url = "{}/users?id={}".format(BASE_URL, twitch_id)
-        return TwitchProfile.from_json(await self.get_response(url))
+        profiles = await self.get_profiles_from_ids([twitch_id])
+        if str(twitch_id) not in profiles:
+            raise TwitchError("{} is not a valid Twitch user ID".format(twitch_id))
+        return profiles[str(twitch_id)]
+
+    async def get_profiles_from_ids(self, twitch_ids: List[str]) -> Dict[str, TwitchProfile]:
+        """
+        Returns the profiles found for `twitch_ids` keyed by ID
+
+        Profiles fetched in the last `PROFILE_TTL` seconds are reused and
+        the rest are requested up to 100 at a time.
+        """
+        now = time.monotonic()
+        profiles = {}
+        missing = []
+        for twitch_id in dict.fromkeys(str(i) for i in twitch_ids):
+            cached = self.profile_cache.get(twitch_id)
+            if cached and now - cached[0] < PROFILE_TTL:
+                profiles[twitch_id] = cached[1]
+            else:
+                missing.append(twitch_id)
+        for i in range(0, len(missing), USERS_PER_REQUEST):
+            ids = "&".join(f"id={twitch_id}" for twitch_id in missing[i : i + USERS_PER_REQUEST])
+            data = await self.get_response(f"{BASE_URL}/users?{ids}")
+            for user in data.get("data", []):
+                profile = TwitchProfile(**user)
+                self.profile_cache[profile.id] = (time.monotonic(), profile)
+                profiles[profile.id] = profile
+        # expired profiles are dropped here so the cache doesn't keep every follower forever
+        for twitch_id in [k for k, v in self.profile_cache.items() if now - v[0] >= PROFILE_TTL]:
+            del self.profile_cache[twitch_id]
+        return profiles
 
     async def get_new_followers(self, user_id: str) -> Tuple[List[TwitchFollower], int]:
         # Gets the last 100 followers from twitch
@@ -222,25 +258,72 @@ class TwitchAPI:
                 profile = await self.get_profile_from_id(twitch_id)
         return profile
 
-    async def check_account_added(
-        self, account_list: list, profile: TwitchProfile
-    ) -> Optional[dict]:
-        # Checks if the account is in the config and returns only that one
-        account_return = None
-        for account in account_list:
-            if account["id"] == profile.id:
-                account_return = account
-        return account_return
+    #####################################################################################
+    # Followed accounts and clips are kept in memory and written back once per check    #
+    #####################################################################################
+
+    async def load_accounts(self) -> None:
+        self.follow_accounts = {}
+        for account in await self.config.twitch_accounts():
+            account["followers"] = set(account["followers"])
+            self.follow_accounts[account["id"]] = account
+        self.clip_accounts = await self.config.twitch_clips()
+        for clip_data in self.clip_accounts.values():
+            for info in clip_data["channels"].values():
+                info["clips"] = set(info.get("clips", []))
+
+    async def save_follow_accounts(self) -> None:
+        # cleared before the snapshot so changes made during the write are saved next time
+        self.accounts_dirty = False
+        accounts = [
+            {**account, "followers": list(account["followers"])}
+            for account in self.follow_accounts.values()
+        ]
+        try:
+            await self.config.twitch_accounts.set(accounts)
+        except BaseException:
+            self.accounts_dirty = True
+            raise
+
+    async def save_clip_accounts(self) -> None:
+        self.clips_dirty = False
+        saved = {}
+        for user_id, clip_data in self.clip_accounts.items():
+            channels = {
+                channel_id: {**info, "clips": list(info["clips"])}
+                for channel_id, info in clip_data["channels"].items()
+            }
+            saved[user_id] = {**clip_data, "channels": channels}
+        try:
+            await self.config.twitch_clips.set(saved)
+        except BaseException:
+            self.clips_dirty = True
+            raise
+
+    async def save_accounts(self) -> None:
+        if self.accounts_dirty:
+            await self.save_follow_accounts()
+        if self.clips_dirty:
+            await self.save_clip_accounts()
 
     async def check_followers(self, account: dict):
-        followed = await self.get_profile_from_id(account["id"])
         followers, total = await self.get_new_followers(account["id"])
-        for follow in reversed(followers):
-            if follow.from_id not in account["followers"]:
-                try:
-                    profile = await self.get_profile_from_id(follow.from_id)
-                except Exception:
-                    log.exception(f"Error getting twitch profile {follow.from_id}", exc_info=True)
+        new_follows = [f for f in reversed(followers) if f.from_id not in account["followers"]]
+        if not new_follows:
+            return
+        # The followed account and every new follower are looked up together
+        profiles = await self.get_profiles_from_ids(
+            [account["id"]] + [follow.from_id for follow in new_follows]
+        )
+        followed = profiles.get(account["id"])
+        if followed is None:
+            log.error(f"Error getting twitch profile {account['id']}")
+            return
+        for follow in new_follows:
+            profile = profiles.get(follow.from_id)
+            if profile is None:
+                log.error(f"Error getting twitch profile {follow.from_id}")
+            else:
                 log.info(
                     f"{profile.login} Followed! {followed.display_name} "
                     f"has {total} followers now."
@@ -254,13 +337,12 @@ class TwitchAPI:
                         await channel.send(embed=em)
                     else:
                         text_msg = (
-                            f"{profile.display_name} has just " f"followed {account.display_name}!"
+                            f"{profile.display_name} has just "
+                            f"followed {followed.display_name}!"
                         )
                         await channel.send(text_msg)
-                async with self.config.twitch_accounts() as check_accounts:
-                    check_accounts.remove(account)
-                    account["followers"].append(follow.from_id)
-                    check_accounts.append(account)
+            account["followers"].add(follow.from_id)
+            self.accounts_dirty = True
 
     async def send_clips_update(self, clip: dict, clip_data: dict):
         tasks = []
@@ -280,25 +362,38 @@ class TwitchAPI:
                 continue
             if channel and channel.permissions_for(channel.guild.me).send_messages:
                 tasks.append(channel.send(msg))
-            async with self.config.twitch_clips() as saved:
-                if "clips" not in saved[clip_data["id"]]["channels"][f"{channel.id}"]:
-                    saved[clip_data["id"]]["channels"][f"{channel.id}"]["clips"] = [clip["id"]]
-                else:
-                    saved[clip_data["id"]]["channels"][f"{channel.id}"]["clips"].append(clip["id"])
+            info["clips"].add(clip["id"])
+            self.clips_dirty = True
         await bounded_gather(*tasks)
 
+    async def check_user_clips(self, user_id: str, clip_data: dict):
+        log.debug(f"Checking for new clips from {clip_data['display_name']}")
+        now = datetime.utcnow() + timedelta(days=-8)
+        clips = await self.get_new_clips(user_id, now)
+        for clip in clips:
+            await self.send_clips_update(clip, clip_data)
+
     async def check_clips(self):
-        followed = await self.config.twitch_clips()
-        for user_id, clip_data in followed.items():
-            log.debug(f"Checking for new clips from {clip_data['display_name']}")
-            try:
-                now = datetime.utcnow() + timedelta(days=-8)
-                clips = await self.get_new_clips(user_id, now)
-            except Exception:
-                log.exception(f"Error getting twitch clips {user_id}", exc_info=True)
-                continue
-            for clip in clips:
-                await self.send_clips_update(clip, clip_data)
+        followed = list(self.clip_accounts.items())
+        results = await bounded_gather(
+            *[self.check_user_clips(user_id, clip_data) for user_id, clip_data in followed],
+            return_exceptions=True,
+            limit=POLL_CONCURRENCY,
+        )
+        for (user_id, _clip_data), result in zip(followed, results):
+            if isinstance(result, Exception):
+                log.error(f"Error getting twitch clips {user_id}", exc_info=result)
+
+    async def check_all_followers(self):
+        accounts = list(self.follow_accounts.values())
+        results = await bounded_gather(
+            *[self.check_followers(account) for account in accounts],
+            return_exceptions=True,
+            limit=POLL_CONCURRENCY,
+        )
+        for account, result in zip(accounts, results):
+            if isinstance(result, Exception):
+                log.error(f"Error checking followers for {account['login']}", exc_info=result)
 
     async def check_for_new_followers(self) -> None:
         # Checks twitch every minute for new followers
@@ -306,13 +401,20 @@ class TwitchAPI:
             await self.bot.wait_until_red_ready()
         else:
             await self.bot.wait_until_ready()
+        # Everything this task requests waits behind commands
+        REQUEST_PRIORITY.set(BACKGROUND)
         while self is self.bot.get_cog("Twitch"):
-            follow_accounts = await self.config.twitch_accounts()
-            for account in follow_accounts:
-                await self.check_followers(account)
+            api_calls = self.api_calls
+            await self.check_all_followers()
+            await self.check_clips()
             try:
-                await self.check_clips()
-                pass
+                await self.save_accounts()
             except Exception:
-                log.exception("Error checking new clips")
+                log.exception("Error saving twitch accounts")
+            limiter = self.rate_limiter
+            log.debug(
+                f"Twitch check used {self.api_calls - api_calls} API calls, "
+                f"{limiter.requests} requests {limiter.waits} waits "
+                f"{limiter.throttled} 429s since load"
+            )
             await asyncio.sleep(60)